@@ -0,0 +1,142 @@
+"""
+Approximate nearest-neighbour index — IVF-Flat over the stored embeddings.
+
+The corpus is clustered offline with spherical k-means into `n_lists` coarse
+cells. At query time only the `nprobe` cells whose centroids are closest to
+the query are scanned exactly, so search cost drops from O(N) to roughly
+O(N * nprobe / n_lists). The index is persisted as `ivf.npz` inside the
+vector DB directory and is tied to the row count it was built from.
+"""
+import math
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+
+IVF_FILE = "ivf.npz"
+_ASSIGN_BLOCK = 65536
+
+
+def default_n_lists(count: int) -> int:
+    """Rule of thumb: about 4 * sqrt(N) cells."""
+    return max(1, min(count, int(round(4 * math.sqrt(count)))))
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by inner product) for every row, in bounded-memory blocks."""
+    labels = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), _ASSIGN_BLOCK):
+        block = np.asarray(matrix[start : start + _ASSIGN_BLOCK], dtype=np.float32)
+        labels[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def _kmeans(
+    sample: np.ndarray, n_lists: int, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Spherical k-means on L2-normalized rows; returns normalized centroids."""
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+        counts = np.bincount(labels, minlength=n_lists)
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # Re-seed empty cells from random points so no list is wasted
+            sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index: coarse centroids plus row ids grouped by cell."""
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_ids: np.ndarray):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def count(self) -> int:
+        return len(self.list_ids)
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        n_lists: int | None = None,
+        iterations: int = 20,
+        max_train_points: int = 256,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """
+        Cluster `matrix` (rows L2-normalized). k-means is trained on at most
+        `max_train_points` rows per cell, then every row is assigned.
+        """
+        count = len(matrix)
+        if count == 0:
+            raise ValueError("Cannot build an IVF index over an empty matrix")
+        n_lists = min(n_lists or default_n_lists(count), count)
+
+        rng = np.random.default_rng(seed)
+        train_size = min(count, n_lists * max_train_points)
+        train_ids = np.sort(rng.choice(count, train_size, replace=False))
+        sample = np.asarray(matrix[train_ids], dtype=np.float32)
+
+        centroids = _kmeans(sample, n_lists, iterations, rng)
+        labels = _assign(matrix, centroids)
+
+        list_ids = np.argsort(labels, kind="stable").astype(np.int64)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=n_lists), out=list_offsets[1:])
+        return cls(centroids, list_offsets, list_ids)
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Row ids in the `nprobe` cells nearest to a normalized query."""
+        nprobe = max(1, min(nprobe, self.n_lists))
+        cell_scores = self.centroids @ query
+        if nprobe < self.n_lists:
+            cells = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        else:
+            cells = np.arange(self.n_lists)
+        parts = [self.list_ids[self.list_offsets[c] : self.list_offsets[c + 1]] for c in cells]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def save(self, index_dir: str) -> None:
+        np.savez(
+            os.path.join(index_dir, IVF_FILE),
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_ids=self.list_ids,
+        )
+
+    @classmethod
+    def load(cls, index_dir: str) -> "IVFIndex | None":
+        path = os.path.join(index_dir, IVF_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["centroids"], data["list_offsets"], data["list_ids"])
+
+
+def describe(index: IVFIndex) -> Dict[str, Any]:
+    sizes = np.diff(index.list_offsets)
+    return {
+        "n_lists": index.n_lists,
+        "count": index.count,
+        "min_list": int(sizes.min()),
+        "max_list": int(sizes.max()),
+        "mean_list": float(sizes.mean()),
+    }
@@ -0,0 +1,130 @@
+"""
+Semantic answer cache — replays a previous streamed answer for near-duplicate
+questions without calling the chat model.
+
+An entry is reused when the new query embedding is within `threshold` cosine
+similarity of a cached one AND retrieval returned the same set of sources, so
+a paraphrase that lands on different legal texts is always answered fresh.
+Entries are evicted least-recently-used beyond `max_entries`, and the whole
+cache is dropped whenever the vector index version changes.
+"""
+import threading
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+import numpy as np
+
+from tokenizer import count_tokens
+
+SourceKey = FrozenSet[Tuple[str, str]]
+
+
+def source_key(sources: List[Dict[str, Any]]) -> SourceKey:
+    """Order-insensitive identity of a retrieved source set."""
+    return frozenset((s["domain"], s["reference"]) for s in sources)
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 1000, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors: np.ndarray | None = None  # (max_entries, dims), rows normalized
+        self._entries: List[Dict[str, Any] | None] = []
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._clock = 0
+        self._index_version = ""
+
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.tokens_saved = 0
+
+    def _check_version(self, index_version: str) -> None:
+        if index_version != self._index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._vectors = None
+            self._entries = []
+            self._last_used[:] = 0
+            self._index_version = index_version
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray | None:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def lookup(
+        self, embedding: List[float], sources: List[Dict[str, Any]], index_version: str
+    ) -> List[str] | None:
+        """Cached content chunks for a near-duplicate query with the same sources, else None."""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version(index_version)
+            self.lookups += 1
+            if query is None or not self._entries or query.shape[0] != self._vectors.shape[1]:
+                return None
+
+            scores = self._vectors[: len(self._entries)] @ query
+            key = source_key(sources)
+            for slot in np.argsort(-scores):
+                if scores[slot] < self.threshold:
+                    break
+                entry = self._entries[slot]
+                if entry is not None and entry["sources"] == key:
+                    self._clock += 1
+                    self._last_used[slot] = self._clock
+                    self.hits += 1
+                    self.tokens_saved += entry["tokens"]
+                    return entry["chunks"]
+            return None
+
+    def store(
+        self,
+        embedding: List[float],
+        sources: List[Dict[str, Any]],
+        chunks: List[str],
+        index_version: str,
+    ) -> None:
+        """Remember the streamed content chunks of a completed answer."""
+        vector = self._normalize(embedding)
+        if vector is None or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_version(index_version)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._vectors.shape[1]:
+                return
+
+            if len(self._entries) < self.max_entries:
+                slot = len(self._entries)
+                self._entries.append(None)
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._vectors[slot] = vector
+            self._entries[slot] = {
+                "sources": source_key(sources),
+                "chunks": list(chunks),
+                "tokens": count_tokens("".join(chunks)),
+            }
+            self._clock += 1
+            self._last_used[slot] = self._clock
+            self.stores += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "tokens_saved": self.tokens_saved,
+            }
@@ -0,0 +1,184 @@
+"""
+Exact article lookup — answers "الفصل 19 من الدستور" or "المادة 400 من مدونة
+التجارة" straight from the index metadata, without embedding the question or
+scanning vectors.
+
+ArticleIndex maps (domain, source, article number) to row ids, where `source`
+is the law a row comes from (its Data/ file name) and the number is the
+normalized `reference` ("الفصل 218-1" → "218-1", "الفصل 303 المكرر" →
+"303 مكرر"). A question resolves when it names an article and a law the index
+recognizes: an alias from LAW_ALIASES, a domain name, a law number such as
+"49.16", or the subject of a law title ("المتعلق بمجلس النواب"). Without a
+recognizable law the `domain` filter is used; a number shared by several laws
+of one domain is ambiguous and left to vector search.
+
+Articles dropped at build time as duplicates of another law's text (see
+dedup) are looked up through their aliases: "المادة 7 من القانون 112.14"
+resolves to the rows of the canonical copy, reported under the cited
+reference.
+"""
+import re
+from typing import Any, Dict, List, Sequence, Tuple
+
+from text_normalize import normalize_query
+
+# Common names of the laws in Data/ → (domain, source); source None = the whole domain
+LAW_ALIASES: Dict[str, Tuple[str, str | None]] = {
+    "الدستور": ("دستور المملكة المغربية 2011", None),
+    "دستور المملكة": ("دستور المملكة المغربية 2011", None),
+    "القانون الجنائي": ("القانون الجنائي", None),
+    "مجموعة القانون الجنائي": ("القانون الجنائي", None),
+    "مدونة الأسرة": ("المادة الأسرية", "مدونة الأسرة"),
+    "مدونة التجارة": ("المادة التجارية", "مدونة التجارة"),
+    "قانون الجنسية": ("المادة الأسرية", "ظهير شريف رقم 1.58.250 بسن قانون الجنسية المغربية"),
+    "قانون المنافسة": ("المادة التجارية", "قانون حرية الأسعار والمنافسة"),
+    "حق الإضراب": ("القوانين التنظيمية", "القانون التنظيمي رقم 97.15 المتعلق بتحديد شروط وكيفيات ممارسة حق الإضراب"),
+}
+
+_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+# On normalized text (ة → ه): "المادة 12", "الفصل رقم 218-1", "الفصل 303 المكرر"
+_ARTICLE = re.compile(r"(?:^|\s)[وبلف]?(?:ال)?(?:فصل|ماده)\s+(?:رقم\s+)?(\d+(?:\s*-\s*\d+)*)(\s+(?:ال)?مكرر)?")
+_LAW_NUMBER = re.compile(r"\d+(?:\.\d+)+")
+_SUBJECT = re.compile(r"المتعلق\s+ب(.+)$")
+
+
+def _normalize(text: str) -> str:
+    return normalize_query(text.translate(_DIGITS))
+
+
+def _law_number(text: str) -> str:
+    """"066.13" and "66.13" name the same law."""
+    return ".".join(part.lstrip("0") or "0" for part in text.split("."))
+
+
+def article_numbers(text: str) -> List[str]:
+    """Normalized article numbers mentioned in `text`, in order of appearance."""
+    numbers = []
+    for match in _ARTICLE.finditer(_normalize(text)):
+        number = re.sub(r"\s+", "", match.group(1))
+        if match.group(2):
+            number += " مكرر"
+        if number not in numbers:
+            numbers.append(number)
+    return numbers
+
+
+class ArticleIndex:
+    def __init__(self):
+        self.rows: Dict[Tuple[str, str, str], List[int]] = {}  # (domain, source, number) → row ids
+        self.sources: Dict[Tuple[str, str], List[str]] = {}  # (domain, number) → sources having it
+        self.ambiguous: set = set()  # keys holding several articles (e.g. no source recorded)
+        self.aliases: Dict[str, Tuple[str, str | None]] = {}  # normalized law name → (domain, source)
+        self.law_numbers: Dict[str, Tuple[str, str]] = {}
+        self.cited_as: Dict[Tuple[str, str, str], Dict[str, str]] = {}  # alias key → its source and reference
+        self._alias_pattern: re.Pattern | None = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, db: Sequence[Dict], aliases: Sequence[Dict[str, Any]] = ()) -> "ArticleIndex":
+        """
+        One pass over the index metadata (rows without a parseable reference
+        are skipped), plus the `aliases` of deduplicated articles.
+        """
+        index = cls()
+        laws: Dict[str, set] = {}
+        for row_id, doc in enumerate(db):
+            domain, source = doc.get("domain") or "", doc.get("source") or ""
+            laws.setdefault(domain, set()).add(source)
+            numbers = article_numbers(doc.get("reference") or "")
+            if not numbers:
+                continue
+            key = (domain, source, numbers[0])
+            if key not in index.rows:
+                index.rows[key] = []
+                index.sources.setdefault((domain, numbers[0]), []).append(source)
+            elif (doc.get("part") or 1) == 1:
+                index.ambiguous.add(key)
+            index.rows[key].append(row_id)
+
+        for alias in aliases:
+            canonical = alias["canonical"]
+            numbers = article_numbers(canonical.get("reference") or "")
+            alias_numbers = article_numbers(alias.get("reference") or "")
+            if not numbers or not alias_numbers:
+                continue
+            target = (canonical.get("domain") or "", canonical.get("source") or "", numbers[0])
+            domain, source = alias.get("domain") or "", alias.get("source") or ""
+            key = (domain, source, alias_numbers[0])
+            if target not in index.rows or key in index.rows:
+                continue
+            index.rows[key] = index.rows[target]
+            index.sources.setdefault((domain, alias_numbers[0]), []).append(source)
+            index.cited_as[key] = {"source": source, "reference": alias["reference"]}
+            laws.setdefault(domain, set()).add(source)
+
+        for domain, sources in laws.items():
+            index.aliases[_normalize(domain)] = (domain, None)
+            for source in sources - {""}:
+                index.aliases[_normalize(source)] = (domain, source)
+                subject = _SUBJECT.search(_normalize(source))
+                if subject and len(subject.group(1).split()) >= 2:
+                    index.aliases.setdefault(subject.group(1).strip(), (domain, source))
+                for number in _LAW_NUMBER.findall(source):
+                    index.law_numbers[_law_number(number)] = (domain, source)
+        for alias, (domain, source) in LAW_ALIASES.items():
+            # Only for laws present in this index (sources need a rebuild of older indexes)
+            if domain in laws and (source is None or source in laws[domain]):
+                index.aliases[_normalize(alias)] = (domain, source)
+            elif domain in laws:
+                index.aliases.setdefault(_normalize(alias), (domain, None))
+
+        if index.aliases:
+            names = "|".join(re.escape(a) for a in sorted(index.aliases, key=len, reverse=True))
+            index._alias_pattern = re.compile(rf"(?:^|\s)[وبلف]?({names})(?=\W|$)")
+        return index
+
+    def resolve_law(self, text: str) -> Tuple[str, str | None] | None:
+        """(domain, source) of the law named in `text`; the longest name wins."""
+        normalized = _normalize(text)
+        for number in _LAW_NUMBER.findall(normalized):
+            law = self.law_numbers.get(_law_number(number))
+            if law is not None:
+                return law
+        if self._alias_pattern is None:
+            return None
+        names = self._alias_pattern.findall(normalized)
+        return self.aliases[max(names, key=len)] if names else None
+
+    def lookup(self, text: str, domain: str | None = None, limit: int = 5) -> List[int]:
+        """Row ids of the articles `text` asks for (all parts, in order), or [] to fall back."""
+        return [row_id for row_id, _ in self.lookup_cited(text, domain, limit)]
+
+    def lookup_cited(
+        self, text: str, domain: str | None = None, limit: int = 5
+    ) -> List[Tuple[int, Dict[str, str] | None]]:
+        """
+        Like lookup, with each row's citation when it was reached through an
+        alias ({"source", "reference"} of the cited article), else None.
+        """
+        numbers = article_numbers(text)
+        if not numbers:
+            return []
+        law = self.resolve_law(text)
+        if law is None:
+            if domain is None:
+                return []
+            law = (domain, None)
+        elif domain is not None and law[0] != domain:
+            return []
+
+        law_domain, source = law
+        found: List[Tuple[int, Dict[str, str] | None]] = []
+        for number in numbers[:limit]:
+            if source is None:
+                candidates = self.sources.get((law_domain, number), [])
+                if len(candidates) != 1:
+                    continue  # missing, or one number in several laws of the domain
+                key = (law_domain, candidates[0], number)
+            else:
+                key = (law_domain, source, number)
+            if key in self.rows and key not in self.ambiguous:
+                found.extend((row_id, self.cited_as.get(key)) for row_id in self.rows[key])
+        return found
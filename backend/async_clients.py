@@ -0,0 +1,46 @@
+"""
+Shared async Azure OpenAI client.
+
+Chat and embedding calls from the async pipeline go through one
+AsyncAzureOpenAI instance backed by a single pooled httpx.AsyncClient, so
+concurrent streams reuse keep-alive connections instead of opening new ones.
+"""
+import httpx
+from openai import AsyncAzureOpenAI
+
+from config import (
+    AZURE_OPENAI_ENDPOINT,
+    AZURE_OPENAI_API_KEY,
+    AZURE_OPENAI_API_VERSION,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+)
+
+_async_client: AsyncAzureOpenAI | None = None
+
+
+def get_async_client() -> AsyncAzureOpenAI:
+    global _async_client
+    if _async_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
+        _async_client = AsyncAzureOpenAI(
+            azure_endpoint=AZURE_OPENAI_ENDPOINT,
+            api_key=AZURE_OPENAI_API_KEY,
+            api_version=AZURE_OPENAI_API_VERSION,
+            http_client=http_client,
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """Release pooled connections (call on application shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
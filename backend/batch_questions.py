@@ -0,0 +1,68 @@
+"""
+Answer a file of questions through the batch RAG pipeline (evaluation runs,
+answer-cache pre-warming).
+
+Usage:
+    python batch_questions.py questions.txt [--output batch_results.ndjson]
+                              [--concurrency 8] [--top-k 5] [--domain "المادة الأسرية"]
+
+The input is either plain text (one question per line) or JSONL with a
+"question" field. Output is the NDJSON stream of rag_service.answer_questions_batch:
+one line per question as it completes ("index" refers to the input order),
+then a "done" summary.
+"""
+import argparse
+import asyncio
+import json
+from typing import List
+
+from async_clients import close_async_client
+from config import BATCH_CONCURRENCY, TOP_K_RESULTS
+from rag_service import answer_questions_batch
+
+
+def read_questions(path: str) -> List[str]:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                line = (json.loads(line).get("question") or "").strip()
+            if line:
+                questions.append(line)
+    return questions
+
+
+async def run(questions: List[str], output, top_k: int, domain: str | None, concurrency: int) -> None:
+    try:
+        async for line in answer_questions_batch(questions, top_k=top_k, domain=domain, concurrency=concurrency):
+            output.write(line)
+            output.flush()
+    finally:
+        await close_async_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Questions file (.txt, one per line, or .jsonl)")
+    parser.add_argument("--output", default="batch_results.ndjson", help="NDJSON output file")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--top-k", type=int, default=TOP_K_RESULTS)
+    parser.add_argument("--domain", default=None)
+    args = parser.parse_args()
+
+    questions = read_questions(args.input)
+    if not questions:
+        print(f"❌ No questions found in {args.input}")
+        return
+    print(f"📨 Answering {len(questions)} questions (concurrency {args.concurrency})...")
+
+    with open(args.output, "w", encoding="utf-8") as output:
+        asyncio.run(run(questions, output, args.top_k, args.domain, args.concurrency))
+    print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Concurrent streaming load test for /api/chat.
+
+Opens N simultaneous chat streams against a running API and reports
+time-to-first-byte, total stream time and streams completed per second for
+the async streaming pipeline that /api/chat serves.
+
+A handful of repeated questions mostly measures the semantic answer cache and
+the request coalescer, not the pipeline. --unique gives every request its own
+question, and the report includes how many requests the server still answered
+from the cache or a shared stream (from /api/stats). For a cold-pipeline run,
+also start the server with ANSWER_CACHE_SIZE=0 so near-duplicate wordings
+cannot hit the similarity cache.
+
+Usage:
+    python benchmarks/chat_concurrency.py --url http://localhost:8000 --concurrency 50 --requests 200 --unique
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+QUESTIONS = [
+    "ما هي شروط الطلاق؟",
+    "ما هي مدة الحبس في السرقة؟",
+    "ما هي حقوق الطفل المحضون؟",
+    "كيف يتم تأسيس شركة ذات مسؤولية محدودة؟",
+]
+
+# --unique: every request asks a different subject/aspect pair, numbered past the grid
+SUBJECTS = [
+    "الطلاق", "الحضانة", "النفقة", "الإرث", "الزواج", "السرقة", "النصب",
+    "الشيك بدون رصيد", "عقد الكراء", "الشركة ذات المسؤولية المحدودة",
+    "الفصل التعسفي", "الرهن", "الكفالة", "التقادم", "حرية التعبير",
+]
+ASPECTS = [  # prefixes, joined to the subject as-is
+    "ما هي شروط ", "ما هي آثار ", "ما هي العقوبات المتعلقة ب", "كيف يتم إثبات ",
+    "ما هي الإجراءات القانونية ل", "من هي الجهة المختصة في ",
+]
+
+
+def _question(i: int, unique: bool) -> str:
+    if not unique:
+        return QUESTIONS[i % len(QUESTIONS)]
+    grid = len(SUBJECTS) * len(ASPECTS)
+    aspect = ASPECTS[i % len(ASPECTS)]
+    subject = SUBJECTS[(i // len(ASPECTS)) % len(SUBJECTS)]
+    question = aspect + subject
+    return f"{question}؟" if i < grid else f"{question} (الحالة رقم {i // grid})؟"
+
+
+async def _one_stream(client: httpx.AsyncClient, url: str, question: str) -> dict:
+    start = time.perf_counter()
+    first_byte = None
+    async with client.stream("POST", f"{url}/api/chat", json={"message": question}) as response:
+        response.raise_for_status()
+        async for _line in response.aiter_lines():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+    return {"ttfb": first_byte or 0.0, "total": time.perf_counter() - start}
+
+
+async def _server_counters(client: httpx.AsyncClient, url: str) -> dict:
+    """Answer-cache hits and coalesced subscribers so far (zeros when unavailable)."""
+    try:
+        stats = (await client.get(f"{url}/api/stats")).json()
+    except (httpx.HTTPError, ValueError):
+        return {"cache_hits": 0, "coalesced": 0}
+    return {
+        "cache_hits": (stats.get("answer_cache") or {}).get("hits", 0),
+        "coalesced": (stats.get("coalescer") or {}).get("subscribers_joined", 0),
+    }
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(url: str, concurrency: int, requests: int, unique: bool = False) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        async def bounded(i: int):
+            async with semaphore:
+                return await _one_stream(client, url, _question(i, unique))
+
+        before = await _server_counters(client, url)
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*(bounded(i) for i in range(requests)), return_exceptions=True)
+        wall = time.perf_counter() - start
+        after = await _server_counters(client, url)
+
+    ok = [o for o in outcomes if isinstance(o, dict)]
+    ttfb = [o["ttfb"] * 1000 for o in ok]
+    total = [o["total"] * 1000 for o in ok]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "unique_questions": unique,
+        "completed": len(ok),
+        "errors": len(outcomes) - len(ok),
+        # Requests the pipeline never ran for; keep near 0 to measure the pipeline itself
+        "answer_cache_hits": after["cache_hits"] - before["cache_hits"],
+        "coalesced": after["coalesced"] - before["coalesced"],
+        "wall_s": round(wall, 2),
+        "streams_per_s": round(len(ok) / wall, 2) if wall else None,
+        "ttfb_ms": {"p50": round(statistics.median(ttfb), 1), "p95": round(_percentile(ttfb, 95), 1)} if ok else None,
+        "total_ms": {"p50": round(statistics.median(total), 1), "p95": round(_percentile(total, 95), 1)} if ok else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--unique", action="store_true",
+                        help="ask a different question per request so the cache and coalescer are bypassed")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.url, args.concurrency, args.requests, args.unique)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Offline retrieval benchmark on synthetic corpora — no network, no Azure.
+
+For each corpus size a clustered synthetic index (unit vectors around random
+centroids, spread over five domains) is written with index_store and cached in
+--workdir. A fresh subprocess then measures, against vector_store:
+    - cold start: time to load the index snapshot, and the first search
+      (page faults included), plus resident memory after each step
+    - p50/p95/p99 search_similar latency over an offline query set, for exact
+      search and every approximate mode requested (IVF per nprobe, compact)
+    - recall@k of each approximate mode against exact search
+    - search_similar_batch latency per batch size (and per query)
+Results are written as JSON (one file per run) so they can be compared over time.
+
+Usage (from backend/):
+    python benchmarks/retrieval.py --sizes 10000,100000 [--dims 1536]
+        [--modes ivf,compact] [--nprobe 4,8,16] [--batch-sizes 16,128]
+        [--queries 200] [--k 5] [--output benchmarks/results/retrieval.json]
+
+Pass --sizes 1000000 for the 1M-chunk corpus (~6 GB of float32 on disk; use
+--dtype float16 to halve it). Timings reflect a warm OS page cache unless the
+cache is dropped between runs.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from ann_index import IVFIndex  # noqa: E402
+from compact_index import DEFAULT_DIMS, CompactIndex  # noqa: E402
+from index_eval import recall_at_k, sample_queries  # noqa: E402
+from index_store import IndexWriter, is_index, open_index, resolve_index  # noqa: E402
+
+DOMAINS = ["constitution", "penal", "family", "commercial", "organic"]
+_BLOCK = 65536
+
+
+def _latency_summary(seconds: List[float]) -> Dict[str, float]:
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def build_corpus(path: str, size: int, dims: int, dtype: str, seed: int = 0) -> float:
+    """Write a clustered synthetic index of `size` rows; returns the build time (cached builds: 0)."""
+    if is_index(path):
+        manifest, _matrix, _metadata = open_index(path)
+        if manifest["count"] == size and manifest["dimensions"] == dims and manifest["dtype"] == dtype:
+            return 0.0
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    n_clusters = max(8, int(np.sqrt(size)))
+    centroids = rng.normal(size=(n_clusters, dims)).astype(np.float32)
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    writer = IndexWriter(path, dtype)
+    try:
+        for offset in range(0, size, _BLOCK):
+            n = min(_BLOCK, size - offset)
+            labels = rng.integers(0, n_clusters, n)
+            block = centroids[labels] + rng.normal(0, 1.5 / np.sqrt(dims), (n, dims)).astype(np.float32)
+            rows = [
+                {
+                    "id": offset + i + 1,
+                    "domain": DOMAINS[(offset + i) * len(DOMAINS) // size],
+                    "reference": f"الفصل {offset + i + 1}",
+                    "content": f"نص تركيبي رقم {offset + i + 1}",
+                }
+                for i in range(n)
+            ]
+            writer.add_batch(rows, block)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return time.perf_counter() - start
+
+
+def build_approximate(path: str, modes: List[str], compact_dims: int | None) -> Dict[str, float]:
+    """Build (or reuse) the IVF / compact indexes of the corpus snapshot."""
+    index_dir = resolve_index(path)
+    _manifest, matrix, _metadata = open_index(index_dir)
+    timings: Dict[str, float] = {}
+    if "ivf" in modes and IVFIndex.load(index_dir) is None:
+        start = time.perf_counter()
+        IVFIndex.build(matrix).save(index_dir)
+        timings["ivf_build_s"] = round(time.perf_counter() - start, 2)
+    if "compact" in modes and CompactIndex.load(index_dir) is None:
+        start = time.perf_counter()
+        CompactIndex.build(matrix, dims=compact_dims or None, dtype="int8").save(index_dir)
+        timings["compact_build_s"] = round(time.perf_counter() - start, 2)
+    return timings
+
+
+def measure(path: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Runs in a fresh process: cold start, latency and recall for one corpus."""
+    import vector_store
+
+    vector_store.DB_DIR = path
+    vector_store.LEGACY_DB_PATH = os.path.join(path, "missing.json")
+    result: Dict[str, Any] = {"rss_baseline": vector_store._process_memory()}
+
+    start = time.perf_counter()
+    snap = vector_store._get_snapshot()
+    result["cold_start_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    result["rss_after_load"] = vector_store._process_memory()
+
+    queries = sample_queries(snap.matrix, args.queries, seed=1)
+    start = time.perf_counter()
+    vector_store.search_similar(queries[0], top_k=args.k, exact=True)
+    result["first_search_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    result["rss_after_first_search"] = vector_store._process_memory()
+
+    def run_single(**kwargs) -> tuple[List[List[int]], List[float]]:
+        ids, seconds = [], []
+        for q in queries:
+            t = time.perf_counter()
+            found = vector_store.search_similar(q, top_k=args.k, **kwargs)
+            seconds.append(time.perf_counter() - t)
+            ids.append([r["id"] for r in found])
+        return ids, seconds
+
+    exact_ids, seconds = run_single(exact=True)
+    single = {"exact": _latency_summary(seconds)}
+    single["exact_domain"] = _latency_summary(run_single(exact=True, domain=DOMAINS[0])[1])
+
+    index_dir = resolve_index(path)
+    if "ivf" in args.modes:
+        snap.ivf = IVFIndex.load(index_dir)
+        for nprobe in args.nprobe:
+            ids, seconds = run_single(nprobe=nprobe)
+            single[f"ivf_nprobe_{nprobe}"] = {
+                **_latency_summary(seconds), "recall_at_k": round(recall_at_k(ids, exact_ids, args.k), 4)
+            }
+        snap.ivf = None
+    if "compact" in args.modes:
+        snap.compact = CompactIndex.load(index_dir)
+        ids, seconds = run_single()
+        single["compact"] = {
+            **_latency_summary(seconds),
+            "recall_at_k": round(recall_at_k(ids, exact_ids, args.k), 4),
+            "dims": snap.compact.dims,
+            "shortlist": vector_store.RESCORE_SHORTLIST,
+        }
+        snap.compact = None
+    result["single"] = single
+
+    batch: Dict[str, Any] = {}
+    for size in args.batch_sizes:
+        size = min(size, len(queries))
+        seconds = []
+        for offset in range(0, len(queries) - size + 1, size):
+            block = list(queries[offset : offset + size])
+            t = time.perf_counter()
+            vector_store.search_similar_batch(block, top_k=args.k)
+            seconds.append(time.perf_counter() - t)
+        summary = _latency_summary(seconds)
+        summary["per_query_ms"] = round(summary["mean_ms"] / size, 4)
+        batch[str(size)] = summary
+    result["batch"] = batch
+    result["rss_final"] = vector_store._process_memory()
+    return result
+
+
+def _environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=_int_list, default=[10000, 100000])
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--modes", default="", help="Approximate modes to measure: ivf,compact")
+    parser.add_argument("--nprobe", type=_int_list, default=[4, 8, 16])
+    parser.add_argument("--compact-dims", type=int, default=DEFAULT_DIMS,
+                        help="Truncate the compact index to N dims (0 = all)")
+    parser.add_argument("--batch-sizes", type=_int_list, default=[16, 128])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--workdir", default=os.path.join(BACKEND_DIR, "benchmarks", ".corpora"))
+    parser.add_argument("--output", default=None, help="Results JSON (default: benchmarks/results/retrieval-<time>.json)")
+    parser.add_argument("--measure", default=None, help=argparse.SUPPRESS)  # internal: child process mode
+    args = parser.parse_args()
+    args.modes = [m for m in args.modes.split(",") if m]
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args)))
+        return
+
+    report: Dict[str, Any] = {"environment": _environment(), "config": {
+        "dims": args.dims, "dtype": args.dtype, "k": args.k, "queries": args.queries,
+        "modes": args.modes, "nprobe": args.nprobe, "batch_sizes": args.batch_sizes,
+    }, "runs": []}
+
+    for size in args.sizes:
+        path = os.path.join(args.workdir, f"synthetic-{size}-{args.dims}-{args.dtype}")
+        print(f"🧪 Corpus {size} x {args.dims} ({args.dtype})...")
+        build_s = build_corpus(path, size, args.dims, args.dtype)
+        run: Dict[str, Any] = {"size": size, "build_s": round(build_s, 2) if build_s else "cached"}
+        run.update(build_approximate(path, args.modes, args.compact_dims))
+
+        # Fresh interpreter, so the load is a real cold start of vector_store
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure", path] + sys.argv[1:],
+            capture_output=True, text=True, cwd=BACKEND_DIR,
+        )
+        if child.returncode != 0:
+            print(child.stderr)
+            run["error"] = child.stderr.strip().splitlines()[-1] if child.stderr.strip() else "measure failed"
+        else:
+            run.update(json.loads(child.stdout.strip().splitlines()[-1]))
+            exact = run["single"]["exact"]
+            print(f"  ⏱️ cold start {run['cold_start_ms']} ms, exact p50/p95/p99 "
+                  f"{exact['p50_ms']}/{exact['p95_ms']}/{exact['p99_ms']} ms")
+        report["runs"].append(run)
+
+    output = args.output or os.path.join(
+        BACKEND_DIR, "benchmarks", "results", f"retrieval-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
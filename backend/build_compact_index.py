@@ -0,0 +1,63 @@
+"""
+Build the compact (int8 and/or truncated-dimension) first-pass index next to
+the local vector DB and report its memory footprint and recall.
+
+Usage:
+    python build_compact_index.py [--dtype int8] [--dims 256]
+                                  [--shortlist 5,20,50,100] [--k 5]
+                                  [--queries 200] [--report report.json]
+
+For each shortlist size the report gives recall@k of compact scan + exact
+rescoring against full-precision exact search (shortlist = k means no
+rescoring benefit, i.e. the compact vectors alone), so RESCORE_SHORTLIST can
+be chosen with real numbers before setting USE_COMPACT_INDEX=true. Serving
+then scans only the compact copy, so its size is the scanned memory.
+"""
+import argparse
+import time
+
+from compact_index import COMPACT_DTYPES, DEFAULT_DIMS, CompactIndex, describe
+from index_eval import open_for_build, parse_values, print_recall_report, recall_report, sample_queries, write_report
+from vector_store import DB_DIR
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_DIR)
+    parser.add_argument("--dtype", choices=COMPACT_DTYPES, default="int8")
+    parser.add_argument("--dims", type=int, default=DEFAULT_DIMS,
+                        help="Keep only the leading N dimensions (0 = all)")
+    parser.add_argument("--shortlist", default="5,20,50,100,200")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--report", default=None, help="Write the memory/recall report as JSON")
+    args = parser.parse_args()
+
+    opened = open_for_build(args.db)
+    if opened is None:
+        return
+    index_dir, matrix, _metadata = opened
+    print(f"🧮 Building {args.dtype} compact index over {len(matrix)} x {matrix.shape[1]} embeddings...")
+    start = time.time()
+    compact = CompactIndex.build(matrix, dims=args.dims or None, dtype=args.dtype)
+    compact.save(index_dir)
+    info = describe(compact, matrix)
+    print(f"✅ Built in {time.time() - start:.1f}s — {info['dims']} dims {info['dtype']}: "
+          f"{info['compact_mb']} MB vs {info['full_float32_mb']} MB float32 (x{info['reduction']} smaller)")
+
+    queries = sample_queries(matrix, args.queries)
+    rows = slice(0, len(matrix))
+    report = recall_report(
+        matrix, queries, args.k, "shortlist", parse_values(args.shortlist, low=args.k),
+        lambda i, shortlist: compact.shortlist(queries[i], rows, shortlist),
+    )
+    report["index"] = info
+    print_recall_report(report)
+    if min(row["mean_ms"] for row in report["rows"]) >= report["exact_mean_ms"]:
+        print(f"\n⚠️ The {info['dims']}-dim {info['dtype']} scan is not faster than exact search on this index; "
+              "keep USE_COMPACT_INDEX=false or build with fewer --dims")
+    write_report(report, args.report)
+
+
+if __name__ == "__main__":
+    main()
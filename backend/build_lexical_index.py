@@ -0,0 +1,80 @@
+"""
+Build the BM25 lexical index next to the local vector DB and report how much
+of the exact vector top-k its shortlists contain.
+
+Usage:
+    python build_lexical_index.py [--shortlist 50,100,200,500] [--k 5]
+                                  [--queries 200] [--words 12] [--report report.json]
+
+New builds (build_local_db.py, ingest.py, convert_local_db.py) write the
+lexical index when HYBRID_SEARCH=true; this adds one to an index built
+without it. The
+report samples rows as queries (the row's embedding plus its first `--words`
+words as the question text) and, for each shortlist size, gives recall@k of
+the BM25 shortlist rescored by vector (i.e. the share of the exact top-k it
+contains), so LEXICAL_SHORTLIST can be chosen with real numbers before
+setting HYBRID_SEARCH=true.
+"""
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+
+from index_eval import open_for_build, parse_values, print_recall_report, recall_report, write_report
+from lexical_index import LEXICAL_META_FILE, TOKEN_PATTERN, LexicalIndexBuilder
+from vector_store import DB_DIR
+
+
+def _index_mb(index_dir: str) -> float:
+    names = [n for n in os.listdir(index_dir) if n.startswith("lexical.")]
+    return round(sum(os.path.getsize(os.path.join(index_dir, n)) for n in names) / 2**20, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_DIR)
+    parser.add_argument("--shortlist", default="50,100,200,500")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--words", type=int, default=12, help="Words of a sampled row used as its question")
+    parser.add_argument("--report", default=None, help="Write the shortlist report as JSON")
+    args = parser.parse_args()
+
+    opened = open_for_build(args.db)
+    if opened is None:
+        return
+    index_dir, matrix, metadata = opened
+    print(f"🔤 Building lexical index over {len(metadata)} rows...")
+    start = time.time()
+    spill_dir = os.path.join(index_dir, ".lexical.tmp")
+    os.makedirs(spill_dir, exist_ok=True)
+    try:
+        builder = LexicalIndexBuilder(spill_dir)
+        for row, doc in enumerate(metadata):
+            builder.add(0, row, doc.get("content") or "")
+        lexical = builder.save(index_dir, [0], len(metadata))
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    info = {**lexical.describe(), "disk_mb": _index_mb(index_dir)}
+    print(f"✅ Built in {time.time() - start:.1f}s — {info['terms']} terms, {info['postings']} postings, "
+          f"{info['disk_mb']} MB ({LEXICAL_META_FILE} + arrays)")
+
+    if len(metadata) == 0:
+        return
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(metadata), size=min(args.queries, len(metadata)), replace=False)
+    texts = [" ".join(TOKEN_PATTERN.findall(metadata[int(i)].get("content") or "")[: args.words]) for i in rows]
+    report = recall_report(
+        matrix, np.asarray(matrix[rows], dtype=np.float32), args.k, "shortlist",
+        parse_values(args.shortlist, low=args.k),
+        lambda i, shortlist: lexical.search(texts[i], shortlist)[0],
+    )
+    report["index"] = info
+    print_recall_report(report)
+    write_report(report, args.report)
+
+
+if __name__ == "__main__":
+    main()
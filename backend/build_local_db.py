@@ -1,47 +1,186 @@
+"""
+Build (or incrementally update) the local vector DB.
+
+Every LegalChunk is identified by a hash of (domain, reference, content).
+Embeddings of unchanged chunks are reused from the current index, only new
+or changed chunks are sent to the embeddings API, and chunks that no longer
+exist in Data/ are dropped. Freshly embedded batches are appended to a
+checkpoint file, so an interrupted build resumes where it stopped.
+Repeated articles (exact or near duplicates, see dedup.py) are dropped before
+chunking, so they are neither embedded nor indexed; the dropped copies are
+listed in a report next to the DB and stored with the index as aliases, so a
+cited article that was dropped still resolves to its canonical text.
+
+Chunks are streamed from the loader straight into the embedding scheduler
+and the index writer, so embedding starts while parsing continues and memory
+stays bounded by the in-flight batches rather than the corpus.
+
+Usage:
+    python build_local_db.py [--full]
+"""
+import argparse
 import json
-import time
 import os
-from data_loader import load_legal_texts
-from embedding_service import get_embeddings_batch
+import sys
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from chunker import chunk_legal_texts, embedding_text
+from config import DEDUP
+from data_loader import LegalChunk, chunk_hash, iter_legal_texts
+from dedup import Deduplicator, write_report
+from embedding_backends import check_index_embedding, get_backend
+from embedding_service import embed_batch
+from index_store import IndexWriter, is_index, open_index
+from ingest_scheduler import EmbeddingScheduler, IngestionError
+from vector_store import DB_DIR
+
+CHECKPOINT_PATH = f"{DB_DIR}.checkpoint.jsonl"
+DEDUP_REPORT_PATH = f"{DB_DIR}.dedup.json"
+
+
+def _load_existing(index_dir: str) -> Dict[str, np.ndarray]:
+    """hash → stored embedding for every row of the current index."""
+    if not is_index(index_dir):
+        return {}
+    manifest, matrix, metadata = open_index(index_dir)
+    try:
+        check_index_embedding(manifest.get("embedding"), manifest["dimensions"])
+    except ValueError as e:
+        print(f"⚠️ Not reusing the current index: {e}")
+        return {}
+    existing: Dict[str, np.ndarray] = {}
+    for row_id, row in enumerate(metadata):
+        key = row.get("hash") or chunk_hash(LegalChunk(
+            row["domain"], row["reference"], row["content"], row.get("part") or 1, row.get("parts") or 1
+        ))
+        existing.setdefault(key, matrix[row_id])
+    return existing
+
+
+def _load_checkpoint(path: str) -> Dict[str, List[float]]:
+    """hash → embedding for batches embedded by a previous, interrupted run with the same backend."""
+    backend = get_backend().id
+    done: Dict[str, List[float]] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break  # Torn last line from an interrupted write
+            if record.get("backend", backend) == backend:
+                done[record["hash"]] = record["embedding"]
+    return done
+
 
 def main():
-    db_path = os.path.join(os.path.dirname(__file__), "local_db.json")
-    if os.path.exists(db_path):
-        print(f"✅ local_db.json already exists with size {os.path.getsize(db_path)} bytes.")
-        return
-
-    print("📚 Loading legal texts...")
-    chunks = load_legal_texts()
-    
-    # Process in smaller chunks to avoid rate limit
-    batch_size = 50
-    all_data = []
-
-    print(f"🔢 Generating embeddings for {len(chunks)} chunks...")
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i : i + batch_size]
-        texts_to_embed = [f"{c.domain} — {c.reference}: {c.content}" for c in batch]
-        
-        try:
-            embeddings = get_embeddings_batch(texts_to_embed, batch_size=batch_size)
-            for j, chunk in enumerate(batch):
-                all_data.append({
-                    "id": i + j + 1,
-                    "domain": chunk.domain,
-                    "reference": chunk.reference,
-                    "content": chunk.content,
-                    "embedding": embeddings[j]
-                })
-            time.sleep(1) # Sleep to avoid rate limit
-        except Exception as e:
-            print(f"Error on batch {i}: {e}")
-            break
-
-    # Save to JSON
-    with open(db_path, "w", encoding="utf-8") as f:
-        json.dump(all_data, f, ensure_ascii=False)
-        
-    print(f"✅ Saved {len(all_data)} records to local_db.json")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Ignore the current index and re-embed everything")
+    args = parser.parse_args()
+
+    existing = {} if args.full else _load_existing(DB_DIR)
+    checkpoint = _load_checkpoint(CHECKPOINT_PATH)
+    if checkpoint:
+        print(f"♻️  Resuming: {len(checkpoint)} embeddings found in checkpoint")
+
+    # Rows are written in corpus order; `ready` holds rows that finished out of order
+    backend = get_backend()
+    writer = IndexWriter(DB_DIR, embedding=backend.describe())
+    ready: Dict[int, Tuple[dict, Any]] = {}
+    waiting: Dict[str, List[int]] = {}
+    pending_rows: Dict[int, dict] = {}
+    current = set()
+    counts = {"chunks": 0, "reused": 0}
+    dedup = Deduplicator() if DEDUP else None
+    next_pos = 0
+
+    def flush() -> None:
+        nonlocal next_pos
+        rows, vectors = [], []
+        while next_pos in ready:
+            row, vector = ready.pop(next_pos)
+            rows.append(row)
+            vectors.append(vector)
+            next_pos += 1
+        if rows:
+            writer.add_batch(rows, np.asarray(vectors, dtype=np.float32))
+
+    def items_to_embed() -> Iterator[Tuple[str, str]]:
+        """Walk the corpus, queueing reused rows and yielding texts that need embedding."""
+        articles = iter_legal_texts()
+        if dedup is not None:
+            articles = dedup.filter(articles)
+        for pos, chunk in enumerate(chunk_legal_texts(articles)):
+            key = chunk_hash(chunk)
+            current.add(key)
+            counts["chunks"] += 1
+            row = {
+                "id": pos + 1,
+                "domain": chunk.domain,
+                "reference": chunk.reference,
+                "content": chunk.content,
+                "hash": key,
+                "part": chunk.part,
+                "parts": chunk.parts,
+                "source": chunk.source,
+            }
+            vector = existing.get(key)
+            if vector is None:
+                vector = checkpoint.get(key)
+            if vector is not None:
+                counts["reused"] += 1
+                ready[pos] = (row, vector)
+                flush()
+            elif key in waiting:
+                # Identical chunk already queued: share its embedding
+                waiting[key].append(pos)
+                pending_rows[pos] = row
+            else:
+                waiting[key] = [pos]
+                pending_rows[pos] = row
+                yield key, embedding_text(chunk)
+
+    print(f"📚 Streaming legal texts and embedding new or changed chunks ({backend.id})...")
+    scheduler = EmbeddingScheduler(lambda texts: embed_batch(texts, max_retries=0), **backend.scheduler_options)
+    try:
+        with open(CHECKPOINT_PATH, "a", encoding="utf-8") as ckpt:
+            def on_batch(keys: List[str], embeddings: List[List[float]]) -> None:
+                for key, embedding in zip(keys, embeddings):
+                    ckpt.write(json.dumps({"hash": key, "backend": backend.id, "embedding": embedding}) + "\n")
+                    for pos in waiting.pop(key):
+                        ready[pos] = (pending_rows.pop(pos), embedding)
+                ckpt.flush()
+                flush()
+
+            embedded = scheduler.run(items_to_embed(), on_batch)
+    except IngestionError as e:
+        writer.abort()
+        print(f"❌ {e}")
+        print(f"   Progress is saved in {CHECKPOINT_PATH}; re-run to resume. Index left unchanged.")
+        sys.exit(1)
+    except BaseException:
+        writer.abort()
+        raise
+
+    removed = sum(1 for key in existing if key not in current)
+    if dedup is not None:
+        write_report(dedup.report(), DEDUP_REPORT_PATH)
+        print(f"🧹 {dedup.summary()} (report: {DEDUP_REPORT_PATH})")
+    print(f"🔍 {counts['chunks']} chunks: {counts['reused']} reused, {embedded} embedded, {removed} removed")
+    if embedded:
+        print(f"  📈 {scheduler.stats}")
+
+    # Publish the new binary index
+    if dedup is not None:
+        writer.aliases = dedup.aliases()
+    manifest = writer.close()
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+
+    print(f"✅ Saved {manifest['count']} records to {DB_DIR}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,366 @@
+"""
+Chunk store — persistent table of chunks and their embeddings, selected by
+STORAGE_BACKEND.
+
+    sqlite     — local database file (SQLITE_DB_PATH), the stand-in used when
+                 Azure SQL is out of reach
+    azure_sql  — Azure SQL Database through pyodbc (AZURE_SQL_CONNECTION_STRING)
+
+Both keep one `LegalTexts` table with the chunk metadata and the embedding as
+a float32 BLOB / VARBINARY, plus a `LegalTextsMeta` name/value table recording
+the embedding backend that produced the vectors (see embedding_backends) and
+the aliases of deduplicated articles (see dedup). Writes are bulk `executemany` calls, one
+transaction per batch, on connections borrowed from a small pool. A full
+reload (ingest.py) writes into a staging table and publish_load() swaps it
+for the live one in a single transaction, so a failed run leaves the previous
+contents in place instead of an empty or truncated table. Reads go
+through iter_blocks(), which pages through the table by id and decodes each
+block of embeddings with a single np.frombuffer over the joined blobs, so
+loading vectors never goes row by row.
+"""
+import json
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import pyodbc  # Optional: only needed for STORAGE_BACKEND=azure_sql
+except ImportError:
+    pyodbc = None
+
+from config import (
+    AZURE_SQL_CONNECTION_STRING,
+    SQLITE_DB_PATH,
+    STORAGE_BACKEND,
+    STORE_POOL_SIZE,
+    STORE_READ_BLOCK,
+)
+
+BACKENDS = ("sqlite", "azure_sql")
+TABLE = "LegalTexts"
+STAGING_TABLE = "LegalTexts_staging"
+META_TABLE = "LegalTextsMeta"
+COLUMNS = ("domain", "reference", "content", "hash", "part", "parts", "source", "dimensions", "embedding")
+_METADATA_COLUMNS = ("id", "domain", "reference", "content", "hash", "part", "parts", "source")
+
+
+class ConnectionPool:
+    """At most `size` open connections, created on demand and reused."""
+
+    def __init__(self, connect, size: int = STORE_POOL_SIZE):
+        self._connect = connect
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(max(1, size)):
+            self._slots.put(None)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        self._slots.get()  # blocks while `size` connections are in use
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            reusable = True
+            try:
+                yield conn
+            except BaseException:
+                try:
+                    conn.rollback()
+                except Exception:
+                    reusable = False  # broken connection: closed instead of pooled
+                raise
+            finally:
+                if reusable:
+                    self._idle.put(conn)
+                else:
+                    conn.close()
+        finally:
+            self._slots.put(None)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _rows(chunks: Sequence[Dict[str, Any]], embeddings: Sequence[Sequence[float]]) -> List[Tuple]:
+    if len(chunks) != len(embeddings):
+        raise ValueError(f"{len(chunks)} chunks but {len(embeddings)} embeddings")
+    rows = []
+    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        if embedding is None or len(embedding) == 0:
+            raise ValueError(f"Chunk {i} of the batch has no embedding")
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        rows.append((
+            chunk.get("domain") or "",
+            chunk.get("reference") or "",
+            chunk.get("content") or "",
+            chunk.get("hash"),
+            chunk.get("part") or 1,
+            chunk.get("parts") or 1,
+            chunk.get("source") or "",
+            int(vector.size),
+            vector.tobytes(),
+        ))
+    return rows
+
+
+class ChunkStore:
+    """SQL shared by the backends; subclasses provide connections and dialect."""
+
+    name = ""
+    # Statements are templates over {table}
+    create_sql = ""
+    create_meta_sql = ""
+    drop_sql = ""
+    rename_sql = ""  # {source} → {table}
+    clear_sql: Tuple[str, ...] = ()
+    block_sql = ""  # (last id, block size) → next rows by id
+
+    def __init__(self, pool_size: int = STORE_POOL_SIZE):
+        self.pool = ConnectionPool(self._connect, pool_size)
+
+    def _connect(self):
+        raise NotImplementedError
+
+    def _block_params(self, last_id: int, size: int) -> Tuple:
+        return (last_id, size)
+
+    def describe(self) -> str:
+        return self.name
+
+    def available(self) -> bool:
+        """True when the store can be reached and holds the table."""
+        try:
+            self.count()
+            return True
+        except Exception:
+            return False
+
+    def create_table(self, table: str = TABLE) -> None:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.create_sql.format(table=table))
+            cursor.execute(self.create_meta_sql.format(table=META_TABLE))
+            conn.commit()
+
+    def clear_table(self) -> None:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            for statement in self.clear_sql:
+                cursor.execute(statement.format(table=TABLE))
+            conn.commit()
+
+    def _begin(self, cursor) -> None:
+        """Open a transaction that also covers DDL (pyodbc connections are already in one)."""
+
+    def begin_load(self) -> None:
+        """Start a full reload: rows go to an empty staging table until publish_load()."""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.drop_sql.format(table=STAGING_TABLE))
+            cursor.execute(self.create_sql.format(table=STAGING_TABLE))
+            conn.commit()
+
+    def publish_load(
+        self, embedding: Dict[str, Any] | None = None, aliases: List[Dict[str, Any]] | None = None
+    ) -> None:
+        """
+        Replace the live table by the staging table and record the `embedding`
+        backend of its vectors (embedding_backends.describe) and the dedup
+        `aliases` of the load, atomically.
+        """
+        meta = {"embedding": embedding, "aliases": aliases or None}
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            self._begin(cursor)
+            cursor.execute(self.drop_sql.format(table=TABLE))
+            cursor.execute(self.rename_sql.format(source=STAGING_TABLE, table=TABLE))
+            cursor.execute(self.create_meta_sql.format(table=META_TABLE))
+            for name, value in meta.items():
+                cursor.execute(f"DELETE FROM {META_TABLE} WHERE name = ?", (name,))
+                if value:
+                    cursor.execute(f"INSERT INTO {META_TABLE} (name, value) VALUES (?, ?)",
+                                   (name, json.dumps(value, ensure_ascii=False)))
+            conn.commit()
+
+    def _meta(self, name: str) -> Any:
+        try:
+            with self.pool.connection() as conn:
+                row = conn.cursor().execute(f"SELECT value FROM {META_TABLE} WHERE name = ?", (name,)).fetchone()
+        except Exception:
+            return None  # store filled before the table existed
+        return json.loads(row[0]) if row else None
+
+    def embedding(self) -> Dict[str, Any] | None:
+        """Embedding backend recorded by the last full load (None when unknown)."""
+        return self._meta("embedding")
+
+    def aliases(self) -> List[Dict[str, Any]]:
+        """Deduplicated articles → canonical copy, recorded by the last full load."""
+        return self._meta("aliases") or []
+
+    def abort_load(self) -> None:
+        """Drop the staging table of a failed reload; the live table is untouched."""
+        with self.pool.connection() as conn:
+            conn.cursor().execute(self.drop_sql.format(table=STAGING_TABLE))
+            conn.commit()
+
+    def _cursor(self, conn):
+        return conn.cursor()
+
+    def insert_chunks(
+        self, chunks: Sequence[Dict[str, Any]], embeddings: Sequence[Sequence[float]], table: str = TABLE
+    ) -> int:
+        """Insert a batch in one transaction (all rows or none)."""
+        rows = _rows(chunks, embeddings)
+        if not rows:
+            return 0
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        sql = f"INSERT INTO {table} ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+        with self.pool.connection() as conn:
+            self._cursor(conn).executemany(sql, rows)
+            conn.commit()
+        return len(rows)
+
+    def count(self) -> int:
+        with self.pool.connection() as conn:
+            return int(conn.cursor().execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0])
+
+    def iter_blocks(self, block_rows: int = STORE_READ_BLOCK) -> Iterator[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        """
+        (metadata rows, float32 embedding matrix) per block of up to
+        `block_rows` rows, in id order. Rows of another width than the first
+        one are skipped with a warning.
+        """
+        last_id, dims, skipped = 0, None, 0
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            while True:
+                fetched = cursor.execute(
+                    self.block_sql.format(table=TABLE), self._block_params(last_id, block_rows)
+                ).fetchall()
+                if not fetched:
+                    break
+                last_id = int(fetched[-1][0])
+                if dims is None:
+                    dims = int(fetched[0][-2])
+                kept = [row for row in fetched if int(row[-2]) == dims]
+                skipped += len(fetched) - len(kept)
+                if kept:
+                    matrix = np.frombuffer(b"".join(bytes(row[-1]) for row in kept), dtype=np.float32)
+                    metadata = [dict(zip(_METADATA_COLUMNS, row[: len(_METADATA_COLUMNS)])) for row in kept]
+                    yield metadata, matrix.reshape(len(kept), dims)
+                if len(fetched) < block_rows:
+                    break
+        if skipped:
+            print(f"⚠️ Skipped {skipped} stored rows whose embeddings are not {dims}-dim")
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+_SELECT_COLUMNS = ", ".join(_METADATA_COLUMNS + ("dimensions", "embedding"))
+
+
+class SQLiteChunkStore(ChunkStore):
+    name = "sqlite"
+    create_sql = (
+        "CREATE TABLE IF NOT EXISTS {table} ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "domain TEXT NOT NULL, reference TEXT NOT NULL, content TEXT NOT NULL, hash TEXT, "
+        "part INTEGER NOT NULL DEFAULT 1, parts INTEGER NOT NULL DEFAULT 1, source TEXT NOT NULL DEFAULT '', "
+        "dimensions INTEGER NOT NULL, embedding BLOB NOT NULL)"
+    )
+    create_meta_sql = "CREATE TABLE IF NOT EXISTS {table} (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+    drop_sql = "DROP TABLE IF EXISTS {table}"
+    rename_sql = "ALTER TABLE {source} RENAME TO {table}"
+    clear_sql = ("DELETE FROM {table}", "DELETE FROM sqlite_sequence WHERE name = '{table}'")
+    block_sql = f"SELECT {_SELECT_COLUMNS} FROM {{table}} WHERE id > ? ORDER BY id LIMIT ?"
+
+    def __init__(self, path: str = SQLITE_DB_PATH, pool_size: int = STORE_POOL_SIZE):
+        self.path = path
+        super().__init__(pool_size)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # WAL: readers (search loading) are not blocked by a running ingestion
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _begin(self, cursor) -> None:
+        # The sqlite3 module only opens transactions implicitly before DML
+        cursor.execute("BEGIN")
+
+    def describe(self) -> str:
+        return f"sqlite:{self.path}"
+
+    def available(self) -> bool:
+        # Checked first: connecting would create an empty database file
+        return os.path.exists(self.path) and super().available()
+
+
+class AzureSQLChunkStore(ChunkStore):
+    name = "azure_sql"
+    create_sql = (
+        "IF OBJECT_ID(N'dbo.{table}', N'U') IS NULL CREATE TABLE dbo.{table} ("
+        "id INT IDENTITY(1,1) PRIMARY KEY, "
+        "domain NVARCHAR(400) NOT NULL, reference NVARCHAR(400) NOT NULL, content NVARCHAR(MAX) NOT NULL, "
+        "hash CHAR(64) NULL, part INT NOT NULL DEFAULT 1, parts INT NOT NULL DEFAULT 1, "
+        "source NVARCHAR(400) NOT NULL DEFAULT '', dimensions INT NOT NULL, embedding VARBINARY(MAX) NOT NULL)"
+    )
+    create_meta_sql = (
+        "IF OBJECT_ID(N'dbo.{table}', N'U') IS NULL CREATE TABLE dbo.{table} ("
+        "name NVARCHAR(100) PRIMARY KEY, value NVARCHAR(MAX) NOT NULL)"
+    )
+    drop_sql = "DROP TABLE IF EXISTS dbo.{table}"
+    rename_sql = "EXEC sp_rename 'dbo.{source}', '{table}'"
+    clear_sql = ("TRUNCATE TABLE dbo.{table}",)
+    block_sql = f"SELECT TOP (?) {_SELECT_COLUMNS} FROM dbo.{{table}} WHERE id > ? ORDER BY id"
+
+    def __init__(self, connection_string: str = AZURE_SQL_CONNECTION_STRING, pool_size: int = STORE_POOL_SIZE):
+        if pyodbc is None:
+            raise ValueError("STORAGE_BACKEND=azure_sql needs pyodbc (pip install pyodbc) and an ODBC driver")
+        if not connection_string:
+            raise ValueError("STORAGE_BACKEND=azure_sql needs AZURE_SQL_CONNECTION_STRING")
+        self.connection_string = connection_string
+        super().__init__(pool_size)
+
+    def _connect(self):
+        return pyodbc.connect(self.connection_string, timeout=5, autocommit=False)
+
+    def _block_params(self, last_id: int, size: int) -> Tuple:
+        return (size, last_id)
+
+    def _cursor(self, conn):
+        cursor = conn.cursor()
+        cursor.fast_executemany = True  # one round trip per batch instead of per row
+        return cursor
+
+
+def create_store(name: str = STORAGE_BACKEND) -> ChunkStore:
+    if name == "sqlite":
+        return SQLiteChunkStore()
+    if name == "azure_sql":
+        return AzureSQLChunkStore()
+    raise ValueError(f"Unknown STORAGE_BACKEND {name!r} (expected one of {', '.join(BACKENDS)})")
+
+
+_store: ChunkStore | None = None
+
+
+def get_store() -> ChunkStore:
+    """The configured store (one per process)."""
+    global _store
+    if _store is None:
+        _store = create_store()
+    return _store
@@ -0,0 +1,95 @@
+"""
+Chunker — splits long legal articles into token-bounded pieces before embedding.
+
+Articles are cut at Arabic/Latin sentence boundaries first, then at clause
+boundaries (commas, semicolons) for over-long sentences, and only as a last
+resort between words. Consecutive pieces share up to `overlap_tokens` of
+trailing text so a provision spanning a cut is still retrievable. Every piece
+keeps its parent domain and reference, plus its position (part / parts).
+"""
+import re
+from dataclasses import replace
+from typing import Iterable, Iterator, List
+
+from config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from data_loader import LegalChunk
+from tokenizer import count_tokens
+
+# Split after sentence terminators (keeping them) and at line breaks
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?؟؛])\s+|\n+")
+_CLAUSE_SPLIT = re.compile(r"(?<=[،,;:])\s+")
+
+
+def _segments(text: str, max_tokens: int) -> List[str]:
+    """Break text into units no larger than max_tokens, preferring natural boundaries."""
+    units: List[str] = []
+    for sentence in filter(None, (s.strip() for s in _SENTENCE_SPLIT.split(text))):
+        if count_tokens(sentence) <= max_tokens:
+            units.append(sentence)
+            continue
+        for clause in filter(None, (c.strip() for c in _CLAUSE_SPLIT.split(sentence))):
+            if count_tokens(clause) <= max_tokens:
+                units.append(clause)
+                continue
+            words, current = clause.split(), []
+            for word in words:
+                if current and count_tokens(" ".join(current + [word])) > max_tokens:
+                    units.append(" ".join(current))
+                    current = []
+                current.append(word)
+            if current:
+                units.append(" ".join(current))
+    return units
+
+
+def split_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Split `text` into pieces of at most ~max_tokens with ~overlap_tokens of shared context."""
+    if max_tokens <= 0 or count_tokens(text) <= max_tokens:
+        return [text]
+
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    pieces: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for unit in _segments(text, max_tokens):
+        unit_tokens = count_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            # Carry trailing units forward as overlap
+            carried: List[str] = []
+            carried_tokens = 0
+            for prev in reversed(current):
+                prev_tokens = count_tokens(prev)
+                if carried_tokens + prev_tokens > overlap_tokens:
+                    break
+                carried.insert(0, prev)
+                carried_tokens += prev_tokens
+            if carried_tokens + unit_tokens > max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_legal_texts(
+    chunks: Iterable[LegalChunk],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[LegalChunk]:
+    """Yield token-bounded pieces of each chunk, in order; short chunks pass through unchanged."""
+    for chunk in chunks:
+        pieces = split_text(chunk.content, max_tokens, overlap_tokens)
+        if len(pieces) == 1:
+            yield chunk
+            continue
+        for part, piece in enumerate(pieces, 1):
+            yield replace(chunk, content=piece, part=part, parts=len(pieces))
+
+
+def embedding_text(chunk: LegalChunk) -> str:
+    """Text embedded for a chunk: law and reference (with part/parts for split pieces) before the content."""
+    reference = chunk.reference if chunk.parts == 1 else f"{chunk.reference} ({chunk.part}/{chunk.parts})"
+    return f"{chunk.domain} — {reference}: {chunk.content}"
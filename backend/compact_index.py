@@ -0,0 +1,150 @@
+"""
+Compact index — quantized and/or dimension-truncated copy of the embeddings
+for a cheap first-pass scan.
+
+text-embedding-3 vectors can be truncated to their leading dimensions and
+re-normalized with little loss, and each remaining dimension can be stored as
+int8 with a per-dimension scale. A search scores every candidate against this
+compact copy, keeps a shortlist, and rescores only the shortlist with the
+full-precision rows read from disk, so serving scans the compact copy alone.
+The index is persisted as `compact.npy` + `compact.json` inside the vector DB
+directory and is tied to the row count it was built from.
+
+NumPy has no int8/float16 matrix product on BLAS, so those codes are widened
+to float32 one block at a time before scoring: at full width an int8 scan is
+slower than the exact float32 one. The scan pays off through truncation,
+hence the DEFAULT_DIMS default; build_compact_index.py reports latency and
+recall next to exact search.
+"""
+import json
+import os
+from typing import Any, Dict
+
+import numpy as np
+
+COMPACT_FILE = "compact.npy"
+COMPACT_META_FILE = "compact.json"
+COMPACT_DTYPES = ("int8", "float16", "float32")
+DEFAULT_DIMS = 256  # leading dimensions kept by default (text-embedding-3 truncates well)
+_SCORE_BLOCK = 4096
+
+
+def _truncate(matrix: np.ndarray, dims: int) -> np.ndarray:
+    """Leading `dims` columns of normalized rows, re-normalized."""
+    truncated = np.array(matrix[:, :dims], dtype=np.float32)
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    truncated /= norms
+    return truncated
+
+
+class CompactIndex:
+    """First-pass vectors: `codes` is (count, dims) in int8/float16/float32."""
+
+    def __init__(self, codes: np.ndarray, scale: np.ndarray | None):
+        self.codes = codes
+        self.scale = scale  # per-dimension int8 step, None for float codes
+
+    @property
+    def count(self) -> int:
+        return len(self.codes)
+
+    @property
+    def dims(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes) + (int(self.scale.nbytes) if self.scale is not None else 0)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, dims: int | None = None, dtype: str = "int8") -> "CompactIndex":
+        """Build from the normalized full-precision matrix, `_SCORE_BLOCK` rows at a time."""
+        if dtype not in COMPACT_DTYPES:
+            raise ValueError(f"Unsupported compact dtype: {dtype}")
+        dims = min(dims or matrix.shape[1], matrix.shape[1])
+        codes = np.empty((len(matrix), dims), dtype=dtype)
+
+        scale = None
+        if dtype == "int8":
+            # Symmetric per-dimension range over the whole corpus
+            max_abs = np.zeros(dims, dtype=np.float32)
+            for start in range(0, len(matrix), _SCORE_BLOCK):
+                block = _truncate(matrix[start : start + _SCORE_BLOCK], dims)
+                np.maximum(max_abs, np.abs(block).max(axis=0), out=max_abs)
+            max_abs[max_abs == 0] = 1.0
+            scale = max_abs / 127.0
+
+        for start in range(0, len(matrix), _SCORE_BLOCK):
+            block = _truncate(matrix[start : start + _SCORE_BLOCK], dims)
+            if scale is not None:
+                block = np.clip(np.rint(block / scale), -127, 127)
+            codes[start : start + len(block)] = block
+        return cls(codes, scale)
+
+    def encode_query(self, query: np.ndarray) -> np.ndarray:
+        """Project a normalized full-dimension query into the compact space."""
+        encoded = _truncate(query[None, :], self.dims)[0]
+        return encoded * self.scale if self.scale is not None else encoded
+
+    def scores(self, encoded_query: np.ndarray, rows: slice | np.ndarray) -> np.ndarray:
+        """Approximate cosine scores of `rows`, widening codes one block at a time."""
+        if self.codes.dtype == np.float32:
+            return self.codes[rows] @ encoded_query
+        if isinstance(rows, slice):
+            start, stop = rows.start or 0, self.count if rows.stop is None else rows.stop
+            out = np.empty(max(stop - start, 0), dtype=np.float32)
+            for offset in range(start, stop, _SCORE_BLOCK):
+                end = min(offset + _SCORE_BLOCK, stop)
+                out[offset - start : end - start] = self.codes[offset:end].astype(np.float32) @ encoded_query
+            return out
+        out = np.empty(len(rows), dtype=np.float32)
+        for offset in range(0, len(rows), _SCORE_BLOCK):
+            ids = rows[offset : offset + _SCORE_BLOCK]
+            out[offset : offset + len(ids)] = self.codes[ids].astype(np.float32) @ encoded_query
+        return out
+
+    def shortlist(self, query: np.ndarray, rows: slice | np.ndarray, size: int) -> np.ndarray:
+        """Ids (ascending) of the `size` best rows among `rows` for a normalized query."""
+        row_ids = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else np.asarray(rows)
+        if size >= len(row_ids):
+            return row_ids
+        scores = self.scores(self.encode_query(query), rows)
+        return np.sort(row_ids[np.argpartition(-scores, size - 1)[:size]])
+
+    def save(self, index_dir: str) -> None:
+        np.save(os.path.join(index_dir, COMPACT_FILE), self.codes)
+        meta = {
+            "count": self.count,
+            "dims": self.dims,
+            "dtype": self.codes.dtype.name,
+            "scale": self.scale.tolist() if self.scale is not None else None,
+        }
+        with open(os.path.join(index_dir, COMPACT_META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "CompactIndex | None":
+        path = os.path.join(index_dir, COMPACT_FILE)
+        meta_path = os.path.join(index_dir, COMPACT_META_FILE)
+        if not (os.path.exists(path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        codes = np.load(path, mmap_mode="r")
+        scale = np.asarray(meta["scale"], dtype=np.float32) if meta.get("scale") is not None else None
+        return cls(codes, scale)
+
+
+def describe(index: CompactIndex, full: np.ndarray) -> Dict[str, Any]:
+    """Storage of the compact copy next to the full-precision matrix it mirrors."""
+    full_bytes = int(full.shape[0]) * int(full.shape[1]) * 4
+    return {
+        "count": index.count,
+        "dims": index.dims,
+        "full_dims": int(full.shape[1]),
+        "dtype": index.codes.dtype.name,
+        "compact_mb": round(index.nbytes / 2**20, 2),
+        "full_float32_mb": round(full_bytes / 2**20, 2),
+        "reduction": round(full_bytes / index.nbytes, 1) if index.nbytes else None,
+    }
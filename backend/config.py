@@ -15,10 +15,92 @@ AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-06-01")
 
 # ── Azure SQL Database ────────────────────────────────────────
 AZURE_SQL_CONNECTION_STRING = os.getenv("AZURE_SQL_CONNECTION_STRING", "")
+# Chunk store written by ingest.py (see chunk_store.py): "sqlite" = local file
+# at SQLITE_DB_PATH, "azure_sql" = the database above (needs pyodbc)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", os.path.join(os.path.dirname(__file__), "legal_texts.db"))
+STORE_POOL_SIZE = int(os.getenv("STORE_POOL_SIZE", "4"))  # open connections per process
+STORE_READ_BLOCK = int(os.getenv("STORE_READ_BLOCK", "4096"))  # rows per read when loading embeddings
 
 # ── Data ──────────────────────────────────────────────────────
 DATA_PATH = os.getenv("DATA_PATH", os.path.join(os.path.dirname(__file__), "..", "Data"))
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", str(min(4, os.cpu_count() or 1))))  # 0 = parse in-process
+INCREMENTAL_JSON_THRESHOLD = int(os.getenv("INCREMENTAL_JSON_THRESHOLD", str(64 * 1024 * 1024)))  # bytes
+DEDUP = os.getenv("DEDUP", "true").lower() == "true"  # drop repeated articles before embedding (see dedup.py)
+DEDUP_NEAR_THRESHOLD = float(os.getenv("DEDUP_NEAR_THRESHOLD", "0.9"))  # MinHash Jaccard of a near duplicate; 0 = exact only
 
 # ── RAG Parameters ────────────────────────────────────────────
+# "azure" = Azure OpenAI embeddings, "local" = hashed character n-grams on the CPU (no network)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "azure")
 EMBEDDING_DIMENSIONS = 1536
+LOCAL_EMBEDDING_DIMENSIONS = int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS", "1024"))
 TOP_K_RESULTS = 5
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))  # split longer articles; 0 = never split
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))  # retrieved-context tokens per prompt; 0 = unbounded
+ARTICLE_LOOKUP = os.getenv("ARTICLE_LOOKUP", "true").lower() == "true"  # answer "المادة N من <law>" without vector search
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))  # shingle Jaccard above which a passage is a duplicate
+
+# ── Vector index ──────────────────────────────────────────────
+# "flat" = exact brute-force scan, "ivf" = approximate IVF-Flat (build_ann_index.py)
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+# Workers map one file-backed index read-only (legacy JSON is converted once,
+# float16 gets a float32 copy on disk) instead of each holding a private copy
+SHARED_INDEX = os.getenv("SHARED_INDEX", "true").lower() == "true"
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "5"))  # seconds between checks for a new build; 0 = off
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # required by /api/admin/* endpoints; empty disables them
+# First pass over the int8/truncated copy (build_compact_index.py), then exact
+# rescoring of the best RESCORE_SHORTLIST rows with full-precision vectors
+USE_COMPACT_INDEX = os.getenv("USE_COMPACT_INDEX", "false").lower() == "true"
+RESCORE_SHORTLIST = int(os.getenv("RESCORE_SHORTLIST", "50"))
+# Hybrid retrieval: BM25 over the content (lexical.* in the index) picks a
+# shortlist of LEXICAL_SHORTLIST rows, only those are vector-scored, and the
+# two rankings are merged by reciprocal rank fusion with constant RRF_K
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "false").lower() == "true"
+LEXICAL_SHORTLIST = int(os.getenv("LEXICAL_SHORTLIST", "200"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Result diversity: the top MMR_POOL * top_k candidates are re-selected by
+# maximal marginal relevance (1 = relevance only, the default); a candidate at
+# or above MMR_DUPLICATE_SIMILARITY cosine to an already selected result is
+# skipped. Selected results are always returned in relevance order.
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "1.0"))
+MMR_POOL = int(os.getenv("MMR_POOL", "4"))
+MMR_DUPLICATE_SIMILARITY = float(os.getenv("MMR_DUPLICATE_SIMILARITY", "0.95"))
+
+# ── Query embedding cache ─────────────────────────────────────
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))  # 0 disables the cache
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))  # seconds, 0 = never expire
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")  # SQLite file; empty = memory only
+EMBEDDING_CACHE_DB_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_DB_MAX_ROWS", "100000"))  # 0 = unbounded
+
+# ── Semantic answer cache ─────────────────────────────────────
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))  # 0 disables the cache
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # min cosine similarity
+
+# ── Async pipeline ────────────────────────────────────────────
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))  # threads for CPU-bound vector search
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))  # shared Azure OpenAI pool
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+# ── Query embedding micro-batching ────────────────────────────
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))  # collection window
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))  # 1 disables batching
+
+# ── Request coalescing ────────────────────────────────────────
+# Identical concurrent questions (after normalization) share one pipeline run
+COALESCE_IDENTICAL_REQUESTS = os.getenv("COALESCE_IDENTICAL_REQUESTS", "true").lower() == "true"
+
+# ── Batch questions (/api/chat/batch, batch_questions.py) ─────
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))  # per API request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))  # default concurrent LLM generations
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))  # cap for a request's own setting
+BATCH_EMBED_SIZE = int(os.getenv("BATCH_EMBED_SIZE", "256"))  # questions per embeddings call
+
+# ── Ingestion scheduler ───────────────────────────────────────
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "2100"))  # deployment requests-per-minute quota
+EMBEDDING_TPM = float(os.getenv("EMBEDDING_TPM", "350000"))  # deployment tokens-per-minute quota
+INGEST_BATCH_MAX_TOKENS = int(os.getenv("INGEST_BATCH_MAX_TOKENS", "20000"))
+INGEST_BATCH_MAX_ITEMS = int(os.getenv("INGEST_BATCH_MAX_ITEMS", "256"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "6"))
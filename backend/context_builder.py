@@ -0,0 +1,167 @@
+"""
+Context builder — turns retrieved passages into a token-budgeted prompt block.
+
+1. Adjacent pieces of the same split article (same source file, consecutive
+   parts and row ids) are merged back together (their chunker overlap is
+   removed).
+2. Near-duplicate passages (word-shingle Jaccard >= threshold) are dropped,
+   keeping the most relevant copy.
+3. Passages are added by descending relevance until the token budget is
+   reached; the passage that crosses the budget is truncated, the rest dropped.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set
+
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_DEDUP_THRESHOLD
+from text_normalize import normalize_arabic
+from tokenizer import count_tokens
+
+EMPTY_CONTEXT = "لا توجد نصوص قانونية ذات صلة."
+_MIN_TRUNCATED_TOKENS = 40
+
+
+@dataclass
+class ContextResult:
+    text: str
+    tokens: int
+    passages: int
+    merged: int = 0
+    duplicates: int = 0
+    truncated: int = 0
+    dropped: int = 0
+    used: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def _join_overlapping(left: str, right: str, max_words: int = 120) -> str:
+    """Concatenate two consecutive pieces, removing the words they share at the seam."""
+    left_words, right_words = left.split(), right.split()
+    for size in range(min(max_words, len(left_words), len(right_words)), 0, -1):
+        if left_words[-size:] == right_words[:size]:
+            return " ".join(left_words + right_words[size:])
+    return f"{left} {right}"
+
+
+def _follows(previous: Dict[str, Any], nxt: Dict[str, Any]) -> bool:
+    """
+    True when `nxt` is the piece right after `previous`. Pieces of one article
+    are consecutive rows, so the row ids tell apart articles of different laws
+    (or repeated headings) that share a reference and part count.
+    """
+    if nxt.get("part", 1) != previous.get("part", 1) + 1:
+        return False
+    if previous.get("id") is None or nxt.get("id") is None:
+        return True
+    return nxt["id"] == previous["id"] + 1
+
+
+def _merge_adjacent(results: List[Dict[str, Any]]) -> tuple[List[Dict[str, Any]], int]:
+    """Merge consecutive parts of the same article into one passage scored by its best part."""
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    order: List[tuple] = []
+    for r in results:
+        key = (r["domain"], r.get("source", ""), r["reference"], r.get("parts", 1))
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(r)
+
+    passages: List[Dict[str, Any]] = []
+    merged = 0
+    for key in order:
+        parts = sorted(groups[key], key=lambda r: (r.get("id") or 0, r.get("part", 1)))
+        run, last = dict(parts[0]), parts[0]
+        for nxt in parts[1:]:
+            if _follows(last, nxt):
+                run["content"] = _join_overlapping(run["content"], nxt["content"])
+                run["part"] = nxt.get("part", 1)
+                run["score"] = max(run["score"], nxt["score"])
+                merged += 1
+            else:
+                passages.append(run)
+                run = dict(nxt)
+            last = nxt
+        passages.append(run)
+    passages.sort(key=lambda r: r["score"], reverse=True)
+    return passages, merged
+
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    words = normalize_arabic(text).split()
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Longest word prefix of `text` within max_tokens (binary search)."""
+    words = text.split()
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(" ".join(words[:mid]) + " …") <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo]) + " …"
+
+
+def _format_passage(i: int, r: Dict[str, Any], content: str) -> str:
+    return (
+        f"[{i}] القانون: {r['domain']}\n"
+        f"    المرجع: {r['reference']}\n"
+        f"    النص: {content}\n"
+    )
+
+
+def build_context(
+    results: List[Dict[str, Any]],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+) -> ContextResult:
+    """Assemble the context block for retrieved results within `token_budget` tokens."""
+    if not results:
+        return ContextResult(text=EMPTY_CONTEXT, tokens=count_tokens(EMPTY_CONTEXT), passages=0)
+
+    passages, merged = _merge_adjacent(results)
+
+    kept: List[Dict[str, Any]] = []
+    kept_shingles: List[Set[tuple]] = []
+    duplicates = 0
+    for passage in passages:
+        shingles = _shingles(passage["content"])
+        if any(len(shingles & other) / len(shingles | other) >= dedup_threshold for other in kept_shingles):
+            duplicates += 1
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+
+    blocks: List[str] = []
+    used: List[Dict[str, Any]] = []
+    tokens = truncated = 0
+    for passage in kept:
+        block = _format_passage(len(blocks) + 1, passage, passage["content"])
+        block_tokens = count_tokens(block) + (1 if blocks else 0)  # + joining newline
+        if token_budget > 0 and tokens + block_tokens > token_budget:
+            header_tokens = block_tokens - count_tokens(passage["content"])
+            room = token_budget - tokens - header_tokens
+            if room < _MIN_TRUNCATED_TOKENS:
+                break
+            block = _format_passage(len(blocks) + 1, passage, _truncate(passage["content"], room))
+            block_tokens = count_tokens(block) + (1 if blocks else 0)
+            truncated += 1
+        blocks.append(block)
+        used.append(passage)
+        tokens += block_tokens
+        if truncated:
+            break
+
+    return ContextResult(
+        text="\n".join(blocks) if blocks else EMPTY_CONTEXT,
+        tokens=count_tokens("\n".join(blocks)) if blocks else count_tokens(EMPTY_CONTEXT),
+        passages=len(blocks),
+        merged=merged,
+        duplicates=duplicates,
+        truncated=truncated,
+        dropped=len(kept) - len(blocks),
+        used=used,
+    )
@@ -0,0 +1,79 @@
+"""
+Convert a legacy local_db.json, or the chunk store filled by ingest.py, into
+the binary index format (see index_store).
+
+Usage:
+    python convert_local_db.py [--dtype float16] [--src local_db.json] [--dst local_db]
+    python convert_local_db.py --from-store [--dtype float16] [--dst local_db]
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict
+
+import numpy as np
+
+from chunk_store import get_store
+from embedding_backends import legacy_embedding
+from index_store import IndexWriter, write_index
+from vector_store import DB_DIR, LEGACY_DB_PATH
+
+
+def convert(src: str, dst: str, dtype: str = "float32", embedding: Dict[str, Any] | None = None) -> dict:
+    """Convert a legacy JSON DB; its vectors are recorded as `embedding` (default: legacy_embedding())."""
+    with open(src, "r", encoding="utf-8") as f:
+        docs = json.load(f)
+
+    rows = [doc for doc in docs if doc.get("embedding")]
+    skipped = len(docs) - len(rows)
+    if skipped:
+        print(f"  ⚠️ Skipping {skipped} records without an embedding")
+
+    embeddings = np.asarray([doc["embedding"] for doc in rows], dtype=np.float32)
+    return write_index(dst, rows, embeddings, dtype=dtype, embedding=embedding or legacy_embedding())
+
+
+def convert_store(dst: str, dtype: str = "float32") -> dict:
+    """Stream the configured chunk store (STORAGE_BACKEND) into a new index, block by block."""
+    store = get_store()
+    embedding = store.embedding()
+    if embedding is None:
+        print("  ⚠️ The store does not record its embedding backend; only dimensions will be checked")
+    writer = IndexWriter(dst, dtype, embedding=embedding)
+    writer.aliases = store.aliases()
+    try:
+        for metadata, matrix in store.iter_blocks():
+            writer.add_batch(metadata, matrix)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--src", default=LEGACY_DB_PATH)
+    parser.add_argument("--dst", default=DB_DIR)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--from-store", action="store_true", help="Read the chunk store instead of --src")
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.from_store:
+        store = get_store()
+        if not store.available():
+            print(f"❌ Chunk store {store.describe()} is not reachable or has no LegalTexts table.")
+            return
+        manifest = convert_store(args.dst, args.dtype)
+    elif not os.path.exists(args.src):
+        print(f"❌ {args.src} not found.")
+        return
+    else:
+        manifest = convert(args.src, args.dst, args.dtype)
+    print(f"✅ Wrote {manifest['count']} x {manifest['dimensions']} {manifest['dtype']} index "
+          f"to {args.dst} in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
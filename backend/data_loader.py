@@ -3,13 +3,31 @@ Data loader — recursively reads JSON legal texts from the Data/ directory.
 
 Each JSON file contains an array of objects:
     {"reference": "الفصل X", "contenu": "...النص القانوني"}
+
+iter_legal_texts streams chunks in a stable order while files are parsed in
+parallel; load_legal_texts collects them into a list.
 """
 import os
+import re
 import json
+import hashlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Deque, Iterable, Iterator, List, Tuple, TypeVar
+
+try:
+    import ijson  # Optional: incremental parsing of very large files
+except ImportError:
+    ijson = None
+
+from config import DATA_PATH, LOADER_WORKERS, INCREMENTAL_JSON_THRESHOLD
+
+T = TypeVar("T")
 
-from config import DATA_PATH
+# Editor temp exports ("tmpC6EC.json") are listed after the named laws of their
+# folder, so deduplication keeps the named copy of a text found in both
+_TEMP_EXPORT = re.compile(r"^tmp[0-9A-Fa-f]+\.json$")
 
 
 @dataclass
@@ -17,57 +35,155 @@ class LegalChunk:
     domain: str
     reference: str
     content: str
-
-
-def load_legal_texts(data_path: str | None = None) -> List[LegalChunk]:
+    part: int = 1  # position of this piece when an article is split (see chunker)
+    parts: int = 1
+    source: str = ""  # law the article belongs to: its file name without .json (not hashed)
+
+
+def chunk_hash(chunk: LegalChunk) -> str:
+    """Stable content hash of a chunk, used to detect changes between builds."""
+    fields = [chunk.domain, chunk.reference, chunk.content]
+    if chunk.parts > 1:
+        # Pieces of a split article embed their position too (see chunker)
+        fields.append(f"{chunk.part}/{chunk.parts}")
+    payload = "\x00".join(fields)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _list_json_files(base_path: str) -> List[Tuple[str, str]]:
+    """(filepath, domain) for every JSON file, in a stable sorted order."""
+    files: List[Tuple[str, str]] = []
+    for root, dirs, filenames in os.walk(base_path):
+        dirs.sort()
+        for filename in sorted(filenames, key=lambda name: (bool(_TEMP_EXPORT.match(name)), name)):
+            if not filename.endswith(".json"):
+                continue
+            # Domain = first-level subfolder relative to base_path
+            relative = os.path.relpath(root, base_path)
+            domain = relative.split(os.sep)[0] if relative != "." else os.path.splitext(filename)[0]
+            files.append((os.path.join(root, filename), domain))
+    return files
+
+
+def _source_name(filepath: str) -> str:
+    return os.path.splitext(os.path.basename(filepath))[0]
+
+
+def _entries_to_chunks(entries: Iterable[Any], domain: str, source: str = "") -> Iterator[LegalChunk]:
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        reference = (entry.get("reference") or "").strip()
+        contenu = (entry.get("contenu") or "").strip()
+        if not contenu:
+            continue
+        yield LegalChunk(domain=domain, reference=reference, content=contenu, source=source)
+
+
+def _parse_file(filepath: str, domain: str) -> List[LegalChunk]:
+    """Parse one JSON file completely (runs in a worker process)."""
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+        print(f"⚠ Skipping {filepath}: {exc}")
+        return []
+
+    # Handle both array and single-object formats
+    if isinstance(data, list):
+        entries = data
+    elif isinstance(data, dict):
+        entries = [data]
+    else:
+        print(f"⚠ Unexpected structure in {filepath}")
+        return []
+    return list(_entries_to_chunks(entries, domain, _source_name(filepath)))
+
+
+def _iter_file_incremental(filepath: str, domain: str) -> Iterator[LegalChunk]:
+    """Stream a top-level JSON array entry by entry with ijson, without loading the file."""
+    try:
+        with open(filepath, "rb") as f:
+            yield from _entries_to_chunks(ijson.items(f, "item"), domain, _source_name(filepath))
+    except ijson.JSONError as exc:
+        print(f"⚠ Skipping rest of {filepath}: {exc}")
+
+
+def iter_legal_texts(
+    data_path: str | None = None,
+    workers: int | None = LOADER_WORKERS,
+    incremental_threshold: int = INCREMENTAL_JSON_THRESHOLD,
+) -> Iterator[LegalChunk]:
     """
-    Walk the data directory and yield LegalChunk objects.
-    The domain is derived from the immediate subfolder name.
+    Yield LegalChunk objects in a stable order (sorted paths, file order).
+    Files are parsed ahead of the consumer by a process pool, at most
+    2 * workers files at a time, so memory stays bounded while downstream
+    stages (e.g. embedding) start before parsing finishes. Files larger than
+    `incremental_threshold` bytes are streamed with ijson when it is installed.
+    workers=0 parses everything in the calling process.
     """
     base_path = data_path or DATA_PATH
-    chunks: List[LegalChunk] = []
-
     if not os.path.isdir(base_path):
         raise FileNotFoundError(f"Data directory not found: {base_path}")
 
-    for root, _dirs, files in os.walk(base_path):
-        for filename in files:
-            if not filename.endswith(".json"):
-                continue
+    files = _list_json_files(base_path)
+    if workers is None:
+        workers = os.cpu_count() or 1
 
-            filepath = os.path.join(root, filename)
-            # Domain = first-level subfolder relative to base_path
-            relative = os.path.relpath(root, base_path)
-            domain = relative.split(os.sep)[0] if relative != "." else os.path.splitext(filename)[0]
+    def is_large(filepath: str) -> bool:
+        return ijson is not None and os.path.getsize(filepath) > incremental_threshold
 
-            try:
-                with open(filepath, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-            except (json.JSONDecodeError, UnicodeDecodeError) as exc:
-                print(f"⚠ Skipping {filepath}: {exc}")
-                continue
-
-            # Handle both array and single-object formats
-            if isinstance(data, list):
-                entries = data
-            elif isinstance(data, dict):
-                entries = [data]
+    if workers <= 0:
+        for filepath, domain in files:
+            if is_large(filepath):
+                yield from _iter_file_incremental(filepath, domain)
             else:
-                print(f"⚠ Unexpected structure in {filepath}")
-                continue
+                yield from _parse_file(filepath, domain)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        ahead: Deque[Tuple[str, str, Future | None]] = deque()
+        remaining = iter(files)
+
+        def refill() -> None:
+            while len(ahead) < 2 * workers:
+                try:
+                    filepath, domain = next(remaining)
+                except StopIteration:
+                    return
+                # Large files are streamed in this process when their turn comes
+                future = None if is_large(filepath) else pool.submit(_parse_file, filepath, domain)
+                ahead.append((filepath, domain, future))
+
+        refill()
+        while ahead:
+            filepath, domain, future = ahead.popleft()
+            refill()
+            if future is None:
+                yield from _iter_file_incremental(filepath, domain)
+            else:
+                yield from future.result()
+
 
-            for entry in entries:
-                reference = entry.get("reference", "").strip()
-                contenu = entry.get("contenu", "").strip()
-                if not contenu:
-                    continue
+def iter_batches(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Group any iterable into lists of at most `size` items."""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-                chunks.append(LegalChunk(
-                    domain=domain,
-                    reference=reference,
-                    content=contenu,
-                ))
 
+def load_legal_texts(data_path: str | None = None) -> List[LegalChunk]:
+    """
+    Load every LegalChunk into a list (see iter_legal_texts for streaming).
+    The domain is derived from the immediate subfolder name.
+    """
+    base_path = data_path or DATA_PATH
+    chunks = list(iter_legal_texts(base_path))
     print(f"✅ Loaded {len(chunks)} legal text chunks from {base_path}")
     return chunks
 
@@ -0,0 +1,192 @@
+"""
+Deduplication — drops repeated legal texts before they are chunked and embedded.
+
+Two passes over each article, in corpus order (the first copy seen is the
+canonical one that gets indexed):
+    exact  — SHA-256 of the normalized content (diacritics, tatweel, letter
+             variants and whitespace folded), whatever the domain or reference
+    near   — MinHash signature over word 3-shingles of the normalized
+             content; LSH banding finds earlier articles sharing a band and a
+             candidate is a duplicate when the estimated Jaccard similarity of
+             the signatures reaches the threshold
+
+The stage is a generator, so it slots between iter_legal_texts and the
+chunker without holding the corpus: memory grows with one signature per
+canonical article (num_perm uint32 values). Deduplicator.report() lists every
+dropped article with its canonical copy, for review.
+
+A dropped article can still be a distinct provision that merely has the same
+wording (المادة 7 of law 112.14 and المادة 8 of law 111.14), so its
+(domain, source, reference) is kept as an alias of the canonical copy
+(Deduplicator.aliases()); builds store the aliases with the index and the
+article lookup resolves them.
+
+Usage (report only, nothing is built):
+    python dedup.py [--threshold 0.9] [--report dedup.json]
+"""
+import argparse
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from config import DEDUP_NEAR_THRESHOLD
+from data_loader import LegalChunk
+from text_normalize import normalize_query
+
+_PRIME = np.uint64(4294967291)  # largest prime below 2^32
+_SHINGLE_SIZE = 3
+
+
+def _shingle_hashes(words: List[str]) -> np.ndarray:
+    if len(words) <= _SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i : i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)]
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in set(shingles)), dtype=np.uint64)
+
+
+class MinHasher:
+    """MinHash signatures with `bands` x `rows` permutations (universal hashing mod a 32-bit prime)."""
+
+    def __init__(self, bands: int = 16, rows: int = 8, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.default_rng(seed)
+        # a, b < p and shingle hashes (CRC-32) < 2^32, so a * h + b fits in 64 bits
+        self._a = rng.integers(1, int(_PRIME), size=bands * rows, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=bands * rows, dtype=np.uint64)
+
+    def signature(self, words: List[str]) -> np.ndarray:
+        hashes = _shingle_hashes(words)
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows : (band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+
+def _describe(chunk: LegalChunk) -> Dict[str, str]:
+    return {"domain": chunk.domain, "source": chunk.source, "reference": chunk.reference}
+
+
+class Deduplicator:
+    def __init__(self, near_threshold: float = DEDUP_NEAR_THRESHOLD, hasher: MinHasher | None = None):
+        self.near_threshold = near_threshold
+        self.hasher = hasher or MinHasher()
+        self._exact: Dict[str, int] = {}  # content hash → canonical number
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self._signatures: List[np.ndarray] = []
+        self._canonical: List[Dict[str, str]] = []
+        self.seen = 0
+        self.duplicates: List[Dict[str, Any]] = []
+
+    def _near_duplicate(self, signature: np.ndarray) -> Tuple[int, float] | None:
+        candidates = {c for key in self.hasher.band_keys(signature) for c in self._buckets.get(key, ())}
+        best = None
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= self.near_threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    def check(self, chunk: LegalChunk) -> bool:
+        """True to keep `chunk` (a new canonical text), False for a duplicate of an earlier one."""
+        self.seen += 1
+        normalized = normalize_query(chunk.content)
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        match = None
+        if digest in self._exact:
+            match = ("exact", self._exact[digest], 1.0)
+        elif self.near_threshold > 0:
+            words = normalized.split()
+            signature = self.hasher.signature(words)
+            near = self._near_duplicate(signature)
+            if near is not None:
+                match = ("near", near[0], near[1])
+        if match is not None:
+            kind, canonical, similarity = match
+            self.duplicates.append({
+                **_describe(chunk),
+                "kind": kind,
+                "similarity": round(similarity, 3),
+                "canonical": self._canonical[canonical],
+            })
+            return False
+
+        number = len(self._canonical)
+        self._exact[digest] = number
+        self._canonical.append(_describe(chunk))
+        if self.near_threshold > 0:
+            self._signatures.append(signature)
+            for key in self.hasher.band_keys(signature):
+                self._buckets.setdefault(key, []).append(number)
+        return True
+
+    def filter(self, chunks: Iterable[LegalChunk]) -> Iterator[LegalChunk]:
+        for chunk in chunks:
+            if self.check(chunk):
+                yield chunk
+
+    def aliases(self) -> List[Dict[str, Any]]:
+        """(domain, source, reference) of every dropped article with the canonical copy it points to."""
+        return [
+            {"domain": d["domain"], "source": d["source"], "reference": d["reference"], "canonical": d["canonical"]}
+            for d in self.duplicates
+        ]
+
+    def report(self) -> Dict[str, Any]:
+        by_source: Dict[str, int] = {}
+        for dup in self.duplicates:
+            name = f"{dup['domain']}/{dup['source']}"
+            by_source[name] = by_source.get(name, 0) + 1
+        return {
+            "articles": self.seen,
+            "kept": len(self._canonical),
+            "exact_duplicates": sum(1 for d in self.duplicates if d["kind"] == "exact"),
+            "near_duplicates": sum(1 for d in self.duplicates if d["kind"] == "near"),
+            "near_threshold": self.near_threshold,
+            "dropped_by_source": dict(sorted(by_source.items(), key=lambda item: -item[1])),
+            "duplicates": self.duplicates,
+        }
+
+    def summary(self) -> str:
+        report = self.report()
+        return (f"{report['articles']} articles: {report['kept']} kept, {report['exact_duplicates']} exact "
+                f"and {report['near_duplicates']} near duplicates dropped")
+
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    from data_loader import iter_legal_texts
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=DEDUP_NEAR_THRESHOLD,
+                        help="Estimated Jaccard similarity for near duplicates (0 = exact only)")
+    parser.add_argument("--report", default=None, help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    dedup = Deduplicator(args.threshold)
+    for _ in dedup.filter(iter_legal_texts()):
+        pass
+    report = dedup.report()
+    print(f"🧹 {dedup.summary()}")
+    for source, count in report["dropped_by_source"].items():
+        print(f"  📄 {source}: {count}")
+    for dup in report["duplicates"][:20]:
+        canonical = dup["canonical"]
+        print(f"  • {dup['source']} {dup['reference']} ≈ {canonical['source']} {canonical['reference']} "
+              f"({dup['kind']}, {dup['similarity']})")
+    if args.report:
+        write_report(report, args.report)
+        print(f"\n📝 Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Embedding backends — where vectors come from, selected by EMBEDDING_BACKEND.
+
+    azure  — Azure OpenAI embeddings deployment (text-embedding-3-small, 1536 dims)
+    local  — hashed Arabic character n-grams on the CPU: no network, no model
+             file, deterministic across processes and machines
+
+Every backend has an `id` naming the vector space it produces (backend, model
+and dimensions). Index builds record it in the manifest and the vector store
+refuses to serve an index with another id, since scores between vectors of
+different spaces are meaningless.
+"""
+import asyncio
+from typing import Any, Dict, List
+
+import numpy as np
+from openai import AzureOpenAI
+
+from async_clients import get_async_client
+from config import (
+    AZURE_OPENAI_ENDPOINT,
+    AZURE_OPENAI_API_KEY,
+    AZURE_OPENAI_API_VERSION,
+    AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+    EMBEDDING_BACKEND,
+    EMBEDDING_DIMENSIONS,
+    LOCAL_EMBEDDING_DIMENSIONS,
+)
+from text_normalize import normalize_query
+
+BACKENDS = ("azure", "local")
+
+
+class EmbeddingBackend:
+    name = ""
+    dimensions = 0
+    # Keyword arguments for ingest_scheduler.EmbeddingScheduler (rate limits, concurrency)
+    scheduler_options: Dict[str, Any] = {}
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}:{self.dimensions}"
+
+    def describe(self) -> Dict[str, Any]:
+        """What index manifests record about the vectors they hold."""
+        return {"backend": self.id, "dimensions": self.dimensions}
+
+    def embed(self, texts: List[str], max_retries: int | None = None) -> List[List[float]]:
+        raise NotImplementedError
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class AzureEmbeddingBackend(EmbeddingBackend):
+    name = "azure"
+    dimensions = EMBEDDING_DIMENSIONS
+
+    def __init__(self, deployment: str = AZURE_OPENAI_EMBEDDING_DEPLOYMENT):
+        self.deployment = deployment
+        self._client: AzureOpenAI | None = None
+
+    @property
+    def id(self) -> str:
+        return f"azure:{self.deployment}:{self.dimensions}"
+
+    def _get_client(self) -> AzureOpenAI:
+        if self._client is None:
+            self._client = AzureOpenAI(
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_API_KEY,
+                api_version=AZURE_OPENAI_API_VERSION,
+            )
+        return self._client
+
+    def embed(self, texts: List[str], max_retries: int | None = None) -> List[List[float]]:
+        client = self._get_client()
+        if max_retries is not None:
+            client = client.with_options(max_retries=max_retries)
+        response = client.embeddings.create(input=texts, model=self.deployment)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        response = await get_async_client().embeddings.create(input=texts, model=self.deployment)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+# Rolling-hash constants: 64-bit arithmetic wraps, so hashes are identical everywhere
+_PRIME = np.uint64(1099511628211)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_SEPARATOR = 0  # code point between documents of a batch; no n-gram crosses it
+
+
+class HashedNGramBackend(EmbeddingBackend):
+    """
+    Character n-grams (3 to 5 by default) of the normalized text, with spaces
+    marking word edges so short Arabic words and affixes still match. N-grams
+    are hashed into `dimensions` signed buckets; counts are log-scaled and the
+    vector L2-normalized. A whole batch is encoded with array operations: the
+    texts are concatenated, every n-gram hash is computed at once as a rolling
+    hash over the code points, and bucket counts are summed with one bincount.
+    """
+
+    name = "local"
+    scheduler_options = {"requests_per_minute": 1e9, "tokens_per_minute": 1e12}
+
+    def __init__(self, dimensions: int = LOCAL_EMBEDDING_DIMENSIONS, ngram_range: tuple = (3, 5)):
+        if dimensions <= 0:
+            raise ValueError("Local embedding dimensions must be positive")
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+
+    @property
+    def id(self) -> str:
+        low, high = self.ngram_range
+        return f"local:char{low}-{high}:{self.dimensions}"
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dimensions) float32 matrix of unit rows (all-zero for empty text)."""
+        out = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        if not texts:
+            return out
+        docs = [f" {normalize_query(t)} " for t in texts]
+        joined = "\x00".join(docs)
+        codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        doc_of = np.repeat(np.arange(len(docs)), [len(d) + 1 for d in docs])[: len(codes)]
+        separators = np.concatenate(([0], np.cumsum(codes == _SEPARATOR)))
+
+        buckets, weights, rows = [], [], []
+        low, high = self.ngram_range
+        with np.errstate(over="ignore"):
+            for n in range(low, high + 1):
+                windows = len(codes) - n + 1
+                if windows <= 0:
+                    continue
+                valid = separators[n : n + windows] == separators[:windows]
+                h = np.full(windows, n, dtype=np.uint64)
+                for j in range(n):
+                    h = h * _PRIME + codes[j : j + windows]
+                h = h[valid] * _MIX
+                h ^= h >> np.uint64(29)
+                buckets.append((h % np.uint64(self.dimensions)).astype(np.int64))
+                weights.append(np.where(h >> np.uint64(63), -1.0, 1.0))
+                rows.append(doc_of[:windows][valid])
+        if not buckets:
+            return out
+
+        flat = np.concatenate(rows) * self.dimensions + np.concatenate(buckets)
+        counts = np.bincount(flat, weights=np.concatenate(weights), minlength=out.size)
+        out[:] = counts.reshape(out.shape)
+        np.copysign(np.log1p(np.abs(out)), out, out=out)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        out /= norms
+        return out
+
+    def embed(self, texts: List[str], max_retries: int | None = None) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        # Microseconds per text: not worth a thread hop for single queries
+        if len(texts) <= 16:
+            return self.embed(texts)
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed, texts)
+
+
+def create_backend(name: str = EMBEDDING_BACKEND) -> EmbeddingBackend:
+    if name == "azure":
+        return AzureEmbeddingBackend()
+    if name == "local":
+        return HashedNGramBackend()
+    raise ValueError(f"Unknown EMBEDDING_BACKEND {name!r} (expected one of {', '.join(BACKENDS)})")
+
+
+_backend: EmbeddingBackend | None = None
+
+
+def get_backend() -> EmbeddingBackend:
+    """The configured backend (one per process)."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+def legacy_embedding() -> Dict[str, Any]:
+    """
+    What a legacy local_db.json holds: it was written before backends existed,
+    when the Azure OpenAI deployment was the only source of vectors.
+    """
+    return AzureEmbeddingBackend().describe()
+
+
+def check_index_embedding(recorded: Dict[str, Any] | None, dimensions: int) -> None:
+    """
+    Raise ValueError when an index was not built by the configured backend.
+    Indexes from before backends were recorded only have their dimensions
+    checked.
+    """
+    backend = get_backend()
+    if recorded and recorded.get("backend") != backend.id:
+        raise ValueError(
+            f"Index was built with embedding backend {recorded.get('backend')!r} but EMBEDDING_BACKEND "
+            f"gives {backend.id!r}; rebuild it (build_local_db.py --full) or change EMBEDDING_BACKEND"
+        )
+    if dimensions and dimensions != backend.dimensions:
+        raise ValueError(
+            f"Index has {dimensions}-dim embeddings but backend {backend.id!r} produces {backend.dimensions}"
+        )
@@ -0,0 +1,90 @@
+"""
+Micro-batcher for concurrent single-text embedding requests.
+
+Requests arriving within `max_wait_ms` of each other (or until `max_batch_size`
+is reached) are sent upstream as one batched embeddings call, and each caller
+gets its own vector back. If the batch fails because of one bad input, every
+text is retried alone so only the offending caller sees the error; transient
+failures (rate limits, network) are propagated to every caller in the batch.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import openai
+
+BatchEmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class EmbeddingBatcher:
+    def __init__(self, embed_batch: BatchEmbedFn, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self._embed_batch = embed_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set = set()
+
+        self.requests = 0
+        self.batches = 0
+        self.upstream_inputs = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            # Keep a reference so the task is not garbage-collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # Identical texts in one window are embedded once
+        unique = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.upstream_inputs += len(unique)
+        try:
+            vectors = dict(zip(unique, await self._embed_batch(unique)))
+        except openai.BadRequestError as exc:
+            if len(unique) == 1:
+                self._fail(batch, exc)
+                return
+            # One invalid input rejects the whole call: retry each text alone
+            await asyncio.gather(*(
+                self._run([item for item in batch if item[0] == text]) for text in unique
+            ))
+            return
+        except Exception as exc:
+            self._fail(batch, exc)
+            return
+
+        for text, future in batch:
+            if not future.done():
+                future.set_result(vectors[text])
+
+    @staticmethod
+    def _fail(batch: List[Tuple[str, asyncio.Future]], error: BaseException) -> None:
+        for _text, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "upstream_inputs": self.upstream_inputs,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
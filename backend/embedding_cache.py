@@ -0,0 +1,184 @@
+"""
+Embedding cache — bounded in-memory LRU with TTL and an optional SQLite tier.
+
+Keys are derived from the normalized query text (see text_normalize) and the
+embedding deployment, so spelling variants of the same question share one
+entry and switching models never serves stale vectors. The SQLite tier
+survives restarts; entries found there are promoted back into memory.
+
+Disk writes never run on the caller (the event loop, for aget_embedding):
+put() queues the row and a writer thread commits queued rows in batches,
+then prunes expired rows and the oldest rows beyond `max_db_rows`.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import numpy as np
+
+from text_normalize import normalize_query
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400,
+        db_path: str = "",
+        max_db_rows: int = 100000,
+        flush_seconds: float = 1.0,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_db_rows = max_db_rows
+        self.flush_seconds = flush_seconds
+        self._entries: "OrderedDict[str, tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._pending: Dict[str, tuple[float, bytes]] = {}
+        self._wake = threading.Event()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_writes = 0
+        self.disk_pruned = 0
+        self._miss_seconds = 0.0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, created_at REAL NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+            self._prune()
+            self._db.commit()
+            threading.Thread(target=self._write_loop, name="embedding-cache-writer", daemon=True).start()
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        normalized = normalize_query(text)
+        return hashlib.sha1(f"{model}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, vector: List[float]) -> None:
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> List[float] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._pending.get(key)
+                if row is None:
+                    with self._db_lock:
+                        row = self._db.execute(
+                            "SELECT created_at, vector FROM embeddings WHERE key = ?", (key,)
+                        ).fetchone()
+                if row is not None and not self._expired(row[0]):
+                    vector = np.frombuffer(row[1], dtype=np.float32).tolist()
+                    self._remember(key, row[0], vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+
+            return None
+
+    def put(self, key: str, vector: List[float], miss_seconds: float = 0.0) -> None:
+        """Store a freshly computed vector; `miss_seconds` is what it cost to compute."""
+        created_at = time.time()
+        with self._lock:
+            self.misses += 1
+            self._miss_seconds += miss_seconds
+            self._remember(key, created_at, vector)
+            if self._db is not None:
+                self._pending[key] = (created_at, np.asarray(vector, dtype=np.float32).tobytes())
+                if len(self._pending) >= 256:
+                    self._wake.set()
+
+    def _write_loop(self) -> None:
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠️ Embedding cache write failed: {e}")
+
+    def flush(self) -> None:
+        """Commit queued vectors to the SQLite tier in one transaction and prune it."""
+        if self._db is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, created_at, vector) VALUES (?, ?, ?)",
+                [(key, created_at, vector) for key, (created_at, vector) in pending.items()],
+            )
+            self._prune()
+            self._db.commit()
+        with self._lock:
+            self.disk_writes += len(pending)
+
+    def _prune(self) -> None:
+        """Drop expired rows, then the oldest beyond max_db_rows (caller commits)."""
+        pruned = 0
+        if self.ttl_seconds > 0:
+            pruned += self._db.execute(
+                "DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+        if self.max_db_rows > 0:
+            pruned += self._db.execute(
+                "DELETE FROM embeddings WHERE created_at <= "
+                "(SELECT created_at FROM embeddings ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+                (self.max_db_rows,),
+            ).rowcount
+        self.disk_pruned += pruned
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_miss_ms = self._miss_seconds * 1000 / self.misses if self.misses else 0.0
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_writes": self.disk_writes,
+                "disk_pruned": self.disk_pruned,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "avg_miss_ms": round(avg_miss_ms, 1),
+                # Each hit skipped one upstream call of roughly the average miss cost
+                "estimated_saved_ms": round(self.hits * avg_miss_ms, 1),
+            }
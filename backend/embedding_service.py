@@ -1,38 +1,132 @@
 """
-Embedding service — wraps Azure OpenAI text-embedding-3-small.
+Embedding service — embeds texts with the configured backend (Azure OpenAI
+text-embedding-3-small by default, see embedding_backends).
+Single-query embeddings go through an LRU/TTL cache (see embedding_cache).
 """
-from typing import List
-from openai import AzureOpenAI
+import time
+from typing import List, Dict, Any
 
 from config import (
-    AZURE_OPENAI_ENDPOINT,
-    AZURE_OPENAI_API_KEY,
-    AZURE_OPENAI_API_VERSION,
-    AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_TTL,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_DB_MAX_ROWS,
+    EMBEDDING_BATCH_WINDOW_MS,
+    EMBEDDING_BATCH_MAX_SIZE,
+    BATCH_EMBED_SIZE,
+)
+from embedding_backends import get_backend
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache
+
+_cache: EmbeddingCache | None = (
+    EmbeddingCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_DB_MAX_ROWS)
+    if EMBEDDING_CACHE_SIZE > 0
+    else None
 )
 
-_client: AzureOpenAI | None = None
 
+def _cache_key(text: str) -> str:
+    # Keyed on the backend id, so switching backends never serves stale vectors
+    return EmbeddingCache.make_key(text, get_backend().id)
 
-def _get_client() -> AzureOpenAI:
-    global _client
-    if _client is None:
-        _client = AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=AZURE_OPENAI_API_VERSION,
-        )
-    return _client
+
+def _embed_one(text: str) -> List[float]:
+    return get_backend().embed([text])[0]
 
 
 def get_embedding(text: str) -> List[float]:
-    """Generate embedding for a single text string."""
-    client = _get_client()
-    response = client.embeddings.create(
-        input=[text],
-        model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
-    )
-    return response.data[0].embedding
+    """Generate embedding for a single text string (cached on normalized text)."""
+    if _cache is None:
+        return _embed_one(text)
+
+    key = _cache_key(text)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    start = time.perf_counter()
+    embedding = _embed_one(text)
+    _cache.put(key, embedding, miss_seconds=time.perf_counter() - start)
+    return embedding
+
+
+async def _aembed_batch(texts: List[str]) -> List[List[float]]:
+    return await get_backend().aembed(texts)
+
+
+_batcher = EmbeddingBatcher(_aembed_batch, EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_WINDOW_MS)
+
+
+async def _aembed_one(text: str) -> List[float]:
+    if EMBEDDING_BATCH_MAX_SIZE <= 1:
+        return (await _aembed_batch([text]))[0]
+    # Concurrent callers within the batching window share one upstream call
+    return await _batcher.embed(text)
+
+
+async def aget_embedding(text: str) -> List[float]:
+    """Async variant of get_embedding, sharing the same cache."""
+    if _cache is None:
+        return await _aembed_one(text)
+
+    key = _cache_key(text)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    start = time.perf_counter()
+    embedding = await _aembed_one(text)
+    _cache.put(key, embedding, miss_seconds=time.perf_counter() - start)
+    return embedding
+
+
+async def aget_embeddings(texts: List[str], batch_size: int = BATCH_EMBED_SIZE) -> List[List[float]]:
+    """
+    Embed many texts in input order. Cache hits are reused; the remaining
+    distinct texts go upstream `batch_size` at a time and are cached.
+    """
+    results: List[List[float] | None] = [None] * len(texts)
+    missing: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        if _cache is not None:
+            cached = _cache.get(_cache_key(text))
+            if cached is not None:
+                results[i] = cached
+                continue
+        missing.setdefault(text, []).append(i)
+
+    unique = list(missing)
+    for start in range(0, len(unique), batch_size):
+        batch = unique[start : start + batch_size]
+        started = time.perf_counter()
+        vectors = await _aembed_batch(batch)
+        per_text = (time.perf_counter() - started) / len(batch)
+        for text, vector in zip(batch, vectors):
+            if _cache is not None:
+                key = _cache_key(text)
+                _cache.put(key, vector, miss_seconds=per_text)
+            for i in missing[text]:
+                results[i] = vector
+    return results
+
+
+def get_cache_stats() -> Dict[str, Any] | None:
+    """Hit/miss counters of the query embedding cache (None when disabled)."""
+    return _cache.stats() if _cache is not None else None
+
+
+def get_batcher_stats() -> Dict[str, Any]:
+    """Request vs upstream batch counters of the async micro-batcher."""
+    return _batcher.stats()
+
+
+def embed_batch(texts: List[str], max_retries: int | None = None) -> List[List[float]]:
+    """
+    One embeddings call for `texts`. Pass max_retries=0 when the caller
+    (e.g. the ingestion scheduler) handles retries and rate limits itself.
+    """
+    return get_backend().embed(texts, max_retries=max_retries)
 
 
 def get_embeddings_batch(texts: List[str], batch_size: int = 100) -> List[List[float]]:
@@ -41,17 +135,11 @@ def get_embeddings_batch(texts: List[str], batch_size: int = 100) -> List[List[f
     Azure OpenAI allows up to ~2048 inputs per call, but we keep batches
     small to avoid timeouts and memory issues.
     """
-    client = _get_client()
     all_embeddings: List[List[float]] = []
 
     for i in range(0, len(texts), batch_size):
         batch = texts[i : i + batch_size]
-        response = client.embeddings.create(
-            input=batch,
-            model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
-        )
-        batch_embeddings = [item.embedding for item in response.data]
-        all_embeddings.extend(batch_embeddings)
+        all_embeddings.extend(embed_batch(batch))
         print(f"  🔢 Embedded {min(i + batch_size, len(texts))}/{len(texts)}")
 
     return all_embeddings
@@ -0,0 +1,108 @@
+"""
+Local fake of the Azure OpenAI embeddings endpoint, for exercising ingestion
+(retries, rate limiting, batching) without network access or quota.
+
+Vectors are deterministic per input text. A fraction of requests can be
+answered with 429 + Retry-After, and an artificial latency can be added.
+
+Usage:
+    python fake_embedding_server.py --port 8089 --rate-limit 0.1 --latency-ms 50
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089 AZURE_OPENAI_API_KEY=fake python build_local_db.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_vector(text: str, dimensions: int) -> list:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).normal(size=dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def make_handler(dimensions: int, rate_limit: float, retry_after: float, latency_ms: float):
+    counters = {"requests": 0, "rate_limited": 0, "inputs": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_args):
+            pass
+
+        def _send(self, status: int, payload: dict, headers: dict | None = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with lock:
+                self._send(200, dict(counters))
+
+        def do_POST(self):
+            if not self.path.split("?")[0].endswith("/embeddings"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            inputs = request.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+
+            with lock:
+                counters["requests"] += 1
+                limited = random.random() < rate_limit
+                if limited:
+                    counters["rate_limited"] += 1
+                else:
+                    counters["inputs"] += len(inputs)
+            if limited:
+                self._send(
+                    429,
+                    {"error": {"code": "429", "message": "Rate limit reached (fake)"}},
+                    {"Retry-After": str(retry_after)},
+                )
+                return
+
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            dims = request.get("dimensions") or dimensions
+            self._send(200, {
+                "object": "list",
+                "model": request.get("model", "fake"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_vector(text, dims)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            })
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", args.port),
+        make_handler(args.dimensions, args.rate_limit, args.retry_after, args.latency_ms),
+    )
+    print(f"🧪 Fake embeddings server on http://127.0.0.1:{args.port} (GET / for counters)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
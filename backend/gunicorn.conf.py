@@ -0,0 +1,22 @@
+"""
+Gunicorn configuration for running several Uvicorn workers on one host.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The index is prepared once in the master before workers are forked: a legacy
+local_db.json is converted to the binary index and a float16 index gets its
+float32 copy on disk. Each worker then maps the same files read-only, so the
+corpus is held once in the page cache however many workers run.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))  # streamed answers can be long
+
+
+def on_starting(_server):
+    from vector_store import prepare_index
+
+    prepare_index()
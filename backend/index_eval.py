@@ -0,0 +1,127 @@
+"""
+Index evaluation — offline recall@k and latency of the optional first-pass
+indexes (IVF, compact, lexical) against exact search.
+
+Every first pass works the same way at query time: it proposes a candidate
+set and the full-precision vectors rescore it. So each build script only
+supplies its candidate function; exact ground truth, rescoring, timing and
+the report layout live here, along with the open-snapshot and report-file
+steps the build scripts share.
+"""
+import json
+import math
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from index_store import is_index, open_index, resolve_index
+
+
+def exact_top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> List[List[int]]:
+    """Row ids of the exact top-k by inner product, best first, for each query."""
+    scores = queries @ matrix.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [list(row[np.argsort(-scores[i, row])]) for i, row in enumerate(top)]
+
+
+def rescore_top_k(matrix: np.ndarray, query: np.ndarray, ids: np.ndarray, k: int) -> List[int]:
+    """Exact top-k among candidate rows `ids`, best first."""
+    ids = np.asarray(ids)
+    if len(ids) == 0:
+        return []
+    scores = np.asarray(matrix[ids], dtype=np.float32) @ query
+    kk = min(k, len(ids))
+    top = np.argpartition(-scores, kk - 1)[:kk]
+    return list(ids[top[np.argsort(-scores[top], kind="stable")]])
+
+
+def recall_at_k(approx_ids: List[List[int]], exact_ids: List[List[int]], k: int) -> float:
+    """Mean fraction of the exact top-k found in the approximate top-k."""
+    if not exact_ids:
+        return 0.0
+    hits = 0
+    total = 0
+    for approx, exact in zip(approx_ids, exact_ids):
+        truth = set(exact[:k])
+        hits += len(truth & set(approx[:k]))
+        total += len(truth)
+    return hits / total if total else 0.0
+
+
+def sample_queries(matrix: np.ndarray, n_queries: int, noise: float = 0.5, seed: int = 0) -> np.ndarray:
+    """
+    Offline query set: random corpus rows perturbed with Gaussian noise and
+    re-normalized, so queries land near — but not exactly on — stored vectors.
+    """
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(len(matrix), min(n_queries, len(matrix)), replace=False)
+    queries = np.asarray(matrix[ids], dtype=np.float32).copy()
+    queries += rng.normal(0, noise / math.sqrt(queries.shape[1]), queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def _timed(fn: Callable[[int], List[int]], n: int) -> Tuple[List[List[int]], float]:
+    start = time.perf_counter()
+    results = [fn(i) for i in range(n)]
+    return results, (time.perf_counter() - start) * 1000 / n
+
+
+def recall_report(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    setting: str,
+    values: Sequence[int],
+    candidates: Callable[[int, int], np.ndarray],
+) -> Dict[str, Any]:
+    """
+    Recall@k and mean latency of candidates + exact rescoring against exact
+    search. `candidates(i, value)` returns the candidate row ids for query i
+    with the first pass configured as `setting=value` (nprobe, shortlist...).
+    """
+    n = len(queries)
+    exact, exact_ms = _timed(lambda i: exact_top_k(matrix, queries[i : i + 1], k)[0], n)
+    rows = []
+    for value in values:
+        approx, mean_ms = _timed(lambda i: rescore_top_k(matrix, queries[i], candidates(i, value), k), n)
+        rows.append({
+            setting: value,
+            "recall_at_k": round(recall_at_k(approx, exact, k), 4),
+            "mean_ms": round(mean_ms, 3),
+            "speedup": round(exact_ms / mean_ms, 2) if mean_ms else None,
+        })
+    return {"k": k, "queries": n, "setting": setting, "exact_mean_ms": round(exact_ms, 3), "rows": rows}
+
+
+def print_recall_report(report: Dict[str, Any]) -> None:
+    setting = report["setting"]
+    print(f"\n📊 recall@{report['k']} over {report['queries']} queries (exact: {report['exact_mean_ms']} ms/query)")
+    for row in report["rows"]:
+        print(f"  {setting}={row[setting]:>4}  recall={row['recall_at_k']:.4f}  "
+              f"{row['mean_ms']:.3f} ms/query  x{row['speedup']}")
+
+
+def parse_values(spec: str, low: int = 1, high: int | None = None) -> List[int]:
+    """Comma-separated setting values, clamped to [low, high] and deduplicated."""
+    values = {max(int(v), low) for v in spec.split(",") if v.strip()}
+    return sorted({min(v, high) for v in values} if high is not None else values)
+
+
+def open_for_build(db_dir: str) -> Tuple[str, np.ndarray, List[Dict[str, Any]]] | None:
+    """The current snapshot a first-pass index is built for: (index_dir, matrix, metadata)."""
+    if not is_index(db_dir):
+        print(f"❌ No index at {db_dir}. Run build_local_db.py or convert_local_db.py first.")
+        return None
+    index_dir = resolve_index(db_dir)
+    _manifest, matrix, metadata = open_index(index_dir)
+    return index_dir, matrix, metadata
+
+
+def write_report(report: Dict[str, Any], path: str | None) -> None:
+    if not path:
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📝 Report written to {path}")
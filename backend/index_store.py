@@ -0,0 +1,415 @@
+"""
+Index store — compact on-disk format for the local vector DB.
+
+The DB directory holds immutable, versioned snapshots plus a pointer to the
+active one:
+    CURRENT                 name of the active snapshot directory
+    <version>/              one complete index, as below
+
+Publishing a build writes a new snapshot and then atomically replaces CURRENT,
+so a reader sees either the old index or the new one, never a mix. The last
+KEEP_VERSIONS snapshots are kept for readers still using an older one.
+(A directory with the index files directly inside is read as-is, and is moved
+into a snapshot the first time a new build is published over it.)
+
+A snapshot is a directory containing:
+    embeddings.npy          contiguous float32/float16 matrix, rows L2-normalized
+    metadata.jsonl          one JSON object per row (id, domain, reference, content, hash, part/parts)
+    metadata.offsets.npy    uint64 byte offset of each metadata line (+ end offset)
+    manifest.json           format version, row count, dimensions, dtype and partitions
+    lexical.*               BM25 inverted index over the content (see lexical_index)
+    aliases.json            articles dropped as duplicates → their canonical copy (see dedup)
+
+Rows are physically grouped by domain: the manifest lists each domain's
+contiguous row range, so a domain-filtered search scans a slice of the matrix.
+
+Everything is opened with memory maps, so loading an index costs no parsing:
+embedding pages are faulted in by the first search, and a metadata row is only
+decoded when it is part of a result. Maps are read-only and file-backed, so
+every worker process attaching to the same index shares one copy of the pages
+in the OS page cache.
+"""
+import json
+import mmap
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from config import HYBRID_SEARCH
+from lexical_index import LexicalIndexBuilder
+
+try:
+    import fcntl  # POSIX only; without it index_lock is a no-op
+except ImportError:
+    fcntl = None
+
+INDEX_FORMAT_VERSION = 1
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.jsonl"
+OFFSETS_FILE = "metadata.offsets.npy"
+MANIFEST_FILE = "manifest.json"
+ALIASES_FILE = "aliases.json"
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 3
+WIDENED_FILE = "embeddings.f32.npy"  # float32 copy of float16 embeddings, for shared mapping
+
+METADATA_FIELDS = ("id", "domain", "reference", "content", "hash", "part", "parts", "source")
+
+
+class MetadataStore:
+    """Read-only, lazily decoded view over metadata.jsonl."""
+
+    def __init__(self, path: str):
+        self._offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self._file = open(os.path.join(path, METADATA_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return max(len(self._offsets) - 1, 0)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return json.loads(self._mmap[start:end])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+class RowReader:
+    """
+    Reads individual rows of a snapshot's embeddings.npy with pread, for
+    rescoring a compact index shortlist without mapping (or widening) the
+    full matrix. Rows come back as float32.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(os.path.join(path, EMBEDDINGS_FILE), "rb")
+        major, _minor = np.lib.format.read_magic(self._file)
+        read_header = np.lib.format.read_array_header_1_0 if major == 1 else np.lib.format.read_array_header_2_0
+        shape, _fortran_order, self.dtype = read_header(self._file)
+        self.dimensions = shape[1] if len(shape) == 2 else 0
+        self._offset = self._file.tell()
+        self._row_bytes = self.dimensions * self.dtype.itemsize
+
+    def read(self, ids: np.ndarray) -> np.ndarray:
+        out = np.empty((len(ids), self.dimensions), dtype=np.float32)
+        fd = self._file.fileno()
+        for i, row in enumerate(ids):
+            data = os.pread(fd, self._row_bytes, self._offset + int(row) * self._row_bytes)
+            out[i] = np.frombuffer(data, dtype=self.dtype)
+        return out
+
+
+def resolve_index(path: str) -> str:
+    """Directory of the active snapshot of the DB at `path` (`path` itself for the flat layout)."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except OSError:
+        return path
+    return os.path.join(path, version) if version else path
+
+
+def is_index(path: str) -> bool:
+    """True if `path` holds an index (versioned or flat)."""
+    return os.path.isfile(os.path.join(resolve_index(path), MANIFEST_FILE))
+
+
+def _adopt_flat_index(path: str) -> None:
+    """Move a flat-layout index into a snapshot directory of its own."""
+    if os.path.exists(os.path.join(path, CURRENT_FILE)) or not os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+        return
+    snapshot = os.path.join(path, "flat")
+    os.makedirs(snapshot, exist_ok=True)
+    for name in os.listdir(path):
+        if os.path.isfile(os.path.join(path, name)):
+            os.replace(os.path.join(path, name), os.path.join(snapshot, name))
+    _set_current(path, "flat")
+
+
+def _set_current(path: str, version: str) -> None:
+    tmp = os.path.join(path, f"{CURRENT_FILE}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path, CURRENT_FILE))
+
+
+def list_versions(path: str) -> List[str]:
+    """Snapshot names under `path`, oldest first."""
+    if not os.path.isdir(path):
+        return []
+    versions = [
+        name for name in os.listdir(path)
+        if not name.startswith(".") and os.path.isfile(os.path.join(path, name, MANIFEST_FILE))
+    ]
+    return sorted(versions, key=lambda name: os.path.getmtime(os.path.join(path, name, MANIFEST_FILE)))
+
+
+def _prune_versions(path: str, keep: int) -> None:
+    current = os.path.basename(resolve_index(path))
+    stale = [v for v in list_versions(path) if v != current][: max(0, len(list_versions(path)) - keep)]
+    for version in stale:
+        # Processes still mapping it keep their pages (POSIX); elsewhere removal may fail
+        shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+
+
+@contextmanager
+def index_lock(path: str) -> Iterator[None]:
+    """Exclusive inter-process lock on `path`, so one worker prepares shared files for all."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_float32(path: str) -> None:
+    """
+    Write the float32 copy of a float16 index once, so workers can map it
+    instead of each widening the embeddings into private memory.
+    """
+    path = resolve_index(path)
+    emb_path = os.path.join(path, EMBEDDINGS_FILE)
+    widened_path = os.path.join(path, WIDENED_FILE)
+    source = np.load(emb_path, mmap_mode="r")
+    if source.dtype == np.float32 or source.size == 0 or os.path.exists(widened_path):
+        return
+
+    tmp_path = f"{widened_path}.{os.getpid()}.tmp"
+    widened = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=source.shape)
+    for start in range(0, len(source), 65536):
+        widened[start : start + 65536] = source[start : start + 65536]
+    widened.flush()
+    del widened
+    os.replace(tmp_path, widened_path)
+
+
+def _normalized(embeddings: np.ndarray) -> np.ndarray:
+    matrix = np.array(embeddings, dtype=np.float32, copy=True)
+    if matrix.size == 0:
+        return matrix.reshape(0, matrix.shape[1] if matrix.ndim == 2 else 0)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(matrix), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+class _Partition:
+    """Spill files holding one domain's rows until the index is assembled."""
+
+    def __init__(self, tmp_path: str, number: int):
+        self.number = number
+        self.metadata_path = os.path.join(tmp_path, f"part-{number}.jsonl")
+        self.raw_path = os.path.join(tmp_path, f"part-{number}.raw")
+        self.metadata = open(self.metadata_path, "wb")
+        self.raw = open(self.raw_path, "wb")
+        self.line_ends: List[int] = []
+
+    def close(self) -> None:
+        self.metadata.close()
+        self.raw.close()
+
+
+class IndexWriter:
+    """
+    Streaming index writer: rows are appended batch by batch, so building an
+    index never needs the whole corpus in memory. Rows are spilled to one file
+    pair per domain and concatenated by close() in first-seen domain order, so
+    every domain ends up as one contiguous partition. The snapshot is
+    assembled in a hidden directory under `path` and published by close(), so
+    readers never see a partial one; abort() discards it. With `lexical`
+    (default: HYBRID_SEARCH), BM25 postings are spilled per partition as rows
+    arrive and merged into the snapshot by close().
+    `aliases` (dedup.Deduplicator.aliases) may be set any time before close().
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dtype: str = "float32",
+        keep_versions: int = KEEP_VERSIONS,
+        embedding: Dict[str, Any] | None = None,
+        lexical: bool | None = None,
+    ):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.embedding = embedding  # backend that produced the vectors (embedding_backends.describe)
+        self.keep_versions = keep_versions
+        self.version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        self.tmp_path = os.path.join(path, f".{self.version}.tmp")
+        os.makedirs(self.tmp_path)
+
+        self._partitions: Dict[str, _Partition] = {}
+        lexical = HYBRID_SEARCH if lexical is None else lexical
+        self._lexical = LexicalIndexBuilder(self.tmp_path) if lexical else None
+        self.aliases: List[Dict[str, Any]] = []
+        self.count = 0
+        self.dimensions: int | None = None
+
+    def _partition(self, domain: str) -> _Partition:
+        part = self._partitions.get(domain)
+        if part is None:
+            part = self._partitions[domain] = _Partition(self.tmp_path, len(self._partitions))
+        return part
+
+    def add_batch(self, rows: List[Dict[str, Any]], embeddings: np.ndarray | List[List[float]]) -> None:
+        matrix = _normalized(np.asarray(embeddings, dtype=np.float32))
+        if len(rows) != len(matrix):
+            raise ValueError(f"{len(rows)} metadata rows but {len(matrix)} embeddings")
+        if not rows:
+            return
+        if self.dimensions is None:
+            self.dimensions = int(matrix.shape[1])
+        elif matrix.shape[1] != self.dimensions:
+            raise ValueError(f"Embedding has {matrix.shape[1]} dims, index has {self.dimensions}")
+
+        matrix = matrix.astype(self.dtype)
+        for row, vector in zip(rows, matrix):
+            part = self._partition(row.get("domain") or "")
+            line = json.dumps({k: row.get(k) for k in METADATA_FIELDS}, ensure_ascii=False)
+            part.metadata.write(line.encode("utf-8") + b"\n")
+            part.line_ends.append(part.metadata.tell())
+            part.raw.write(vector.tobytes())
+            if self._lexical is not None:
+                self._lexical.add(part.number, len(part.line_ends) - 1, row.get("content") or "")
+        self.count += len(rows)
+
+    def close(self) -> Dict[str, Any]:
+        for part in self._partitions.values():
+            part.close()
+        dims = self.dimensions or 0
+
+        # Concatenate the partitions, copying in bounded chunks
+        offsets = [0]
+        partitions = []
+        start = 0
+        with open(os.path.join(self.tmp_path, METADATA_FILE), "wb") as metadata, \
+                open(os.path.join(self.tmp_path, EMBEDDINGS_FILE), "wb") as out:
+            header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                      "shape": (self.count, dims)}
+            np.lib.format.write_array_header_1_0(out, header)
+            for domain, part in self._partitions.items():
+                base = offsets[-1]
+                offsets.extend(base + end for end in part.line_ends)
+                partitions.append({"domain": domain, "start": start, "count": len(part.line_ends)})
+                start += len(part.line_ends)
+                for src, dst in ((part.metadata_path, metadata), (part.raw_path, out)):
+                    with open(src, "rb") as f:
+                        shutil.copyfileobj(f, dst, 16 * 1024 * 1024)
+                    os.remove(src)
+        np.save(os.path.join(self.tmp_path, OFFSETS_FILE), np.asarray(offsets, dtype=np.uint64))
+        if self._lexical is not None:
+            self._lexical.save(self.tmp_path, [p["start"] for p in partitions], self.count)
+        if self.aliases:
+            with open(os.path.join(self.tmp_path, ALIASES_FILE), "w", encoding="utf-8") as f:
+                json.dump(self.aliases, f, ensure_ascii=False)
+
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "count": self.count,
+            "dimensions": dims,
+            "dtype": self.dtype.name,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "version": self.version,
+            "partitions": partitions,
+        }
+        if self.embedding:
+            manifest["embedding"] = self.embedding
+        with open(os.path.join(self.tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+        _adopt_flat_index(self.path)
+        os.replace(self.tmp_path, os.path.join(self.path, self.version))
+        _set_current(self.path, self.version)
+        _prune_versions(self.path, self.keep_versions)
+        return manifest
+
+    def abort(self) -> None:
+        for part in self._partitions.values():
+            part.close()
+        if self._lexical is not None:
+            self._lexical.discard()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+def load_aliases(index_dir: str) -> List[Dict[str, Any]]:
+    """Aliases stored with a snapshot ([] for indexes built without any)."""
+    path = os.path.join(index_dir, ALIASES_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_index(
+    path: str,
+    metadata: Iterable[Dict[str, Any]],
+    embeddings: np.ndarray | List[List[float]],
+    dtype: str = "float32",
+    embedding: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    """Write a complete index directory in one call (see IndexWriter for streaming)."""
+    writer = IndexWriter(path, dtype, embedding=embedding)
+    try:
+        writer.add_batch(list(metadata), embeddings)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def open_index(path: str, widen: bool = True) -> Tuple[Dict[str, Any], np.ndarray, MetadataStore]:
+    """
+    Open the active snapshot of `path` without reading it into memory.
+    float32 embeddings are returned as a read-only memory map. float16 ones
+    need float32 for BLAS (there is no half-precision GEMV): the copy written by
+    ensure_float32 is mapped when present, otherwise they are widened into
+    private memory. With widen=False they are mapped as stored, for callers
+    that only read a few rows at a time.
+    """
+    path = resolve_index(path)
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format: {manifest.get('format_version')}")
+
+    emb_path = os.path.join(path, EMBEDDINGS_FILE)
+    if manifest["count"] == 0:
+        embeddings = np.load(emb_path)
+    else:
+        embeddings = np.load(emb_path, mmap_mode="r")
+    if widen:
+        embeddings = widen_embeddings(path, embeddings)
+
+    return manifest, embeddings, MetadataStore(path)
+
+
+def widen_embeddings(path: str, embeddings: np.ndarray) -> np.ndarray:
+    """float32 view of a snapshot's embeddings (see open_index)."""
+    if embeddings.dtype == np.float32:
+        return embeddings
+    widened_path = os.path.join(resolve_index(path), WIDENED_FILE)
+    if os.path.exists(widened_path):
+        return np.load(widened_path, mmap_mode="r")
+    return embeddings.astype(np.float32)
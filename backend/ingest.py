@@ -1,19 +1,63 @@
 """
-Ingestion script — one-time process to populate Azure SQL with embeddings.
+Ingestion script — one-time process to populate the chunk store with embeddings.
 
 Usage:
     python ingest.py
 
 This will:
-1. Load all legal JSON texts from the Data/ directory
-2. Generate embeddings via Azure OpenAI
-3. Create the LegalTexts table (if not exists)
-4. Insert all chunks with their embeddings
+1. Create a staging table in the store chosen by STORAGE_BACKEND (a local
+   SQLite file, or Azure SQL when it is reachable)
+2. Stream the legal JSON texts from the Data/ directory (dropping duplicates)
+   through the chunker and the embedding scheduler, inserting embedded chunks
+   into the staging table, one transaction per batch of INSERT_BATCH_SIZE rows
+3. Swap the staging table in for LegalTexts in one transaction, so a failed
+   run leaves the previous contents untouched
+
+Memory stays bounded by the in-flight embedding batches and one insert
+batch, not the corpus.
 """
+import sys
 import time
-from data_loader import load_legal_texts
-from embedding_service import get_embeddings_batch
-from vector_store import create_table, clear_table, insert_chunks_batch, get_table_count
+from typing import Any, Dict, Iterator, List, Tuple
+
+from chunker import chunk_legal_texts, embedding_text
+from config import DEDUP
+from data_loader import LegalChunk, chunk_hash, iter_legal_texts
+from dedup import Deduplicator
+from embedding_backends import get_backend
+from embedding_service import embed_batch
+from ingest_scheduler import EmbeddingScheduler, IngestionError
+from chunk_store import get_store
+from vector_store import (
+    abort_reload,
+    begin_reload,
+    create_table,
+    get_stored_count,
+    insert_chunks_batch,
+    publish_reload,
+)
+
+INSERT_BATCH_SIZE = 500
+
+
+def _abort() -> None:
+    """Drop the staging table of a failed load, best effort."""
+    try:
+        abort_reload()
+    except Exception as e:
+        print(f"  ⚠️  Could not drop the staging table (the next run replaces it): {e}")
+
+
+def _row(chunk: LegalChunk) -> Dict[str, Any]:
+    return {
+        "domain": chunk.domain,
+        "reference": chunk.reference,
+        "content": chunk.content,
+        "part": chunk.part,
+        "parts": chunk.parts,
+        "source": chunk.source,
+        "hash": chunk_hash(chunk),
+    }
 
 
 def main():
@@ -21,50 +65,87 @@ def main():
     print("🏛️  INGESTION — Chatbot Juridique Marocain")
     print("=" * 60)
 
-    # 1. Load legal texts
-    print("\n📚 Loading legal texts...")
-    chunks = load_legal_texts()
+    # 1. Load into a staging table; the live table is only replaced once every row is in
+    try:
+        print(f"\n🗄️  Preparing a staging LegalTexts table ({get_store().describe()})...")
+        create_table()
+        existing = get_stored_count()
+        begin_reload()
+    except Exception as e:
+        print(f"❌ Chunk store unavailable, nothing was written: {e}")
+        sys.exit(1)
+    if existing > 0:
+        print(f"  ⚠️  Found {existing} existing rows — they are replaced when the load completes")
 
-    if not chunks:
-        print("❌ No legal texts found. Check your Data/ directory.")
-        return
+    # 2. Stream texts → dedup → chunker → embeddings → staging inserts.
+    # Rows are inserted in corpus order; `ready` holds batches that finished out of order.
+    pending: Dict[int, Dict[str, Any]] = {}
+    ready: Dict[int, Tuple[Dict[str, Any], List[float]]] = {}
+    buffer_rows: List[Dict[str, Any]] = []
+    buffer_vectors: List[List[float]] = []
+    counts = {"chunks": 0, "inserted": 0}
+    next_pos = 0
+    dedup = Deduplicator() if DEDUP else None
 
-    # 2. Generate embeddings
-    print(f"\n🔢 Generating embeddings for {len(chunks)} chunks...")
-    texts_to_embed = [
-        f"{chunk.domain} — {chunk.reference}: {chunk.content}"
-        for chunk in chunks
-    ]
+    def insert_buffer() -> None:
+        insert_chunks_batch(buffer_rows, buffer_vectors, staging=True)
+        counts["inserted"] += len(buffer_rows)
+        print(f"  💾 Inserted {counts['inserted']} chunks")
+        buffer_rows.clear()
+        buffer_vectors.clear()
 
-    start_time = time.time()
-    embeddings = get_embeddings_batch(texts_to_embed, batch_size=50)
-    elapsed = time.time() - start_time
-    print(f"  ⏱️  Embedding took {elapsed:.1f}s")
+    def on_batch(positions: List[int], vectors: List[List[float]]) -> None:
+        nonlocal next_pos
+        for pos, vector in zip(positions, vectors):
+            ready[pos] = (pending.pop(pos), vector)
+        while next_pos in ready:
+            row, vector = ready.pop(next_pos)
+            buffer_rows.append(row)
+            buffer_vectors.append(vector)
+            next_pos += 1
+            if len(buffer_rows) >= INSERT_BATCH_SIZE:
+                insert_buffer()
 
-    # 3. Create table
-    print("\n🗄️  Preparing Azure SQL table...")
-    create_table()
+    def items_to_embed() -> Iterator[Tuple[int, str]]:
+        articles = iter_legal_texts()
+        if dedup is not None:
+            articles = dedup.filter(articles)
+        for pos, chunk in enumerate(chunk_legal_texts(articles)):
+            counts["chunks"] += 1
+            pending[pos] = _row(chunk)
+            yield pos, embedding_text(chunk)
 
-    # 4. Clear existing data (fresh ingestion)
-    existing = get_table_count()
-    if existing > 0:
-        print(f"  ⚠️  Found {existing} existing rows — clearing...")
-        clear_table()
-
-    # 5. Insert in batches
-    print(f"\n📥 Inserting {len(chunks)} chunks into Azure SQL...")
-    batch_size = 100
-    for i in range(0, len(chunks), batch_size):
-        batch_chunks = [
-            {"domain": c.domain, "reference": c.reference, "content": c.content}
-            for c in chunks[i : i + batch_size]
-        ]
-        batch_embeddings = embeddings[i : i + batch_size]
-        insert_chunks_batch(batch_chunks, batch_embeddings)
-        print(f"  💾 Inserted {min(i + batch_size, len(chunks))}/{len(chunks)}")
-
-    # 6. Final summary
-    final_count = get_table_count()
+    print("\n📚 Streaming legal texts into embeddings and the staging table...")
+    start_time = time.time()
+    scheduler = EmbeddingScheduler(lambda texts: embed_batch(texts, max_retries=0), **get_backend().scheduler_options)
+    try:
+        scheduler.run(items_to_embed(), on_batch)
+        if buffer_rows:
+            insert_buffer()
+        if counts["chunks"] == 0:
+            _abort()
+            print("❌ No legal texts found. Check your Data/ directory.")
+            return
+        # 3. Swap the staging table in
+        publish_reload(get_backend().describe(), dedup.aliases() if dedup is not None else None)
+    except IngestionError as e:
+        _abort()
+        print(f"❌ Embedding failed, the store keeps its previous {existing} rows: {e}")
+        sys.exit(1)
+    except Exception as e:
+        _abort()
+        print(f"❌ Load failed, the store keeps its previous {existing} rows: {e}")
+        sys.exit(1)
+    except BaseException:
+        _abort()
+        raise
+    if dedup is not None:
+        print(f"  🧹 {dedup.summary()}")
+    print(f"  ⏱️  Embedded and inserted {counts['inserted']} chunks in {time.time() - start_time:.1f}s")
+    print(f"  📈 {scheduler.stats}")
+
+    # 4. Final summary
+    final_count = get_stored_count()
     print("\n" + "=" * 60)
     print(f"✅ INGESTION COMPLETE")
     print(f"   Total documents in database: {final_count}")
@@ -0,0 +1,203 @@
+"""
+Ingestion scheduler — concurrent, rate-limit-aware bulk embedding.
+
+Texts are grouped into batches by token count, then embedded by a bounded
+pool of workers. Two token buckets keep the pool under the deployment's
+requests-per-minute and tokens-per-minute quotas. Rate-limited calls honour
+the server's Retry-After; transient failures are retried with exponential
+backoff and jitter. A batch that still fails — or any non-retryable error —
+stops the run with an IngestionError, so callers never save a truncated index.
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+import openai
+
+from config import (
+    INGEST_CONCURRENCY,
+    EMBEDDING_RPM,
+    EMBEDDING_TPM,
+    INGEST_BATCH_MAX_TOKENS,
+    INGEST_BATCH_MAX_ITEMS,
+    INGEST_MAX_RETRIES,
+)
+from tokenizer import count_tokens
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+BatchCallback = Callable[[List[Any], List[List[float]]], None]
+
+_RETRYABLE = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+class IngestionError(RuntimeError):
+    """Embedding ingestion failed; nothing downstream should be written."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> None:
+        # A single request larger than the bucket can still proceed once it is full
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait_for = (amount - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def make_batches(
+    items: Iterable[Tuple[Any, str]], max_tokens: int, max_items: int
+) -> Iterator[List[Tuple[Any, str, int]]]:
+    """Lazily group (key, text) pairs into batches bounded by total tokens and item count."""
+    current: List[Tuple[Any, str, int]] = []
+    current_tokens = 0
+    for key, text in items:
+        tokens = count_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            yield current
+            current, current_tokens = [], 0
+        current.append((key, text, tokens))
+        current_tokens += tokens
+    if current:
+        yield current
+
+
+def _retry_after(exc: Exception) -> float | None:
+    """Seconds the server asked us to wait, from Retry-After(-ms) headers."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                continue
+    return None
+
+
+class EmbeddingScheduler:
+    def __init__(
+        self,
+        embed_fn: EmbedFn,
+        concurrency: int = INGEST_CONCURRENCY,
+        requests_per_minute: float = EMBEDDING_RPM,
+        tokens_per_minute: float = EMBEDDING_TPM,
+        max_batch_tokens: int = INGEST_BATCH_MAX_TOKENS,
+        max_batch_items: int = INGEST_BATCH_MAX_ITEMS,
+        max_retries: int = INGEST_MAX_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.embed_fn = embed_fn
+        self.concurrency = max(1, concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._stop = threading.Event()
+
+        self.stats: Dict[str, int] = {"batches": 0, "requests": 0, "retries": 0, "rate_limited": 0}
+        self._stats_lock = threading.Lock()  # workers update the counters concurrently
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _embed_with_retry(self, batch: List[Tuple[Any, str, int]]) -> List[List[float]]:
+        texts = [text for _, text, _ in batch]
+        tokens = sum(t for _, _, t in batch)
+        for attempt in range(self.max_retries + 1):
+            if self._stop.is_set():
+                raise IngestionError("Ingestion aborted after an earlier failure")
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(tokens)
+            self._count("requests")
+            try:
+                vectors = self.embed_fn(texts)
+            except _RETRYABLE as exc:
+                if attempt == self.max_retries:
+                    raise IngestionError(
+                        f"Batch of {len(texts)} texts failed after {attempt + 1} attempts: {exc}"
+                    ) from exc
+                delay = _retry_after(exc)
+                if isinstance(exc, openai.RateLimitError):
+                    self._count("rate_limited")
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                    delay *= random.uniform(0.5, 1.0)
+                self._count("retries")
+                time.sleep(delay)
+                continue
+            except Exception as exc:
+                raise IngestionError(f"Batch of {len(texts)} texts failed: {exc}") from exc
+
+            if len(vectors) != len(texts):
+                raise IngestionError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+            return vectors
+
+    def run(self, items: Iterable[Tuple[Any, str]], on_batch: BatchCallback) -> int:
+        """
+        Embed every (key, text) item. `items` may be a lazy iterable: it is
+        consumed only as fast as workers free up, so upstream parsing and
+        embedding overlap. `on_batch(keys, vectors)` is called from the calling
+        thread as batches complete (in completion order). Returns the number of
+        embedded items; raises IngestionError on failure.
+        """
+        batches = make_batches(items, self.max_batch_tokens, self.max_batch_items)
+        self._stop.clear()
+        done_items = 0
+        exhausted = False
+        running: Dict[Future, List[Tuple[Any, str, int]]] = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest") as pool:
+            try:
+                while True:
+                    while not exhausted and len(running) < self.concurrency:
+                        batch = next(batches, None)
+                        if batch is None:
+                            exhausted = True
+                        else:
+                            running[pool.submit(self._embed_with_retry, batch)] = batch
+                    if not running:
+                        break
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        batch = running.pop(future)
+                        vectors = future.result()  # Re-raises IngestionError
+                        on_batch([key for key, _, _ in batch], vectors)
+                        self._count("batches")
+                        done_items += len(batch)
+                        print(f"  🔢 Embedded {done_items} texts")
+            except BaseException:
+                # Let in-flight workers bail out instead of starting new attempts
+                self._stop.set()
+                raise
+        return done_items
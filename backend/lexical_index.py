@@ -0,0 +1,275 @@
+"""
+Lexical index — BM25 over chunk content with Arabic normalization and light
+stemming, used as a cheap candidate generator for hybrid retrieval.
+
+Terms are the words of the normalized text (diacritics, tatweel, alef / ya /
+ta marbuta variants folded, see text_normalize) reduced by a light stemmer
+that strips the article, attached conjunctions/prepositions and common
+suffixes, plus numbers kept whole ("218-1", "49.16") so exact legal
+references match. Postings are stored CSR-style: for term t, rows and term
+frequencies live at offsets[t]:offsets[t + 1] of two flat arrays.
+
+The index is persisted inside the vector DB snapshot as `lexical.json`
+(vocabulary and BM25 statistics) plus `lexical.*.npy` arrays, and is
+memory-mapped on load. IndexWriter builds it incrementally as rows are
+streamed in (with HYBRID_SEARCH=true); build_lexical_index.py adds one to an
+existing index.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from text_normalize import normalize_query
+
+LEXICAL_META_FILE = "lexical.json"
+LEXICAL_OFFSETS_FILE = "lexical.offsets.npy"
+LEXICAL_ROWS_FILE = "lexical.rows.npy"
+LEXICAL_TF_FILE = "lexical.tf.npy"
+LEXICAL_DOCLEN_FILE = "lexical.doclen.npy"
+LEXICAL_FORMAT_VERSION = 1
+
+_MERGE_BLOCK = 1 << 20  # postings merged per step when assembling the index
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+TOKEN_PATTERN = re.compile(r"\d+(?:[.\-/]\d+)*|[^\W\d_]+")  # numbers kept whole, or runs of letters
+# Light stemming (after normalization): attached و, then article forms, then suffixes
+_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+_SUFFIXES = ("ها", "ان", "ات", "ون", "ين", "يه", "ه", "ي")
+_STOPWORDS = frozenset(normalize_query(
+    "من في على إلى عن أن إن أو ما لا لم لن هذا هذه ذلك تلك التي الذي الذين اللذين اللتين "
+    "كل مع ثم قد كان كانت يكون تكون عند بين حيث إذا كما به بها له لها فيه فيها منه منها "
+    "عليه عليها هو هي هم غير أي أيضا بعد قبل حتى دون ولا وفي وعلى ومن أما إلا ليس و ف ب ل "
+    "هل كيف متى لماذا ماذا"
+).split())
+
+
+def stem(word: str) -> str:
+    """Light stem of a normalized word (Light10-style affix stripping, stem length ≥ 2)."""
+    if len(word) > 3 and word.startswith("و"):
+        word = word[1:]
+    for prefix in _PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 2:
+            word = word[len(prefix):]
+            break
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+            word = word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of `text`, in order (stopwords dropped, words stemmed, numbers whole)."""
+    terms = []
+    for token in TOKEN_PATTERN.findall(normalize_query(text.translate(_DIGITS))):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token if token[0].isdigit() else stem(token))
+    return terms
+
+
+class _PartitionPostings:
+    """Spill files of one partition: per-row (length, term count), then its postings."""
+
+    def __init__(self, spill_dir: str, number: int):
+        prefix = os.path.join(spill_dir, f"lexical-{number}")
+        self.paths = (f"{prefix}.docs", f"{prefix}.terms", f"{prefix}.tf")
+        self.docs, self.terms, self.tfs = (open(path, "wb") for path in self.paths)
+        self.postings = 0
+
+    def close(self) -> None:
+        for f in (self.docs, self.terms, self.tfs):
+            f.close()
+
+    def remove(self) -> None:
+        self.close()
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class LexicalIndexBuilder:
+    """
+    Streams postings to one set of spill files per partition in `spill_dir`
+    (like IndexWriter's row spill files), so only the vocabulary and its
+    document frequencies stay in memory. Rows are added with a (partition,
+    local row) position, because IndexWriter only learns each partition's
+    final start when it assembles the index; save() then merges the spill
+    files into the CSR arrays block by block.
+    """
+
+    def __init__(self, spill_dir: str):
+        self.spill_dir = spill_dir
+        self.vocabulary: Dict[str, int] = {}
+        self._df: List[int] = []
+        self._partitions: Dict[int, _PartitionPostings] = {}
+
+    def add(self, partition: int, local_row: int, text: str) -> None:
+        """Add the next row of `partition` (rows must arrive in local row order)."""
+        part = self._partitions.get(partition)
+        if part is None:
+            part = self._partitions[partition] = _PartitionPostings(self.spill_dir, partition)
+        counts: Dict[int, int] = {}
+        terms = tokenize(text)
+        for term in terms:
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                term_id = self.vocabulary[term] = len(self.vocabulary)
+                self._df.append(0)
+            counts[term_id] = counts.get(term_id, 0) + 1
+        for term_id in counts:
+            self._df[term_id] += 1
+        part.docs.write(np.array([len(terms), len(counts)], dtype=np.uint32).tobytes())
+        part.terms.write(np.fromiter(counts.keys(), dtype=np.uint32, count=len(counts)).tobytes())
+        part.tfs.write(np.fromiter((min(c, 65535) for c in counts.values()), dtype=np.uint16,
+                                   count=len(counts)).tobytes())
+        part.postings += len(counts)
+
+    def save(self, index_dir: str, partition_starts: Sequence[int], count: int) -> "LexicalIndex":
+        """
+        Write the index into `index_dir` once every partition's first global
+        row is known, removing the spill files; returns it memory-mapped.
+        """
+        offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.asarray(self._df, dtype=np.int64), out=offsets[1:])
+        postings = int(offsets[-1])
+        rows = np.lib.format.open_memmap(
+            os.path.join(index_dir, LEXICAL_ROWS_FILE), mode="w+", dtype=np.uint32, shape=(postings,))
+        tfs = np.lib.format.open_memmap(
+            os.path.join(index_dir, LEXICAL_TF_FILE), mode="w+", dtype=np.uint16, shape=(postings,))
+        doc_lengths = np.zeros(count, dtype=np.uint32)
+        cursor = offsets[:-1].copy()  # next free posting slot of each term
+
+        # Partitions in row order and rows in order within each, so every
+        # term's postings are filled with ascending rows
+        for number in sorted(self._partitions, key=lambda n: partition_starts[n]):
+            part = self._partitions[number]
+            part.close()
+            docs = np.fromfile(part.paths[0], dtype=np.uint32).reshape(-1, 2)
+            start = int(partition_starts[number])
+            doc_lengths[start : start + len(docs)] = docs[:, 0]
+            row_ends = np.cumsum(docs[:, 1], dtype=np.int64)
+            for block in range(0, part.postings, _MERGE_BLOCK):
+                n = min(_MERGE_BLOCK, part.postings - block)
+                terms = np.fromfile(part.paths[1], dtype=np.uint32, count=n, offset=block * 4).astype(np.int64)
+                block_tfs = np.fromfile(part.paths[2], dtype=np.uint16, count=n, offset=block * 2)
+                block_rows = start + np.searchsorted(row_ends, np.arange(block, block + n), side="right")
+                order = np.argsort(terms, kind="stable")
+                terms = terms[order]
+                rank = np.arange(n) - np.searchsorted(terms, terms, side="left")
+                slots = cursor[terms] + rank
+                rows[slots] = block_rows[order]
+                tfs[slots] = block_tfs[order]
+                cursor += np.bincount(terms, minlength=len(cursor))
+            part.remove()
+        self._partitions.clear()
+
+        rows.flush()
+        tfs.flush()
+        del rows, tfs
+        np.save(os.path.join(index_dir, LEXICAL_OFFSETS_FILE), offsets)
+        np.save(os.path.join(index_dir, LEXICAL_DOCLEN_FILE), doc_lengths)
+        # Written last: its presence marks a complete index
+        meta = {
+            "format_version": LEXICAL_FORMAT_VERSION,
+            "count": count,
+            "terms": len(self.vocabulary),
+            "postings": postings,
+            "vocabulary": list(self.vocabulary),
+        }
+        with open(os.path.join(index_dir, LEXICAL_META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        return LexicalIndex.load(index_dir)
+
+    def discard(self) -> None:
+        """Close and remove the spill files of an abandoned build."""
+        for part in self._partitions.values():
+            part.remove()
+        self._partitions.clear()
+
+
+class LexicalIndex:
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+    ):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.count = len(doc_lengths)
+        self.avg_length = float(doc_lengths.mean()) if self.count else 0.0
+
+    def search(
+        self, text: str, limit: int, rows: slice | np.ndarray | None = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (row ids, BM25 scores) of the best `limit` rows matching any term of
+        `text`, best first, optionally restricted to `rows`. Only the postings
+        of the query terms are read.
+        """
+        term_ids = {self.vocabulary[t] for t in tokenize(text) if t in self.vocabulary}
+        if not term_ids or limit <= 0 or self.count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        avg_length = max(self.avg_length, 1e-9)
+        hits, weights = [], []
+        for term_id in term_ids:
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            posting_rows = np.asarray(self.rows[start:end], dtype=np.int64)
+            tf = np.asarray(self.tfs[start:end], dtype=np.float32)
+            df = end - start
+            idf = np.log1p((self.count - df + 0.5) / (df + 0.5))
+            hits.append(posting_rows)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[posting_rows] / avg_length)
+            weights.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+
+        candidates, inverse = np.unique(np.concatenate(hits), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights)).astype(np.float32)
+        if rows is not None:
+            if isinstance(rows, slice):
+                keep = (candidates >= rows.start) & (candidates < rows.stop)
+            else:
+                keep = np.isin(candidates, rows)
+            candidates, scores = candidates[keep], scores[keep]
+
+        if limit < len(candidates):
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return candidates[top], scores[top]
+
+    @classmethod
+    def load(cls, index_dir: str) -> "LexicalIndex | None":
+        meta_path = os.path.join(index_dir, LEXICAL_META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != LEXICAL_FORMAT_VERSION:
+            return None
+        arrays = [
+            np.load(os.path.join(index_dir, name), mmap_mode="r")
+            for name in (LEXICAL_OFFSETS_FILE, LEXICAL_ROWS_FILE, LEXICAL_TF_FILE, LEXICAL_DOCLEN_FILE)
+        ]
+        vocabulary = {term: i for i, term in enumerate(meta["vocabulary"])}
+        return cls(vocabulary, *arrays)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "documents": self.count,
+            "terms": len(self.vocabulary),
+            "postings": int(len(self.rows)),
+            "avg_length": round(self.avg_length, 1),
+        }
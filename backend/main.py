@@ -3,26 +3,67 @@ FastAPI application — REST API for the Moroccan legal chatbot.
 
 Endpoints:
     POST /api/chat     — answer a legal question via RAG
+    POST /api/chat/batch — answer many questions, streamed back as NDJSON
     GET  /api/health   — health check
+    GET  /api/domains  — searchable domains with their document counts
     GET  /api/stats    — database statistics
+    GET  /metrics      — Prometheus metrics (stage latencies, tokens, caches)
+    POST /api/admin/reload-index — load a newly published index (X-Admin-Token)
 """
+import asyncio
 import os
-from fastapi import FastAPI, HTTPException
+import secrets
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
-from rag_service import answer_question, answer_question_stream
-from vector_store import get_table_count
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from metrics import ServerTimingMiddleware, render as render_metrics
+from rag_service import (
+    answer_question_stream_async,
+    answer_questions_batch,
+    check_index_backend,
+    get_answer_cache_stats,
+    get_coalescer_stats,
+    get_prompt_stats,
+)
+from async_clients import close_async_client
+from embedding_service import get_cache_stats, get_batcher_stats
+from config import ADMIN_TOKEN, BATCH_MAX_QUESTIONS, BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY
+from vector_store import (
+    get_domains,
+    get_index_info,
+    get_memory_stats,
+    get_table_count,
+    reload_index,
+    start_index_watcher,
+    stop_index_watcher,
+)
 # Force reload
 
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
 # ── FastAPI app ───────────────────────────────────────────────
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Attach to the (memory-mapped, shared) index before serving requests
+    get_table_count()
+    try:
+        check_index_backend()
+    except ValueError as e:
+        print(f"❌ {e}")
+    start_index_watcher()
+    yield
+    stop_index_watcher()
+    await close_async_client()
+
+
 app = FastAPI(
     title="المستشار القانوني — API",
     description="Chatbot juridique marocain avec RAG + Azure OpenAI",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ── CORS ──────────────────────────────────────────────────────
@@ -32,12 +73,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Per-stage timings of each request as a Server-Timing header
+app.add_middleware(ServerTimingMiddleware)
 
 
 # ── Request / Response schemas ────────────────────────────────
 class ChatRequest(BaseModel):
     message: str
+    domain: Optional[str] = None  # restrict retrieval to one area of law (see /api/domains)
+
+
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+    domain: Optional[str] = None
+    concurrency: Optional[int] = None  # concurrent LLM generations (capped by BATCH_MAX_CONCURRENCY)
 
 
 class SourceInfo(BaseModel):
@@ -55,17 +106,36 @@ class HealthResponse(BaseModel):
     status: str
     documents_count: Optional[int] = None
 
+async def _primed(events: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Run a stream up to its first event (the sources) before the response
+    starts, so embedding/retrieval errors become a 500 and their timings make
+    it into the Server-Timing header.
+    """
+    first = await events.__anext__()
+
+    async def replay() -> AsyncIterator[str]:
+        yield first
+        async for event in events:
+            yield event
+
+    return replay()
+
+
 # ── Endpoints ─────────────────────────────────────────────────
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     """Answer a legal question using RAG pipeline (Streaming)."""
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
+    domain = (request.domain or "").strip() or None
+    if domain is not None and domain not in get_domains():
+        raise HTTPException(status_code=400, detail=f"Unknown domain: {domain}")
 
     try:
-        # Use the generator function
+        # Async generator: network I/O is awaited, retrieval runs on its own executor
         return StreamingResponse(
-            answer_question_stream(request.message),
+            await _primed(answer_question_stream_async(request.message, domain=domain)),
             media_type="text/event-stream"
         )
     except Exception as e:
@@ -76,6 +146,29 @@ async def chat(request: ChatRequest):
         )
 
 
+@app.post("/api/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """Answer a list of questions; one NDJSON line per question as it completes, then a summary."""
+    questions = [q.strip() for q in request.questions]
+    if not questions or not all(questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    domain = (request.domain or "").strip() or None
+    if domain is not None and domain not in get_domains():
+        raise HTTPException(status_code=400, detail=f"Unknown domain: {domain}")
+    concurrency = min(max(1, request.concurrency or BATCH_CONCURRENCY), BATCH_MAX_CONCURRENCY)
+    try:
+        check_index_backend()
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return StreamingResponse(
+        answer_questions_batch(questions, domain=domain, concurrency=concurrency),
+        media_type="application/x-ndjson",
+    )
+
+
 @app.get("/api/health", response_model=HealthResponse)
 async def health():
     """Health check endpoint."""
@@ -86,16 +179,55 @@ async def health():
         return HealthResponse(status="healthy", documents_count=None)
 
 
+@app.get("/api/domains")
+async def domains():
+    """List the domains accepted by /api/chat's `domain` filter."""
+    return {"domains": get_domains()}
+
+
 @app.get("/api/stats")
 async def stats():
     """Return database statistics."""
     try:
         count = get_table_count()
-        return {"total_documents": count, "status": "ok"}
+        return {
+            "total_documents": count,
+            "status": "ok",
+            "index": get_index_info(),
+            "embedding_cache": get_cache_stats(),
+            "embedding_batcher": get_batcher_stats(),
+            "answer_cache": get_answer_cache_stats(),
+            "coalescer": get_coalescer_stats(),
+            "prompt": get_prompt_stats(),
+            "index_memory": get_memory_stats(),
+        }
     except Exception as e:
         return {"total_documents": 0, "status": "error", "detail": str(e)}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus exposition: stage latency histograms, token counters and the /api/stats gauges."""
+    body = render_metrics({
+        "embedding_cache": get_cache_stats(),
+        "embedding_batcher": get_batcher_stats(),
+        "answer_cache": get_answer_cache_stats(),
+        "coalescer": get_coalescer_stats(),
+        "prompt": get_prompt_stats(),
+        "index_memory": get_memory_stats(),
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/api/admin/reload-index")
+async def admin_reload_index(force: bool = False, x_admin_token: str = Header(default="")):
+    """Load the latest published index in the background and swap it in atomically."""
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    # Loading can take a while; in-flight requests keep using the old snapshot
+    return await asyncio.get_running_loop().run_in_executor(None, reload_index, force)
+
+
 # ── Serve frontend static files in production ─────────────────
 # ── Serve frontend static files in production ─────────────────
 # 1. Check for local 'static' directory (Deployment mode)
@@ -0,0 +1,213 @@
+"""
+Lightweight in-process metrics — per-stage latency histograms, token
+counters, Prometheus text exposition and `Server-Timing` headers, without
+extra dependencies.
+
+Pipeline code wraps each stage in `with stage("embed"): ...`. Every stage
+duration is observed into the `rag_stage_seconds` histogram and, when it runs
+inside an HTTP request, added to that request's timings, which
+ServerTimingMiddleware sends as a `Server-Timing` header. Streaming responses
+send their headers once the first event (the sources) is ready, so the header
+covers the stages up to retrieval; time-to-first-token and streaming only
+reach the histograms.
+
+Metrics are per process: with several gunicorn workers each scrape of
+/metrics sees the worker that served it.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (250, 500, 1000, 1500, 2000, 2500, 3000, 4000, 6000, 8000)
+
+_request_timings: ContextVar[Dict[str, float] | None] = ContextVar("request_timings", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                labels = _label_text(self.labels, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Duration of each RAG pipeline stage (lookup, embed, retrieve, context, ttft, stream, generate, batch_*).",
+    labels=("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time until response headers, by API route.", labels=("route", "method", "status"),
+)
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens", "Tokens sent to the chat model per request (system + user prompt).", buckets=TOKEN_BUCKETS,
+)
+TOKENS = Counter("rag_tokens_total", "Tokens by kind: prompt, context, completion.", labels=("kind",))
+ANSWERS = Counter("rag_answers_total", "Answers by source: model or cache.", labels=("source",))
+ARTICLE_HITS = Counter("rag_article_hits_total", "Questions answered from the exact article lookup (no embedding).")
+
+_REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, PROMPT_TOKENS, TOKENS, ANSWERS, ARTICLE_HITS]
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Observe one stage duration (and add it to the current request's Server-Timing)."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def _metric_name(text: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in text).strip("_").lower()
+
+
+def render_stats(prefix: str, stats: Dict[str, Any] | None) -> List[str]:
+    """Numeric fields of a /api/stats section as untyped gauges (nested dicts flattened)."""
+    lines: List[str] = []
+    for key, value in (stats or {}).items():
+        name = _metric_name(f"{prefix}_{key}")
+        if isinstance(value, dict):
+            lines.extend(render_stats(name, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"{name} {_number(value)}")
+        elif isinstance(value, bool):
+            lines.append(f"{name} {int(value)}")
+    return lines
+
+
+def render(stats: Dict[str, Dict[str, Any] | None] | None = None) -> str:
+    """Prometheus text exposition (format 0.0.4) of every metric plus the given stats sections."""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    for prefix, section in (stats or {}).items():
+        lines.extend(render_stats(prefix, section))
+    return "\n".join(lines) + "\n"
+
+
+def _server_timing(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware (safe for streaming responses): collects the stage
+    timings of each request, adds a `Server-Timing` header and records the
+    time to headers for /api/ routes, labelled by route template so path
+    parameters and unmatched URLs cannot grow the label set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        response: Dict[str, Any] = {}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(timings, elapsed).encode("latin-1")))
+                message = {**message, "headers": headers}
+                response.update(elapsed=elapsed, status=str(message.get("status", "")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            if response:
+                REQUEST_SECONDS.observe(response["elapsed"], route=_route_label(scope),
+                                        method=scope.get("method", ""), status=response["status"])
+
+
+def _route_label(scope) -> str:
+    """Matched route template (set by the router while the app ran), else "other"."""
+    path = getattr(scope.get("route"), "path", "")
+    return path if path.startswith("/api/") or path == "/metrics" else "other"
@@ -6,22 +6,79 @@ RAG service — orchestrates the full Retrieval-Augmented Generation pipeline.
 3. Build an augmented prompt with retrieved context
 4. Call Azure OpenAI gpt-4o-mini for the final answer
 """
-from typing import List, Dict, Any, Generator
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Any, AsyncGenerator
+import asyncio
+import contextvars
 import json
 import re
+import threading
+import time
+import openai
 from openai import AzureOpenAI
 
+from answer_cache import AnswerCache
+from async_clients import get_async_client
+from context_builder import build_context
+from metrics import ANSWERS, ARTICLE_HITS, PROMPT_TOKENS, TOKENS, record_stage, stage
+from stream_coalescer import StreamCoalescer
+from text_normalize import normalize_query
+from tokenizer import count_tokens
 from config import (
     AZURE_OPENAI_ENDPOINT,
     AZURE_OPENAI_API_KEY,
     AZURE_OPENAI_API_VERSION,
     AZURE_OPENAI_CHAT_DEPLOYMENT,
     TOP_K_RESULTS,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_THRESHOLD,
+    RETRIEVAL_WORKERS,
+    COALESCE_IDENTICAL_REQUESTS,
+    BATCH_CONCURRENCY,
+    ARTICLE_LOOKUP,
+)
+from embedding_backends import check_index_embedding
+from embedding_service import get_embedding, aget_embedding, aget_embeddings
+from vector_store import (
+    get_index_embedding,
+    get_index_version,
+    lookup_articles,
+    search_similar,
+    search_similar_batch,
 )
-from embedding_service import get_embedding
-from vector_store import search_similar
 
 _chat_client: AzureOpenAI | None = None
+_answer_cache: AnswerCache | None = (
+    AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD) if ANSWER_CACHE_SIZE > 0 else None
+)
+# Vector search is NumPy-bound (releases the GIL), so a small thread pool
+# keeps it off the event loop without competing with Starlette's own pool.
+_retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+_coalescer = StreamCoalescer()
+_prompt_stats: Dict[str, int] = {
+    "prompts": 0,
+    "prompt_tokens": 0,
+    "max_prompt_tokens": 0,
+    "contexts": 0,
+    "context_tokens": 0,
+    "duplicates_dropped": 0,
+    "passages_dropped": 0,
+    "truncated": 0,
+}
+_prompt_stats_lock = threading.Lock()  # updated from the event loop and executor threads
+
+
+async def _in_executor(fn, *args: Any, **kwargs: Any) -> Any:
+    """
+    Run blocking work (lookup, vector search, context building) on the
+    retrieval executor, in a copy of the current context so its stages still
+    reach the request's Server-Timing.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _retrieval_executor, partial(context.run, fn, *args, **kwargs)
+    )
 
 
 def _get_chat_client() -> AzureOpenAI:
@@ -79,38 +136,51 @@ def _is_greeting(query: str) -> bool:
     return len(words) <= 4 and any(w in greetings for w in words)
 
 
-def _build_context(results: List[Dict[str, Any]]) -> str:
-    """Format retrieved legal texts into a context block for the LLM."""
-    if not results:
-        return "لا توجد نصوص قانونية ذات صلة."
-
-    context_parts = []
-    for i, r in enumerate(results, 1):
-        context_parts.append(
-            f"[{i}] القانون: {r['domain']}\n"
-            f"    المرجع: {r['reference']}\n"
-            f"    النص: {r['content']}\n"
-        )
-    return "\n".join(context_parts)
+def check_index_backend() -> None:
+    """Raise ValueError if the loaded index was embedded by another backend than queries are."""
+    check_index_embedding(*get_index_embedding())
 
 
-def answer_question(query: str, top_k: int = TOP_K_RESULTS) -> Dict[str, Any]:
-    """
-    Full RAG pipeline: query → embed → search → LLM → answer.
-    Returns dict with 'response' and 'sources'.
-    """
-    if _is_greeting(query):
-        results = []
-    else:
-        # 1. Embed the query
-        query_embedding = get_embedding(query)
-        # 2. Retrieve similar legal texts from Azure SQL
-        results = search_similar(query_embedding, top_k=top_k)
+def _lookup_articles(query: str, top_k: int, domain: str | None) -> List[Dict[str, Any]]:
+    """Exact article matches for the question ([] = use vector search)."""
+    if not ARTICLE_LOOKUP:
+        return []
+    with stage("lookup"):
+        results = lookup_articles(query, top_k=top_k, domain=domain)
+    if results:
+        ARTICLE_HITS.inc()
+    return results
 
-    # 3. Build augmented prompt
-    context = _build_context(results)
 
-    user_prompt = f"""## السياق القانوني:
+def _build_context(results: List[Dict[str, Any]]) -> str:
+    """Format retrieved legal texts into a token-budgeted context block for the LLM."""
+    with stage("context"):
+        built = build_context(results)
+    TOKENS.inc(built.tokens, kind="context")
+    with _prompt_stats_lock:
+        _prompt_stats["contexts"] += 1
+        _prompt_stats["context_tokens"] += built.tokens
+        _prompt_stats["duplicates_dropped"] += built.duplicates
+        _prompt_stats["passages_dropped"] += built.dropped
+        _prompt_stats["truncated"] += built.truncated
+    return built.text
+
+
+def _record_prompt(user_prompt: str) -> int:
+    """Count the tokens sent to the chat model for one request."""
+    tokens = count_tokens(SYSTEM_PROMPT) + count_tokens(user_prompt)
+    with _prompt_stats_lock:
+        _prompt_stats["prompts"] += 1
+        _prompt_stats["prompt_tokens"] += tokens
+        _prompt_stats["max_prompt_tokens"] = max(_prompt_stats["max_prompt_tokens"], tokens)
+    PROMPT_TOKENS.observe(tokens)
+    TOKENS.inc(tokens, kind="prompt")
+    return tokens
+
+
+def _build_user_prompt(query: str, context: str) -> str:
+    """Augmented user prompt: retrieved context followed by the question."""
+    return f"""## السياق القانوني:
 {context}
 
 ## سؤال المستخدم:
@@ -119,83 +189,371 @@ def answer_question(query: str, top_k: int = TOP_K_RESULTS) -> Dict[str, Any]:
 إذا كان السياق يحتوي على نصوص قانونية، أجب بالتفصيل بناءً عليها فقط وبشكل مباشر لسؤال المستخدم.
 وإذا كان السياق فارغاً وكان السؤال عبارة عن تحية، فرد التحية بمهنية وبلطف."""
 
-    # 4. Call Azure OpenAI
-    client = _get_chat_client()
-    completion = client.chat.completions.create(
-        model=AZURE_OPENAI_CHAT_DEPLOYMENT,
-        messages=[
+
+def _format_sources(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sources payload sent to the frontend."""
+    return [
+        {"domain": r["domain"], "reference": r["reference"], "score": r["score"]}
+        for r in results
+    ]
+
+
+def _record_completion(text: str) -> None:
+    """Count the tokens of one generated answer."""
+    ANSWERS.inc(source="model")
+    TOKENS.inc(count_tokens(text), kind="completion")
+
+
+def _event(event_type: str, data: Any) -> str:
+    """One NDJSON line of the streaming protocol."""
+    return json.dumps({"type": event_type, "data": data}) + "\n"
+
+
+def _retrieval_shortcut(query: str, top_k: int, domain: str | None) -> List[Dict[str, Any]] | None:
+    """
+    Results that need no vector search: [] for a greeting, the matches of a
+    cited article ("المادة 5 من مدونة الأسرة"). None when the question has to
+    be embedded and searched.
+    """
+    if _is_greeting(query):
+        return []
+    results = _lookup_articles(query, top_k, domain)
+    if results:
+        return results
+    check_index_backend()
+    return None
+
+
+def _chat_request(user_prompt: str, **kwargs: Any) -> Dict[str, Any]:
+    """Arguments of one chat completion call for `user_prompt`."""
+    return {
+        "model": AZURE_OPENAI_CHAT_DEPLOYMENT,
+        "messages": [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt},
         ],
-        temperature=0.1,  # Low temperature for factual answers
-        max_tokens=2000,
-    )
+        "temperature": 0.1,  # Low temperature for factual answers
+        "max_tokens": 2000,
+        **kwargs,
+    }
+
+
+def _chunk_content(chunk: Any) -> str | None:
+    """Text delta of one streamed completion chunk, if any."""
+    if chunk.choices and chunk.choices[0].delta.content:
+        return chunk.choices[0].delta.content
+    return None
+
+
+class _StreamRun:
+    """
+    Everything a streamed answer does around the chat call, shared by the
+    sync and async pipelines: sources event, answer cache, prompt, token
+    timing and recording. The callers only differ in how they reach the LLM.
+    """
+
+    def __init__(self, query: str, results: List[Dict[str, Any]], query_embedding: List[float] | None):
+        self.query = query
+        self.results = results
+        self.query_embedding = query_embedding
+        self.sources = _format_sources(results)
+        self.use_cache = _answer_cache is not None and query_embedding is not None
+        self.index_version = get_index_version() if self.use_cache else None
+        self.streamed: List[str] = []
+        self.requested = 0.0
+        self.first_token_at: float | None = None
+
+    def sources_event(self) -> str:
+        return _event("sources", self.sources)
+
+    def cached_events(self) -> List[str] | None:
+        """Replayed content events for a near-duplicate question, or None."""
+        if not self.use_cache:
+            return None
+        cached = _answer_cache.lookup(self.query_embedding, self.sources, self.index_version)
+        if cached is None:
+            return None
+        ANSWERS.inc(source="cache")
+        return [_event("content", content) for content in cached]
+
+    def prompt(self) -> str:
+        """Build and count the user prompt (CPU-bound: tokenization, dedup, truncation)."""
+        user_prompt = _build_user_prompt(self.query, _build_context(self.results))
+        _record_prompt(user_prompt)
+        return user_prompt
+
+    def request(self, user_prompt: str) -> Dict[str, Any]:
+        """Streaming chat call arguments; starts the time-to-first-token clock."""
+        self.requested = time.perf_counter()
+        return _chat_request(user_prompt, stream=True)
+
+    def content_event(self, content: str) -> str:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            record_stage("ttft", self.first_token_at - self.requested)
+        self.streamed.append(content)
+        return _event("content", content)
+
+    def finish(self) -> None:
+        # Only complete streams reach this point; aborted ones are never cached
+        if self.first_token_at is not None:
+            record_stage("stream", time.perf_counter() - self.first_token_at)
+        _record_completion("".join(self.streamed))
+        if self.use_cache and self.streamed:
+            _answer_cache.store(self.query_embedding, self.sources, self.streamed, self.index_version)
+
+
+def answer_question(query: str, top_k: int = TOP_K_RESULTS, domain: str | None = None) -> Dict[str, Any]:
+    """
+    Full RAG pipeline: query → embed → search → LLM → answer.
+    Returns dict with 'response' and 'sources'. `domain` restricts retrieval
+    to one area of law (a Data/ subfolder).
+    """
+    results = _retrieval_shortcut(query, top_k, domain)
+    if results is None:
+        # 1. Embed the query
+        with stage("embed"):
+            query_embedding = get_embedding(query)
+        # 2. Retrieve similar legal texts
+        with stage("retrieve"):
+            results = search_similar(query_embedding, top_k=top_k, domain=domain, query_text=query)
+
+    # 3. Build augmented prompt
+    user_prompt = _build_user_prompt(query, _build_context(results))
+    _record_prompt(user_prompt)
+
+    # 4. Call Azure OpenAI
+    with stage("generate"):
+        completion = _get_chat_client().chat.completions.create(**_chat_request(user_prompt))
 
     answer = completion.choices[0].message.content
+    _record_completion(answer or "")
 
     # 5. Format sources for the frontend
-    sources = [
-        {
-            "domain": r["domain"],
-            "reference": r["reference"],
-            "score": r["score"],
-        }
-        for r in results
-    ]
-
     return {
         "response": answer,
-        "sources": sources,
+        "sources": _format_sources(results),
     }
 
 
-def answer_question_stream(query: str, top_k: int = TOP_K_RESULTS):
+def answer_question_stream(query: str, top_k: int = TOP_K_RESULTS, domain: str | None = None):
     """
     Generator that streams the answer for SSE (Server-Sent Events).
     Yields JSON strings:
     - First yield: {"type": "sources", "data": [...]}
     - Subsequent yields: {"type": "content", "data": "token"}
+
+    Near-duplicate questions with the same sources are replayed from the
+    semantic answer cache instead of calling the chat model.
     """
-    if _is_greeting(query):
-        results = []
-    else:
-        # 1. Embed and Retrieve
-        query_embedding = get_embedding(query)
-        results = search_similar(query_embedding, top_k=top_k)
-
-    # 2. Yield Sources immediately
-    sources = [
-        {"domain": r["domain"], "reference": r["reference"], "score": r["score"]}
-        for r in results
-    ]
-    yield json.dumps({"type": "sources", "data": sources}) + "\n"
+    query_embedding = None
+    results = _retrieval_shortcut(query, top_k, domain)
+    if results is None:
+        with stage("embed"):
+            query_embedding = get_embedding(query)
+        with stage("retrieve"):
+            results = search_similar(query_embedding, top_k=top_k, domain=domain, query_text=query)
+
+    run = _StreamRun(query, results, query_embedding)
+    yield run.sources_event()
+    cached = run.cached_events()
+    if cached is not None:
+        yield from cached
+        return
+
+    stream = _get_chat_client().chat.completions.create(**run.request(run.prompt()))
+    for chunk in stream:
+        content = _chunk_content(chunk)
+        if content:
+            yield run.content_event(content)
+    run.finish()
 
-    # 3. Build Context & Prompt
-    context = _build_context(results)
-    user_prompt = f"""## السياق القانوني:
-{context}
 
-## سؤال المستخدم:
-{query}
+async def answer_question_stream_async(
+    query: str, top_k: int = TOP_K_RESULTS, domain: str | None = None
+) -> AsyncGenerator[str, None]:
+    """
+    Async version of answer_question_stream with the same NDJSON events.
+    Identical concurrent questions (after normalization) share one upstream
+    run; each caller receives the full event sequence.
+    """
+    if not COALESCE_IDENTICAL_REQUESTS:
+        async for event in _answer_stream_async(query, top_k, domain):
+            yield event
+        return
 
-إذا كان السياق يحتوي على نصوص قانونية، أجب بالتفصيل بناءً عليها فقط وبشكل مباشر لسؤال المستخدم.
-وإذا كان السياق فارغاً وكان السؤال عبارة عن تحية، فرد التحية بمهنية وبلطف."""
+    key = f"{top_k}\x00{domain or ''}\x00{normalize_query(query)}"
+    async for event in _coalescer.subscribe(key, lambda: _answer_stream_async(query, top_k, domain)):
+        yield event
 
-    # 4. Stream from Azure OpenAI
-    client = _get_chat_client()
-    stream = client.chat.completions.create(
-        model=AZURE_OPENAI_CHAT_DEPLOYMENT,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.1,
-        max_tokens=2000,
-        stream=True,  # Enable streaming
-    )
 
-    for chunk in stream:
-        if chunk.choices and chunk.choices[0].delta.content:
-            content = chunk.choices[0].delta.content
-            # Yield content chunk
-            yield json.dumps({"type": "content", "data": content}) + "\n"
+async def _answer_stream_async(query: str, top_k: int, domain: str | None = None) -> AsyncGenerator[str, None]:
+    """
+    One upstream pipeline run. Network calls use the shared pooled async
+    client; the CPU-bound steps (article lookup, vector search, context
+    building) run on a dedicated executor so they never block the event loop.
+    """
+    query_embedding = None
+    results = await _in_executor(_retrieval_shortcut, query, top_k, domain)
+    if results is None:
+        # Timed on the loop, so executor queueing counts
+        with stage("embed"):
+            query_embedding = await aget_embedding(query)
+        with stage("retrieve"):
+            results = await _in_executor(
+                search_similar, query_embedding, top_k=top_k, domain=domain, query_text=query
+            )
+
+    run = _StreamRun(query, results, query_embedding)
+    yield run.sources_event()
+    cached = run.cached_events()
+    if cached is not None:
+        for event in cached:
+            yield event
+        return
+
+    user_prompt = await _in_executor(run.prompt)
+    stream = await get_async_client().chat.completions.create(**run.request(user_prompt))
+    async for chunk in stream:
+        content = _chunk_content(chunk)
+        if content:
+            yield run.content_event(content)
+    run.finish()
+
+
+async def _embed_questions(questions: List[str]) -> List[List[float] | Exception]:
+    """Batched embeddings; if a batch is rejected, questions are embedded alone so only bad ones fail."""
+    try:
+        return await aget_embeddings(questions)
+    except openai.BadRequestError:
+        return await asyncio.gather(*(aget_embedding(q) for q in questions), return_exceptions=True)
+
+
+async def _generate_answer(query: str, results: List[Dict[str, Any]], query_embedding: List[float] | None) -> str:
+    """One non-streaming completion, served from / stored in the answer cache when possible."""
+    sources = _format_sources(results)
+    use_cache = _answer_cache is not None and query_embedding is not None
+    if use_cache:
+        index_version = get_index_version()
+        cached = _answer_cache.lookup(query_embedding, sources, index_version)
+        if cached is not None:
+            ANSWERS.inc(source="cache")
+            return "".join(cached)
+
+    user_prompt = _build_user_prompt(query, await _in_executor(_build_context, results))
+    _record_prompt(user_prompt)
+    with stage("generate"):
+        completion = await get_async_client().chat.completions.create(**_chat_request(user_prompt))
+    answer = completion.choices[0].message.content or ""
+    _record_completion(answer)
+    if use_cache and answer:
+        _answer_cache.store(query_embedding, sources, [answer], index_version)
+    return answer
+
+
+async def answer_questions_batch(
+    questions: List[str],
+    top_k: int = TOP_K_RESULTS,
+    domain: str | None = None,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> AsyncGenerator[str, None]:
+    """
+    Answer many questions at once, yielding one NDJSON line per question as it
+    completes (not in input order):
+    - {"type": "result", "data": {"index", "question", "response", "sources"}}
+    - {"type": "error", "data": {"index", "question", "error"}}
+    and a final {"type": "done", "data": {"count", "errors", "elapsed_ms"}}.
+
+    Questions are embedded in batched calls, retrieved with one matrix-matrix
+    pass, and generated with at most `concurrency` chat calls in flight.
+    """
+    started = time.perf_counter()
+    errors = 0
+    check_index_backend()
+
+    # 1. Embed (greetings and cited articles skip retrieval, as in the single-question path)
+    retrieved: Dict[int, List[Dict[str, Any]]] = {}
+    to_search = []
+    for i, question in enumerate(questions):
+        if _is_greeting(question):
+            continue
+        articles = await _in_executor(_lookup_articles, question, top_k, domain)
+        if articles:
+            retrieved[i] = articles
+        else:
+            to_search.append(i)
+    embeddings: Dict[int, List[float] | Exception] = {}
+    if to_search:
+        with stage("batch_embed"):
+            vectors = await _embed_questions([questions[i] for i in to_search])
+        embeddings = dict(zip(to_search, vectors))
+
+    # 2. Retrieve for every embedded question in one pass
+    searchable = [i for i in to_search if not isinstance(embeddings[i], Exception)]
+    if searchable:
+        with stage("batch_retrieve"):
+            batch_results = await _in_executor(
+                search_similar_batch,
+                [embeddings[i] for i in searchable],
+                top_k=top_k,
+                domain=domain,
+                query_texts=[questions[i] for i in searchable],
+            )
+        retrieved.update(zip(searchable, batch_results))
+
+    # 3. Generate with bounded concurrency, reporting each answer as it lands
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(i: int) -> tuple[bool, str]:
+        question = questions[i]
+        embedding = embeddings.get(i)
+        try:
+            if isinstance(embedding, Exception):
+                raise embedding
+            results = retrieved.get(i, [])
+            async with semaphore:
+                answer = await _generate_answer(question, results, embedding)
+            return True, _event("result", {
+                "index": i,
+                "question": question,
+                "response": answer,
+                "sources": _format_sources(results),
+            })
+        except Exception as e:
+            print(f"❌ Batch question {i} failed: {e}")
+            return False, _event("error", {"index": i, "question": question, "error": str(e)})
+
+    tasks = [asyncio.create_task(run(i)) for i in range(len(questions))]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            ok, line = await next_done
+            errors += not ok
+            yield line
+    finally:
+        # Client went away: stop generations that have not finished
+        for task in tasks:
+            task.cancel()
+
+    yield _event("done", {
+        "count": len(questions),
+        "errors": errors,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+
+
+def get_coalescer_stats() -> Dict[str, Any]:
+    """In-flight and coalesced request counters."""
+    return _coalescer.stats()
+
+
+def get_answer_cache_stats() -> Dict[str, Any] | None:
+    """Hit rate and tokens saved by the semantic answer cache (None when disabled)."""
+    return _answer_cache.stats() if _answer_cache is not None else None
+
+
+def get_prompt_stats() -> Dict[str, Any]:
+    """Prompt size counters: tokens sent to the chat model and context trimming."""
+    with _prompt_stats_lock:
+        stats: Dict[str, Any] = dict(_prompt_stats)
+    stats["avg_prompt_tokens"] = round(stats["prompt_tokens"] / stats["prompts"], 1) if stats["prompts"] else 0.0
+    return stats
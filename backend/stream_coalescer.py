@@ -0,0 +1,96 @@
+"""
+Single-flight coalescing of identical in-flight streams.
+
+The first subscriber for a key starts the upstream stream in its own task;
+every concurrent subscriber with the same key attaches to that flight and
+receives the full event sequence — late joiners first get the buffered prefix,
+then live events. The upstream task is independent of any one subscriber, so
+a client disconnecting never cancels the stream for the others; when the last
+subscriber leaves, the upstream task is cancelled (no more tokens spent on an
+answer nobody reads) and the flight is dropped so no new request joins it. A
+flight is forgotten once it finishes; later requests start a new one.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+
+class _Flight:
+    def __init__(self):
+        self.events: List[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.changed = asyncio.Condition()
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+
+
+class StreamCoalescer:
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._tasks: set = set()
+        self.flights_started = 0
+        self.subscribers_joined = 0
+        self.flights_cancelled = 0
+
+    async def _produce(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[str]]) -> None:
+        stream = factory()
+        try:
+            async for event in stream:
+                async with flight.changed:
+                    flight.events.append(event)
+                    flight.changed.notify_all()
+        except Exception as exc:
+            flight.error = exc
+        finally:
+            await stream.aclose()  # also on cancellation: closes the upstream HTTP stream
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+    async def subscribe(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Yield the events of the flight for `key`, starting one via `factory` if none is running."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            self.flights_started += 1
+            task = asyncio.create_task(self._produce(key, flight, factory))
+            flight.task = task
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.subscribers_joined += 1
+
+        flight.subscribers += 1
+        position = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: position < len(flight.events) or flight.done)
+                    pending = flight.events[position:]
+                    finished = flight.done
+                for event in pending:
+                    yield event
+                position += len(pending)
+                if finished and position >= len(flight.events):
+                    break
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Everyone disconnected: stop generating
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+                self.flights_cancelled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "flights_started": self.flights_started,
+            "subscribers_joined": self.subscribers_joined,
+            "flights_cancelled": self.flights_cancelled,
+        }
@@ -1,8 +1,12 @@
-import pyodbc
-from config import AZURE_SQL_CONNECTION_STRING
+"""
+Probe the Azure SQL chunk store: connect with AZURE_SQL_CONNECTION_STRING and
+count the LegalTexts rows. Errors are written to err.txt.
+"""
+from chunk_store import AzureSQLChunkStore
 
 try:
-    pyodbc.connect(AZURE_SQL_CONNECTION_STRING, timeout=5)
+    store = AzureSQLChunkStore()
+    print(f"✅ Azure SQL reachable — {store.count()} rows in LegalTexts")
 except Exception as e:
     with open("err.txt", "w") as f:
         f.write(str(e))
@@ -0,0 +1,32 @@
+"""
+Arabic text normalization shared by caches and lexical matching.
+
+Folds the spelling variants that do not change meaning for retrieval:
+diacritics (tashkeel), tatweel, alef forms, alef maqsura and ta marbuta.
+"""
+import re
+
+_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+_TATWEEL = "\u0640"
+_WHITESPACE = re.compile(r"\s+")
+_CHAR_MAP = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    _TATWEEL: None,
+})
+
+
+def normalize_arabic(text: str) -> str:
+    """Strip diacritics and tatweel and fold alef / ya / ta marbuta variants."""
+    text = _DIACRITICS.sub("", text)
+    return text.translate(_CHAR_MAP)
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a user query, used as a cache key."""
+    text = normalize_arabic(text.strip().lower())
+    return _WHITESPACE.sub(" ", text)
@@ -0,0 +1,23 @@
+"""
+Token counting for prompt budgets and metrics.
+
+Uses tiktoken (o200k_base, the gpt-4o family encoding) when it is installed,
+otherwise a byte-length estimate that slightly over-counts Arabic text.
+"""
+import math
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken missing or encoding not downloadable offline
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens `text` costs for the chat model."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # ~4 UTF-8 bytes per token; Arabic letters are 2 bytes each
+    return math.ceil(len(text.encode("utf-8")) / 4)
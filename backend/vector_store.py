@@ -1,88 +1,774 @@
 """
-Vector store — Local JSON Database fallback since Azure SQL DB is firewalled.
-Uses in-memory pure Python cosine similarity search.
+Vector store — Local vector DB fallback since Azure SQL DB is firewalled.
+The corpus is held as one pre-normalized float32 matrix (memory-mapped from
+the binary index written by index_store), so a query is scored with a single
+matrix-vector product. Rows are grouped by domain on disk, so a
+domain-filtered query scores only that domain's slice of the matrix.
+With a compact index loaded, candidates are scored on its int8/truncated
+vectors and only a shortlist of full-precision rows is read back from disk
+for rescoring, so the full matrix is never scanned (nor widened from float16).
+With hybrid search on, a BM25 lexical index picks the candidates instead and
+only those are vector-scored; the two rankings are fused (see _hybrid_search).
+The final top-k is picked by maximal marginal relevance, so near-identical
+chunks never take several result slots (see _ranked).
+
+Without a local index, the chunks written by ingest.py to the configured chunk
+store (SQLite or Azure SQL, see chunk_store) are loaded in blocks instead.
+The write API (create_table, insert_chunks_batch, ...) targets that store.
+
+The loaded index is an immutable IndexSnapshot. New builds are picked up by
+reload_index() (admin endpoint or the background watcher) and swapped in
+atomically, without restarting the API.
 """
 import json
 import os
-import math
-from typing import List, Dict, Any
-
-from config import TOP_K_RESULTS
-
-_local_db: List[Dict[str, Any]] | None = None
-DB_PATH = os.path.join(os.path.dirname(__file__), "local_db.json")
-
-def _load_db():
-    global _local_db
-    if _local_db is None:
-        if os.path.exists(DB_PATH):
-            try:
-                with open(DB_PATH, "r", encoding="utf-8") as f:
-                    _local_db = json.load(f)
-                print(f"✅ Loaded {_local_db and len(_local_db) or 0} documents from local vector DB.")
-            except Exception as e:
-                print(f"⚠️ Error loading local DB: {e}")
-                _local_db = []
+import threading
+import time
+from typing import List, Dict, Any, Sequence
+
+import numpy as np
+
+from ann_index import IVF_FILE, IVFIndex
+from article_lookup import ArticleIndex
+from chunk_store import STAGING_TABLE, TABLE, ChunkStore, get_store
+from compact_index import COMPACT_META_FILE, CompactIndex
+from embedding_backends import legacy_embedding
+from lexical_index import LEXICAL_META_FILE, LexicalIndex
+from config import (
+    TOP_K_RESULTS,
+    VECTOR_INDEX_TYPE,
+    IVF_NPROBE,
+    USE_COMPACT_INDEX,
+    RESCORE_SHORTLIST,
+    SHARED_INDEX,
+    INDEX_WATCH_INTERVAL,
+    ARTICLE_LOOKUP,
+    HYBRID_SEARCH,
+    LEXICAL_SHORTLIST,
+    RRF_K,
+    MMR_LAMBDA,
+    MMR_POOL,
+    MMR_DUPLICATE_SIMILARITY,
+)
+from index_store import (
+    MANIFEST_FILE,
+    RowReader,
+    ensure_float32,
+    index_lock,
+    is_index,
+    load_aliases,
+    open_index,
+    resolve_index,
+    widen_embeddings,
+)
+
+DB_DIR = os.path.join(os.path.dirname(__file__), "local_db")
+LEGACY_DB_PATH = os.path.join(os.path.dirname(__file__), "local_db.json")
+_BATCH_SCORE_CELLS = 16 * 1024 * 1024  # 64 MB of float32 scores per batch block
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place; zero rows are left as zeros."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def _build_matrix(docs: List[Dict[str, Any]]) -> tuple[List[Dict[str, Any]], np.ndarray]:
+    """Split raw documents into a metadata list and a normalized embedding matrix."""
+    rows = [doc for doc in docs if doc.get("embedding")]
+    if not rows:
+        return [], np.zeros((0, 0), dtype=np.float32)
+
+    matrix = np.asarray([doc["embedding"] for doc in rows], dtype=np.float32)
+    metadata = [
+        {
+            "id": doc.get("id"),
+            "domain": doc.get("domain", ""),
+            "reference": doc.get("reference", ""),
+            "content": doc.get("content", ""),
+        }
+        for doc in rows
+    ]
+    return metadata, _normalize_rows(matrix)
+
+
+def _load_legacy_json(path: str) -> tuple[List[Dict[str, Any]], np.ndarray]:
+    """Parse a legacy local_db.json (slow: every float goes through the JSON parser)."""
+    with open(path, "r", encoding="utf-8") as f:
+        docs = json.load(f)
+    print("⚠️ Using legacy local_db.json — run convert_local_db.py for a faster binary index.")
+    return _build_matrix(docs)
+
+
+def _load_store(store: ChunkStore) -> tuple[List[Dict[str, Any]], np.ndarray]:
+    """Read every stored chunk, embeddings decoded a block at a time into one normalized matrix."""
+    db: List[Dict[str, Any]] = []
+    blocks: List[np.ndarray] = []
+    for metadata, matrix in store.iter_blocks():
+        db.extend(metadata)
+        blocks.append(matrix)
+    if not blocks:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return db, _normalize_rows(np.concatenate(blocks))
+
+
+def _store_available() -> ChunkStore | None:
+    try:
+        store = get_store()
+    except ValueError as e:  # e.g. azure_sql without pyodbc or a connection string
+        print(f"⚠️ Chunk store unavailable: {e}")
+        return None
+    return store if store.available() else None
+
+
+def _load_ivf(index_dir: str, count: int) -> IVFIndex | None:
+    """Load the persisted IVF index if it matches the current DB."""
+    ivf = IVFIndex.load(index_dir)
+    if ivf is None:
+        print("⚠️ VECTOR_INDEX_TYPE=ivf but no IVF index found. Run build_ann_index.py")
+    elif ivf.count != count:
+        print(f"⚠️ IVF index covers {ivf.count} rows, DB has {count} — falling back to exact search.")
+        ivf = None
+    return ivf
+
+
+def _load_compact(index_dir: str, count: int) -> CompactIndex | None:
+    """Load the persisted compact index if it matches the current DB."""
+    compact = CompactIndex.load(index_dir)
+    if compact is None:
+        print("⚠️ USE_COMPACT_INDEX=true but no compact index found. Run build_compact_index.py")
+    elif compact.count != count:
+        print(f"⚠️ Compact index covers {compact.count} rows, DB has {count} — using full-precision search.")
+        compact = None
+    return compact
+
+
+def _load_lexical(index_dir: str, count: int) -> LexicalIndex | None:
+    """Load the persisted lexical index if it matches the current DB."""
+    lexical = LexicalIndex.load(index_dir)
+    if lexical is None:
+        print("⚠️ HYBRID_SEARCH=true but no lexical index found. Run build_lexical_index.py")
+    elif lexical.count != count:
+        print(f"⚠️ Lexical index covers {lexical.count} rows, DB has {count} — using vector search only.")
+        lexical = None
+    return lexical
+
+
+def _scan_partitions(db: Sequence[Dict[str, Any]]) -> Dict[str, slice | np.ndarray]:
+    """Group rows by domain for indexes written without a partition table."""
+    rows: Dict[str, List[int]] = {}
+    for i, doc in enumerate(db):
+        rows.setdefault(doc.get("domain", ""), []).append(i)
+    partitions: Dict[str, slice | np.ndarray] = {}
+    for domain, ids in rows.items():
+        contiguous = ids[-1] - ids[0] + 1 == len(ids)
+        partitions[domain] = slice(ids[0], ids[-1] + 1) if contiguous else np.asarray(ids, dtype=np.int64)
+    return partitions
+
+
+def prepare_index(index_dir: str = DB_DIR, legacy_path: str = LEGACY_DB_PATH) -> None:
+    """
+    Make sure a file-backed index every worker can map read-only exists. Runs
+    under an inter-process lock, so with N workers the legacy JSON is converted
+    (and a float16 index widened) by the first one only. Call it before forking
+    (see gunicorn.conf.py) to keep that work out of the workers entirely.
+    """
+    with index_lock(f"{index_dir}.lock"):
+        if not is_index(index_dir) and os.path.exists(legacy_path):
+            from convert_local_db import convert  # imports this module
+
+            print("🔄 Converting local_db.json to a shared binary index...")
+            convert(legacy_path, index_dir)
+        if is_index(index_dir) and not USE_COMPACT_INDEX:
+            ensure_float32(index_dir)
+
+
+class IndexSnapshot:
+    """
+    One loaded, immutable version of the index. Searches take a reference to
+    the active snapshot once and use only it, so swapping in a new snapshot
+    never affects a search already running.
+    """
+
+    def __init__(
+        self,
+        db: Sequence[Dict[str, Any]],
+        matrix: np.ndarray,
+        version: str = "",
+        partitions: Dict[str, slice | np.ndarray] | None = None,
+        ivf: IVFIndex | None = None,
+        compact: CompactIndex | None = None,
+        signature: tuple = (),
+        load_seconds: float = 0.0,
+        embedding: Dict[str, Any] | None = None,
+        lexical: LexicalIndex | None = None,
+        aliases: Sequence[Dict[str, Any]] = (),
+    ):
+        self.db = db
+        self.matrix = matrix
+        self.version = version
+        self.partitions = partitions or {}
+        self.ivf = ivf
+        self.compact = compact
+        self.lexical = lexical
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+        self.embedding = embedding  # backend recorded by the build, None for older indexes
+        self.aliases = aliases  # deduplicated articles → canonical copy, for the article lookup
+        self.rows: RowReader | None = None  # set with a compact index: full-precision rows read on demand
+        self._articles: ArticleIndex | None = None
+        self._articles_lock = threading.Lock()
+
+    @property
+    def articles(self) -> ArticleIndex:
+        """Article-number index, built from the metadata on first use."""
+        if self._articles is None:
+            with self._articles_lock:
+                if self._articles is None:
+                    self._articles = ArticleIndex.build(self.db, self.aliases)
+        return self._articles
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "documents": len(self.db),
+            "embedding": self.embedding,
+            "lexical": self.lexical.describe() if self.lexical is not None else None,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            "load_ms": round(self.load_seconds * 1000, 1),
+        }
+
+
+_snapshot: IndexSnapshot | None = None
+_reload_lock = threading.Lock()
+_watcher_stop = threading.Event()
+
+
+def _mtime(path: str) -> float | None:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _source_signature() -> tuple:
+    """Changes whenever a new build (or a new IVF/compact/lexical index for it) is published."""
+    if is_index(DB_DIR):
+        index_dir = resolve_index(DB_DIR)
+        return (index_dir,) + tuple(
+            _mtime(os.path.join(index_dir, name)) for name in (MANIFEST_FILE, IVF_FILE, COMPACT_META_FILE, LEXICAL_META_FILE)
+        )
+    if os.path.exists(LEGACY_DB_PATH):
+        return (LEGACY_DB_PATH, _mtime(LEGACY_DB_PATH))
+    return ()
+
+
+def _load_snapshot() -> IndexSnapshot:
+    """Load the currently published index into a new snapshot (raises on failure)."""
+    start = time.perf_counter()
+    if SHARED_INDEX:
+        prepare_index(DB_DIR, LEGACY_DB_PATH)
+    signature = _source_signature()
+
+    if is_index(DB_DIR):
+        index_dir = resolve_index(DB_DIR)
+        manifest, matrix, db = open_index(index_dir, widen=False)
+        version = manifest.get("version") or f"{manifest['created_at']}/{manifest['count']}"
+        if "partitions" in manifest:
+            partitions = {p["domain"]: slice(p["start"], p["start"] + p["count"]) for p in manifest["partitions"]}
+        else:
+            partitions = _scan_partitions(db)
+        ivf = _load_ivf(index_dir, len(db)) if VECTOR_INDEX_TYPE == "ivf" else None
+        compact = _load_compact(index_dir, len(db)) if USE_COMPACT_INDEX else None
+        if compact is None:
+            matrix = widen_embeddings(index_dir, matrix)
+        lexical = _load_lexical(index_dir, len(db)) if HYBRID_SEARCH else None
+        snapshot = IndexSnapshot(
+            db, matrix, version, partitions, ivf, compact, signature,
+            embedding=manifest.get("embedding"), lexical=lexical, aliases=load_aliases(index_dir),
+        )
+        if compact is not None and hasattr(os, "pread"):
+            snapshot.rows = RowReader(index_dir)  # shortlists are rescored from disk
+    elif os.path.exists(LEGACY_DB_PATH):
+        db, matrix = _load_legacy_json(LEGACY_DB_PATH)
+        version = f"legacy/{os.path.getmtime(LEGACY_DB_PATH)}"
+        snapshot = IndexSnapshot(
+            db, matrix, version, _scan_partitions(db), signature=signature, embedding=legacy_embedding()
+        )
+    else:
+        store = _store_available()
+        if store is not None:
+            db, matrix = _load_store(store)
+            print(f"⚠️ No local index — serving the {store.describe()} chunk store from memory. "
+                  "Run convert_local_db.py --from-store for a memory-mapped index.")
+            snapshot = IndexSnapshot(
+                db, matrix, f"store/{len(db)}", _scan_partitions(db), signature=signature,
+                embedding=store.embedding(), aliases=store.aliases(),
+            )
         else:
-            print("⚠️ local_db.json not found. Run ingest_local.py or build_local_db.py")
-            _local_db = []
-    
-    return _local_db
-
-def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-    """Calculate cosine similarity between two vectors."""
-    if not vec1 or not vec2 or len(vec1) != len(vec2):
-        return 0.0
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    norm1 = math.sqrt(sum(a * a for a in vec1))
-    norm2 = math.sqrt(sum(b * b for b in vec2))
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    return dot_product / (norm1 * norm2)
+            print("⚠️ local_db index not found. Run build_local_db.py")
+            snapshot = IndexSnapshot([], np.zeros((0, 0), dtype=np.float32), signature=signature)
+
+    if ARTICLE_LOOKUP:
+        snapshot.articles  # built here (watcher thread / startup) rather than on the first request
+    snapshot.load_seconds = time.perf_counter() - start
+    if snapshot.db:
+        print(f"✅ Loaded {len(snapshot.db)} documents from local vector DB (version {snapshot.version}).")
+    return snapshot
+
+
+def _get_snapshot() -> IndexSnapshot:
+    """The active snapshot, loading it on first use."""
+    global _snapshot
+    if _snapshot is None:
+        with _reload_lock:
+            if _snapshot is None:
+                try:
+                    _snapshot = _load_snapshot()
+                except Exception as e:
+                    print(f"⚠️ Error loading local DB: {e}")
+                    _snapshot = IndexSnapshot([], np.zeros((0, 0), dtype=np.float32))
+    return _snapshot
+
+
+def reload_index(force: bool = False) -> Dict[str, Any]:
+    """
+    Load the published index into a new snapshot and swap it in atomically.
+    Skipped when nothing changed on disk unless `force`. If loading fails the
+    active snapshot stays in place.
+    """
+    global _snapshot
+    with _reload_lock:
+        current = _snapshot
+        if not force and current is not None and current.signature == _source_signature():
+            return {"reloaded": False, **current.info()}
+        try:
+            snapshot = _load_snapshot()
+        except Exception as e:
+            print(f"⚠️ Index reload failed, keeping the active index: {e}")
+            return {"reloaded": False, "error": str(e), **(current.info() if current else {})}
+        # A single reference swap: new searches see the new snapshot, running ones keep theirs
+        _snapshot = snapshot
+    print(f"🔄 Index reloaded: version {snapshot.version} in {snapshot.load_seconds * 1000:.0f} ms")
+    return {"reloaded": True, **snapshot.info()}
+
+
+def _watch_index(interval: float) -> None:
+    while not _watcher_stop.wait(interval):
+        try:
+            if _snapshot is not None and _source_signature() != _snapshot.signature:
+                reload_index()
+        except Exception as e:  # A build being published mid-check; retry next tick
+            print(f"⚠️ Index watcher: {e}")
+
+
+def start_index_watcher(interval: float = INDEX_WATCH_INTERVAL) -> None:
+    """Poll the DB directory and hot-reload new builds in a background thread (0 disables)."""
+    if interval <= 0:
+        return
+    _watcher_stop.clear()
+    threading.Thread(target=_watch_index, args=(interval,), name="index-watcher", daemon=True).start()
+
+
+def stop_index_watcher() -> None:
+    _watcher_stop.set()
+
 
 def create_table() -> None:
-    pass
+    """Create the chunk table in the configured store (STORAGE_BACKEND) if it does not exist."""
+    get_store().create_table()
 
 def clear_table() -> None:
-    pass
+    get_store().clear_table()
 
 def insert_chunk(domain: str, reference: str, content: str, embedding: List[float]) -> None:
-    pass
+    get_store().insert_chunks([{"domain": domain, "reference": reference, "content": content}], [embedding])
+
+def insert_chunks_batch(chunks: List[Dict[str, Any]], embeddings: List[List[float]], staging: bool = False) -> None:
+    """
+    Insert chunk dicts (domain, reference, content, part, parts, source, hash)
+    in one transaction, into the staging table of a running reload when
+    `staging` is set.
+    """
+    get_store().insert_chunks(chunks, embeddings, table=STAGING_TABLE if staging else TABLE)
+
+def begin_reload() -> None:
+    """Start a full reload of the store into an empty staging table."""
+    get_store().begin_load()
+
+def publish_reload(
+    embedding: Dict[str, Any] | None = None, aliases: List[Dict[str, Any]] | None = None
+) -> None:
+    """
+    Swap the staging table in for the live one, recording its embedding
+    backend and deduplication aliases, in one transaction.
+    """
+    get_store().publish_load(embedding, aliases)
+
+def abort_reload() -> None:
+    """Discard a failed reload; the live table keeps its previous rows."""
+    get_store().abort_load()
+
+def get_stored_count() -> int:
+    """Rows in the configured chunk store (not the loaded index, see get_table_count)."""
+    return get_store().count()
+
+def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first, using a partial selection."""
+    if top_k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < scores.size:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(scores.size)
+    # Stable sort on the shortlist keeps corpus order for ties
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order]
 
-def insert_chunks_batch(chunks: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
-    pass
 
 def search_similar(
-    query_embedding: List[float], top_k: int = TOP_K_RESULTS
+    query_embedding: List[float],
+    top_k: int = TOP_K_RESULTS,
+    nprobe: int | None = None,
+    exact: bool = False,
+    domain: str | None = None,
+    query_text: str | None = None,
 ) -> List[Dict[str, Any]]:
     """
     Find the top-K most similar legal texts using in-memory cosine distance.
     Returns list of dicts with domain, reference, content, and score.
+
+    When an IVF index is loaded, only the `nprobe` nearest cells are scanned
+    (default config.IVF_NPROBE); with a compact index, candidates are ranked on
+    compact vectors and the shortlist is rescored at full precision. With a
+    lexical index loaded and `query_text` given, only the BM25 shortlist is
+    vector-scored (see _hybrid_search). Pass exact=True to force a
+    full-precision full scan. With `domain`, only that domain's partition is
+    searched (unknown domains return no results).
     """
-    db = _load_db()
-    
+    snap = _get_snapshot()
+    db = snap.db
+
     if not db:
         return []
-    
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    if query.ndim != 1 or query.shape[0] != snap.matrix.shape[1]:
+        print(f"⚠️ Query embedding has {query.size} dims, index has {snap.matrix.shape[1]}")
+        return []
+
+    if domain is not None and domain not in snap.partitions:
+        return []
+    rows = snap.partitions[domain] if domain is not None else None
+
+    if snap.lexical is not None and query_text and not exact:
+        results = _hybrid_search(snap, query, query_text, rows, top_k)
+        if results is not None:
+            return results
+
+    if rows is not None:
+        return _search_partition(snap, query, rows, top_k, nprobe, exact)
+
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return _format_results(db, np.arange(len(db)), np.zeros(len(db), dtype=np.float32), top_k)
+    query = query / norm
+
+    if snap.ivf is not None and not exact:
+        row_ids = snap.ivf.probe(query, nprobe or IVF_NPROBE)
+        return _ranked(snap, *_score(snap, row_ids, query, top_k, exact), top_k)
+
+    return _ranked(snap, *_score(snap, slice(0, len(db)), query, top_k, exact), top_k)
+
+
+def search_similar_batch(
+    query_embeddings: List[List[float]],
+    top_k: int = TOP_K_RESULTS,
+    domain: str | None = None,
+    query_texts: Sequence[str] | None = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Exact search for many queries at once: one matrix-matrix product per block
+    of queries instead of one scan per query (with a compact index, each query
+    is shortlisted on it and rescored instead). Returns one result list per query,
+    in input order (empty when the domain is unknown or dims do not match).
+    With a lexical index loaded and `query_texts` given, queries are searched
+    as in search_similar's hybrid mode; only those with too few lexical
+    matches go through the matrix product.
+    """
+    snap = _get_snapshot()
+    db = snap.db
+    empty: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+    if not db or not query_embeddings:
+        return empty
+
+    queries = np.array(query_embeddings, dtype=np.float32)
+    if queries.ndim != 2 or queries.shape[1] != snap.matrix.shape[1]:
+        print(f"⚠️ Query embeddings have shape {queries.shape}, index has {snap.matrix.shape[1]} dims")
+        return empty
+
+    rows = slice(0, len(db)) if domain is None else snap.partitions.get(domain)
+    if rows is None:
+        return empty
+    row_ids = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+    matrix = snap.matrix[rows]
+
+    # Zero queries keep all-zero scores, as in search_similar
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    queries /= norms
+
+    results: List[List[Dict[str, Any]] | None] = [None] * len(queries)
+    if snap.lexical is not None and query_texts:
+        lexical_rows = None if domain is None else rows
+        for i, text in enumerate(query_texts):
+            if text:
+                results[i] = _hybrid_search(snap, queries[i], text, lexical_rows, top_k)
+    pending = [i for i, found in enumerate(results) if found is None]
+    if snap.compact is not None:
+        for i in pending:
+            results[i] = _ranked(snap, *_score(snap, rows, queries[i], top_k, False), top_k)
+        return results
+
+    # Bound the (queries x rows) score block to _BATCH_SCORE_CELLS floats
+    block = max(1, _BATCH_SCORE_CELLS // max(len(row_ids), 1))
+    for start in range(0, len(pending), block):
+        ids = pending[start : start + block]
+        scores = queries[ids] @ matrix.T
+        for i, row in zip(ids, scores):
+            results[i] = _ranked(snap, row_ids, row, top_k)
+    return results
+
+
+def _score(
+    snap: IndexSnapshot, rows: slice | np.ndarray, query: np.ndarray, top_k: int, exact: bool
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (row_ids, full-precision scores) for candidate `rows` and a normalized query.
+    With a compact index, only its shortlist of the candidates is scored exactly.
+    """
+    if snap.compact is not None and not exact:
+        shortlist = snap.compact.shortlist(query, rows, max(top_k, RESCORE_SHORTLIST))
+        return shortlist, _vectors(snap, shortlist) @ query
+    row_ids = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+    return row_ids, snap.matrix[rows] @ query
+
+
+def _vectors(snap: IndexSnapshot, ids: np.ndarray) -> np.ndarray:
+    """float32 rows `ids`, read from disk (not the mapped matrix) when serving a compact index."""
+    if snap.rows is not None:
+        return snap.rows.read(ids)
+    return np.asarray(snap.matrix[ids], dtype=np.float32)
+
+
+def _hybrid_search(
+    snap: IndexSnapshot,
+    query: np.ndarray,
+    query_text: str,
+    rows: slice | np.ndarray | None,
+    top_k: int,
+) -> List[Dict[str, Any]] | None:
+    """
+    BM25 picks up to LEXICAL_SHORTLIST candidates (within `rows`), only those
+    are vector-scored, and the lexical and vector rankings are merged by
+    reciprocal rank fusion: 1/(RRF_K + lexical rank) + 1/(RRF_K + vector rank).
+    Results keep the cosine similarity as their score, so scores mean the same
+    as in vector search. None when fewer than top_k rows match any query term,
+    for the caller to fall back to a vector scan.
+    """
+    candidates, _ = snap.lexical.search(query_text, max(top_k, LEXICAL_SHORTLIST), rows)
+    if len(candidates) < max(top_k, 1):
+        return None
+    norm = np.linalg.norm(query)
+    if norm:
+        query = query / norm
+    scores = np.round(_vectors(snap, candidates) @ query, 4)
+    vector_rank = np.empty(len(candidates), dtype=np.int64)
+    vector_rank[np.argsort(-scores, kind="stable")] = np.arange(len(candidates))
+    fused = 1.0 / (RRF_K + 1 + np.arange(len(candidates))) + 1.0 / (RRF_K + 1 + vector_rank)
+    return _ranked(snap, candidates, scores, top_k, relevance=fused / fused.max())
+
+
+def _search_partition(
+    snap: IndexSnapshot,
+    query: np.ndarray,
+    rows: slice | np.ndarray,
+    top_k: int,
+    nprobe: int | None,
+    exact: bool,
+) -> List[Dict[str, Any]]:
+    """
+    Search one domain. A contiguous partition is scored as a zero-copy slice of
+    the matrix. When the partition is larger than what an IVF probe would scan,
+    the probe's candidates are filtered to the partition instead, so a filtered
+    query never scans more rows than an unfiltered one.
+    """
+    db, ivf = snap.db, snap.ivf
+    row_ids = np.arange(rows.start, rows.stop) if isinstance(rows, slice) else rows
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return _format_results(db, row_ids, np.zeros(len(row_ids), dtype=np.float32), top_k)
+    query = query / norm
+
+    if ivf is not None and not exact:
+        nprobe = nprobe or IVF_NPROBE
+        if len(row_ids) > ivf.count * nprobe / max(ivf.n_lists, 1):
+            candidates = ivf.probe(query, nprobe)
+            if isinstance(rows, slice):
+                candidates = candidates[(candidates >= rows.start) & (candidates < rows.stop)]
+            else:
+                candidates = candidates[np.isin(candidates, rows)]
+            if len(candidates) >= top_k:
+                return _ranked(snap, *_score(snap, candidates, query, top_k, exact), top_k)
+
+    return _ranked(snap, *_score(snap, rows, query, top_k, exact), top_k)
+
+
+def _mmr(vectors: np.ndarray, relevance: np.ndarray, top_k: int) -> List[int]:
+    """
+    Greedy maximal marginal relevance over a candidate pool: each pick
+    maximizes MMR_LAMBDA * relevance - (1 - MMR_LAMBDA) * (max cosine to the
+    picks so far). Candidates at MMR_DUPLICATE_SIMILARITY or more to a pick
+    are dropped, so fewer than top_k may be returned.
+    """
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    picked: List[int] = []
+    while len(picked) < top_k and available.any():
+        gain = np.where(available, MMR_LAMBDA * relevance - (1 - MMR_LAMBDA) * redundancy, -np.inf)
+        best = int(np.argmax(gain))
+        picked.append(best)
+        available[best] = False
+        available &= similarity[best] < MMR_DUPLICATE_SIMILARITY
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
+
+
+def _ranked(
+    snap: IndexSnapshot,
+    row_ids: np.ndarray,
+    scores: np.ndarray,
+    top_k: int,
+    relevance: np.ndarray | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Result dicts for the top_k rows, where scores[i] (cosine) belongs to
+    row_ids[i], ranked by `relevance` (default: the scores). Unless MMR is
+    disabled (MMR_LAMBDA = 1 and MMR_DUPLICATE_SIMILARITY > 1), the best
+    MMR_POOL * top_k rows are re-selected with _mmr; MMR only changes which
+    rows are returned, never their order, which stays by relevance.
+    """
+    scores = np.round(scores, 4)
+    relevance = scores if relevance is None else relevance
+    if MMR_LAMBDA >= 1 and MMR_DUPLICATE_SIMILARITY > 1:
+        pool = _top_k_indices(relevance, top_k)
+    else:
+        pool = _top_k_indices(relevance, top_k * max(MMR_POOL, 1))
+        if len(pool) > 1:
+            pool = pool[_mmr(_vectors(snap, row_ids[pool]), relevance[pool], top_k)]
+            pool = pool[np.argsort(-relevance[pool], kind="stable")]
+    return [_result(snap.db[int(row_ids[pos])], float(scores[pos])) for pos in pool]
+
+
+def _format_results(
+    db: Sequence[Dict[str, Any]], row_ids: np.ndarray, scores: np.ndarray, top_k: int
+) -> List[Dict[str, Any]]:
+    """Build result dicts for the top_k of `scores`, where scores[i] belongs to row_ids[i]."""
+    # Round before ranking so ties break exactly as the rounded scores suggest
+    scores = np.round(scores, 4)
+
+    return [_result(db[int(row_ids[pos])], float(scores[pos])) for pos in _top_k_indices(scores, top_k)]
+
+
+def _result(doc: Dict[str, Any], score: float) -> Dict[str, Any]:
+    return {
+        "id": doc.get("id"),
+        "domain": doc.get("domain", ""),
+        "reference": doc.get("reference", ""),
+        "content": doc.get("content", ""),
+        "source": doc.get("source", ""),
+        "part": doc.get("part") or 1,
+        "parts": doc.get("parts") or 1,
+        "score": round(score, 4),
+    }
+
+
+def lookup_articles(query: str, top_k: int = TOP_K_RESULTS, domain: str | None = None) -> List[Dict[str, Any]]:
+    """
+    Exact matches for questions that cite an article of a named law
+    ("المادة 400 من مدونة التجارة"), with score 1.0 and every part of each
+    article. Empty when the question does not resolve to one article, in which
+    case callers use search_similar.
+    """
+    snap = _get_snapshot()
+    if not snap.db:
+        return []
     results = []
-    for doc in db:
-        doc_embedding = doc.get("embedding", [])
-        if not doc_embedding: continue
-        
-        sim = _cosine_similarity(query_embedding, doc_embedding)
-        results.append({
-            "id": doc.get("id"),
-            "domain": doc.get("domain", ""),
-            "reference": doc.get("reference", ""),
-            "content": doc.get("content", ""),
-            "score": round(sim, 4),
-        })
-    
-    # Sort by score descending
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results[:top_k]
+    for row_id, cited in snap.articles.lookup_cited(query, domain, limit=top_k):
+        result = _result(snap.db[row_id], 1.0)
+        if cited is not None:
+            result.update(cited)  # same text, filed under another law: cite the article asked for
+        results.append(result)
+    return results
+
+
+def get_index_version() -> str:
+    """Identifier of the loaded index; changes whenever a different build is loaded."""
+    return _get_snapshot().version
+
+
+def get_index_embedding() -> tuple[Dict[str, Any] | None, int]:
+    """Embedding backend recorded by the active index build (None if unrecorded) and its dimensions."""
+    snap = _get_snapshot()
+    return snap.embedding, int(snap.matrix.shape[1]) if snap.db else 0
+
+
+def get_index_info() -> Dict[str, Any]:
+    """Version, size and load time of the active index snapshot."""
+    return _get_snapshot().info()
+
+
+def get_domains() -> Dict[str, int]:
+    """Searchable domains and their row counts."""
+    return {
+        domain: (rows.stop - rows.start) if isinstance(rows, slice) else len(rows)
+        for domain, rows in _get_snapshot().partitions.items()
+    }
+
+
+def _process_memory() -> Dict[str, float] | None:
+    """Resident memory of this process split into file-backed and anonymous (Linux only)."""
+    fields = {"VmRSS": "rss_mb", "RssFile": "rss_file_mb", "RssAnon": "rss_anon_mb"}
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    memory = {}
+    for line in lines:
+        name, _, value = line.partition(":")
+        if name in fields:
+            memory[fields[name]] = round(int(value.split()[0]) / 1024, 1)
+    return memory
+
+
+def get_memory_stats() -> Dict[str, Any]:
+    """How the loaded index is held: shared file-backed maps vs private copies."""
+    snap = _get_snapshot()
+    return {
+        # Legacy JSON and widened float16 indexes live in private memory
+        "shared": getattr(snap.matrix, "filename", None) is not None and not isinstance(snap.db, list),
+        "embeddings_mb": round(snap.matrix.nbytes / 2**20, 1),
+        # With a compact index only it is scanned; embeddings are read a shortlist at a time
+        "compact_mb": round(snap.compact.nbytes / 2**20, 1) if snap.compact is not None else None,
+        "process": _process_memory(),
+    }
+
 
 def get_table_count() -> int:
     """Return the number of rows in local DB."""
-    db = _load_db()
-    return len(db)
+    return len(_get_snapshot().db)